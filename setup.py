@@ -13,8 +13,16 @@ setup(
     author_email='bpitcher@orcasinc.com',
     url='https://github.com/orcasgit/django-tastypie-oauth',
     install_requires=["setuptools"] + required,
+    extras_require={
+        'introspection': ['requests>=2.4'],
+    },
     license='Apache 2.0',
-    packages=['tastypie_oauth'],
+    packages=[
+        'tastypie_oauth',
+        'tastypie_oauth.management',
+        'tastypie_oauth.management.commands',
+        'tastypie_oauth.migrations',
+    ],
     include_package_data=True,
     zip_safe=False,
     classifiers=[
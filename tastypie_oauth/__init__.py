@@ -1 +1,3 @@
 __version__ = '0.0.3'
+
+default_app_config = 'tastypie_oauth.apps.TastypieOAuthConfig'
@@ -0,0 +1,193 @@
+import asyncio
+import functools
+import logging
+
+from django.db.models import QuerySet
+
+from .middleware import request_lookups
+from .signed import get_denylist, is_signed_key, load_signed_token
+from .signals import send_cache_lookup, stage_finished, stage_started
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:  # Django < 3.0
+    sync_to_async = None
+
+"""
+Async counterparts of the authentication methods for ASGI deployments.
+
+This module needs Python 3.5+; on older versions the authentication classes
+are built without it. In-process cache hits are served without leaving the
+event loop; the ORM's async API is used when Django provides it (4.1+), and
+other blocking calls run in a worker thread.
+"""
+
+log = logging.getLogger('tastypie_oauth')
+
+# Django 4.1+
+ASYNC_ORM = hasattr(QuerySet, 'aget')
+
+
+async def run_sync(func, *args):
+    """Run the blocking ``func`` in a worker thread."""
+    if sync_to_async is not None:
+        return await sync_to_async(func)(*args)
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, functools.partial(func, *args))
+
+
+async def acache_get(cache, key):
+    tiers = getattr(cache, 'tiers', None)
+    if tiers is not None:
+        if cache.version_due():
+            await run_sync(cache.check_version)
+        for index, tier in enumerate(tiers):
+            token = await acache_get(tier, key)
+            if token is not None:
+                for earlier in tiers[:index]:
+                    await acache_set(earlier, key, token)
+                return token
+        return None
+    if cache.blocking:
+        return await run_sync(cache.get, key)
+    return cache.get(key)
+
+
+async def acache_set(cache, key, token):
+    if cache.blocking:
+        await run_sync(cache.set, key, token)
+    else:
+        cache.set(key, token)
+
+
+async def astore_get(store, key):
+    """
+    Look ``key`` up in ``store``, with its ``aget_token`` coroutine when it
+    has one, otherwise in a worker thread.
+    """
+    if hasattr(store, 'aget_token'):
+        return await store.aget_token(key)
+    return await run_sync(store.get_token, key)
+
+
+class AsyncModelTokenStoreMixin(object):
+    """
+    ``aget_token`` of ``ModelTokenStore``: ``get_token`` with the same
+    replica and primary lookups, made with ``QuerySet.aget``.
+    """
+    async def aget_token(self, key):
+        if not ASYNC_ORM:
+            return await run_sync(self.get_token, key)
+        token = await self.afetch_token(key, self.using)
+        primary = self.get_primary()
+        if primary is None:
+            return token
+        if self.is_current(token):
+            self.replica_hits += 1
+            return token
+        self.primary_fallbacks += 1
+        return await self.afetch_token(key, primary)
+
+    async def afetch_token(self, key, using):
+        queryset = self.get_queryset(using)
+        try:
+            return await queryset.aget(token=key)
+        except queryset.model.DoesNotExist:
+            return None
+
+
+class AsyncTokenViewStoreMixin(AsyncModelTokenStoreMixin):
+    """``aget_token`` of ``TokenViewStore``, building ``TokenView`` objects."""
+    async def afetch_token(self, key, using):
+        row = await super(AsyncTokenViewStoreMixin, self).afetch_token(key, using)
+        if row is None:
+            return None
+        return self.token_class(*row)
+
+
+class AsyncAuthenticationMixin(object):
+    """
+    ``ais_authenticated``/``averify_access_token`` behave exactly like
+    their synchronous counterparts, including the ``request.user`` and
+    ``request.META['oauth_consumer_key']`` side effects.
+    """
+    async def ais_authenticated(self, request, **kwargs):
+        from .authentication import TOKEN_VALID
+        log.debug("OAuth20Authentication")
+        try:
+            started = stage_started()
+            key = self.extract_key(request)
+            stage_finished(self.__class__, 'extract_key', started)
+            if not key:
+                return self.no_credentials(request)
+            if self.overrides('averify_access_token'):
+                token = await self.averify_access_token(key, request, **kwargs)
+                await self.aprepare_quotas(key, token)
+                return self.authentication_succeeded(request, token, key)
+            if self.overrides('verify_access_token'):
+                # Run the subclass's checks, as is_authenticated() does
+                token = await run_sync(functools.partial(
+                    self.verify_access_token, key, request, **kwargs))
+                await self.aprepare_quotas(key, token)
+                return self.authentication_succeeded(request, token, key)
+            token, status = await self.aresolve_access_token(
+                key, request, **kwargs)
+            if status == TOKEN_VALID:
+                await self.aprepare_quotas(key, token)
+            return self.authentication_result(request, token, key, status)
+        except Exception as e:
+            return self.authentication_error(request, e)
+
+    async def aprepare_quotas(self, key, token):
+        """
+        Sync the quota counters of ``token`` in a worker thread when due, so
+        that ``authentication_succeeded`` checks them without cache I/O.
+        """
+        if self.quotas is not None and self.quotas.sync_due(key, token):
+            await run_sync(self.quotas.sync, key, token)
+
+    async def averify_access_token(self, key, request, **kwargs):
+        token, status = await self.aresolve_access_token(key, request, **kwargs)
+        self.check_status(status)
+        return token
+
+    async def aresolve_access_token(self, key, request, **kwargs):
+        lookups = request_lookups(request)
+        lookup_key = self.lookup_key(key)
+        if lookup_key in lookups:
+            token, status = lookups[lookup_key]
+            if status is None:
+                status = self.token_status(token, request)
+            return token, status
+        token = None
+        status = None
+        if self.negative_cache is not None:
+            status = await acache_get(self.negative_cache, key)
+            send_cache_lookup(self.__class__, 'negative', status is not None)
+        if status is None:
+            started = stage_started()
+            token = await self.alookup_token(key)
+            stage_finished(self.__class__, 'lookup_token', started)
+        lookups[lookup_key] = (token, status)
+        if status is None:
+            status = self.token_status(token, request)
+            if self.negative_cache is not None and self.negative_cache.blocking:
+                await run_sync(self.remember_status, key, status)
+            else:
+                self.remember_status(key, status)
+        return token, status
+
+    async def alookup_token(self, key):
+        if self.signed_tokens and is_signed_key(key):
+            if get_denylist() is None:
+                return load_signed_token(key)
+            return await run_sync(load_signed_token, key)
+        token = None
+        if self.token_cache is not None:
+            token = await acache_get(self.token_cache, key)
+            send_cache_lookup(self.__class__, 'token', token is not None)
+        if token is None:
+            token = await astore_get(self.token_store, key)
+            if token is not None and self.token_cache is not None:
+                await acache_set(self.token_cache, key, token)
+        return token
@@ -0,0 +1,37 @@
+from django.apps import AppConfig
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+
+
+class TastypieOAuthConfig(AppConfig):
+    name = 'tastypie_oauth'
+    verbose_name = 'Tastypie OAuth'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from oauth2_provider.models import AccessToken
+        from .cache import invalidate_token, reset_default_caches
+        from .shm import reset_default_shm_cache
+        from .signed import revoke_deleted_token
+        from .stores import reset_default_token_store
+        from .users import invalidate_user, reset_default_user_cache
+
+        post_save.connect(invalidate_token, sender=AccessToken,
+                          dispatch_uid='tastypie_oauth_invalidate_token_save')
+        post_delete.connect(invalidate_token, sender=AccessToken,
+                            dispatch_uid='tastypie_oauth_invalidate_token_delete')
+        post_delete.connect(revoke_deleted_token, sender=AccessToken,
+                            dispatch_uid='tastypie_oauth_revoke_signed_tokens')
+        setting_changed.connect(reset_default_caches,
+                                dispatch_uid='tastypie_oauth_reset_default_caches')
+        user_model = get_user_model()
+        post_save.connect(invalidate_user, sender=user_model,
+                          dispatch_uid='tastypie_oauth_invalidate_user_save')
+        post_delete.connect(invalidate_user, sender=user_model,
+                            dispatch_uid='tastypie_oauth_invalidate_user_delete')
+        setting_changed.connect(reset_default_user_cache,
+                                dispatch_uid='tastypie_oauth_reset_default_user_cache')
+        setting_changed.connect(reset_default_shm_cache,
+                                dispatch_uid='tastypie_oauth_reset_default_shm_cache')
+        setting_changed.connect(reset_default_token_store,
+                                dispatch_uid='tastypie_oauth_reset_default_token_store')
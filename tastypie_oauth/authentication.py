@@ -1,13 +1,41 @@
+import functools
 import logging
-import json
-import six
+from collections import namedtuple
 
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest
 from django.utils import timezone
-from oauth2_provider.models import AccessToken
+from django.utils.functional import SimpleLazyObject
 from tastypie.authentication import Authentication
-from tastypie.http import HttpUnauthorized
+from tastypie.http import HttpTooManyRequests, HttpUnauthorized
+
+from .cache import (
+    get_default_negative_cache,
+    get_default_token_cache,
+    token_fingerprint,
+)
+from .extractors import (
+    AUTHORIZATION_SCHEMES,
+    MalformedCredentials,
+    get_extractors,
+)
+from .failures import FailureLogger
+from .middleware import request_counted, request_lookups
+from .quotas import get_default_quotas
+from .scopes import SCOPED_METHODS, compile_scope_requirements, parse_scopes
+from .signed import is_signed_key, load_signed_token
+from .singleflight import SingleFlight
+from .signals import send_cache_lookup, send_outcome, stage_finished, stage_started
+from .stores import ModelTokenStore, get_token_store
+from .usage import get_default_usage_recorder
+from .users import get_default_user_cache
+
+try:
+    from .aio import AsyncAuthenticationMixin
+except SyntaxError:  # Python < 3.5
+    class AsyncAuthenticationMixin(object):
+        pass
 
 """
 This is a simple OAuth 2.0 authentication model for tastypie
@@ -18,23 +46,136 @@ Dependencies (one of these):
 """
 
 log = logging.getLogger('tastypie_oauth')
+failure_log = FailureLogger(
+    log, getattr(settings, 'TASTYPIE_OAUTH_FAILURE_LOG_INTERVAL', 60))
+# Shared by all authentication instances, so concurrent requests for one
+# key cause a single store lookup
+lookup_flight = SingleFlight(
+    getattr(settings, 'TASTYPIE_OAUTH_LOOKUP_TIMEOUT', 5))
+
+# Statuses reported by resolve_access_token() and verify_access_tokens()
+TOKEN_VALID = 'valid'
+TOKEN_EXPIRED = 'expired'
+TOKEN_NOT_FOUND = 'not_found'
+TOKEN_INSUFFICIENT_SCOPE = 'insufficient_scope'
+
+TokenResult = namedtuple('TokenResult', ['token', 'status'])
+
+# Statuses that do not depend on the request, so may be negatively cached
+NEGATIVE_STATUSES = (TOKEN_EXPIRED, TOKEN_NOT_FOUND)
+
+# Outcomes sent with the auth_outcome signal besides the TOKEN_* statuses
+OUTCOME_SUCCESS = 'success'
+OUTCOME_NO_CREDENTIALS = 'no_credentials'
+OUTCOME_MALFORMED_HEADER = 'malformed_header'
+OUTCOME_ERROR = 'error'
+OUTCOME_OVER_QUOTA = 'over_quota'
+
+STATUS_MESSAGES = {
+    TOKEN_EXPIRED: 'AccessToken has expired.',
+    TOKEN_NOT_FOUND: "AccessToken not found at all.",
+    TOKEN_INSUFFICIENT_SCOPE: "AccessToken does not meet scope requirement",
+}
 
 
 class OAuthError(RuntimeError):
-    """Generic exception class."""
-    def __init__(self, message='OAuth error occured.'):
+    """
+    Generic exception class. ``status`` tells expected failures apart
+    (a TOKEN_* status or OUTCOME_MALFORMED_HEADER).
+    """
+    def __init__(self, message='OAuth error occured.', status=None):
         self.message = message
+        self.status = status
 
 
-class OAuth20Authentication(Authentication):
+class OAuth20Authentication(AsyncAuthenticationMixin, Authentication):
     """
     OAuth authenticator.
 
     This Authentication method checks for a provided HTTP_AUTHORIZATION
     and looks up to see if this is a valid OAuth Access Token
+
+    Tokens are looked up in ``token_store`` (see ``tastypie_oauth.stores``),
+    which defaults to the ``TASTYPIE_OAUTH_TOKEN_STORE`` setting or the
+    django-oauth-toolkit model.
+
+    Verified tokens are kept in ``token_cache`` (see
+    ``tastypie_oauth.cache.LocalTokenCache``) when one is given, otherwise in
+    the cache configured by the ``TASTYPIE_OAUTH_TOKEN_CACHE`` setting.
+    Likewise, unknown and expired keys are remembered in ``negative_cache``
+    (``TASTYPIE_OAUTH_NEGATIVE_TOKEN_CACHE``) and rejected without a lookup.
+
+    The access token is looked for by ``extractors`` (see
+    ``tastypie_oauth.extractors``, ``TASTYPIE_OAUTH_CREDENTIAL_EXTRACTORS``),
+    by default in a Bearer ``Authorization`` header, then the
+    ``oauth_consumer_key`` query string parameter, then the POST body.
+    POST bodies are only scanned for ``oauth_consumer_key`` up to
+    ``max_body_bytes`` (``TASTYPIE_OAUTH_MAX_BODY_BYTES``, 64KB by default);
+    set ``body_credentials`` (``TASTYPIE_OAUTH_BODY_CREDENTIALS``) to False
+    to ignore credentials in the body entirely.
+
+    With ``signed_tokens`` (``TASTYPIE_OAUTH_SIGNED_TOKENS``) enabled, signed
+    tokens minted by ``tastypie_oauth.signed.mint_signed_token`` are
+    verified without any lookup; opaque tokens are looked up as usual.
+
+    Successful authentications are counted by ``usage_recorder`` (see
+    ``tastypie_oauth.usage``, ``TASTYPIE_OAUTH_USAGE_TRACKING``) when one is
+    configured.
+
+    With ``quotas`` (see ``tastypie_oauth.quotas``, ``TASTYPIE_OAUTH_QUOTAS``)
+    a client over its quota gets a 429 response with a ``Retry-After``
+    header instead of being authenticated.
+
+    With ``user_cache`` (see ``tastypie_oauth.users``,
+    ``TASTYPIE_OAUTH_USER_CACHE``) ``request.user`` is set lazily from the
+    cache, and the default token store no longer joins the user table.
+
+    On Python 3.5+, ``ais_authenticated`` and ``averify_access_token`` are
+    async versions of ``is_authenticated`` and ``verify_access_token``.
     """
-    def __init__(self, realm='API'):
+    authorization_schemes = AUTHORIZATION_SCHEMES
+    # Keyword arguments of __init__, forwarded by OAuth2ScopedAuthentication
+    options = ('token_cache', 'token_store', 'body_credentials',
+               'max_body_bytes', 'negative_cache', 'signed_tokens',
+               'usage_recorder', 'quotas', 'extractors', 'user_cache')
+
+    def __init__(self, realm='API', token_cache=None, token_store=None,
+                 body_credentials=None, max_body_bytes=None,
+                 negative_cache=None, signed_tokens=None, usage_recorder=None,
+                 quotas=None, extractors=None, user_cache=None):
         self.realm = realm
+        if body_credentials is None:
+            body_credentials = getattr(
+                settings, 'TASTYPIE_OAUTH_BODY_CREDENTIALS', True)
+        self.body_credentials = body_credentials
+        if max_body_bytes is None:
+            max_body_bytes = getattr(
+                settings, 'TASTYPIE_OAUTH_MAX_BODY_BYTES', 65536)
+        self.max_body_bytes = max_body_bytes
+        self.extractors = get_extractors(extractors)
+        if user_cache is None:
+            user_cache = get_default_user_cache()
+        self.user_cache = user_cache
+        if (token_store is None and user_cache is not None
+                and getattr(settings, 'TASTYPIE_OAUTH_TOKEN_STORE', None) is None):
+            # The user is loaded lazily, so skip the joins
+            token_store = ModelTokenStore(select_related=())
+        self.token_store = get_token_store(token_store)
+        if token_cache is None:
+            token_cache = get_default_token_cache()
+        self.token_cache = token_cache
+        if negative_cache is None:
+            negative_cache = get_default_negative_cache()
+        self.negative_cache = negative_cache
+        if signed_tokens is None:
+            signed_tokens = getattr(settings, 'TASTYPIE_OAUTH_SIGNED_TOKENS', False)
+        self.signed_tokens = signed_tokens
+        if usage_recorder is None:
+            usage_recorder = get_default_usage_recorder()
+        self.usage_recorder = usage_recorder
+        if quotas is None:
+            quotas = get_default_quotas()
+        self.quotas = quotas
 
     def is_authenticated(self, request, **kwargs):
         """
@@ -42,57 +183,257 @@ class OAuth20Authentication(Authentication):
         values in the "Authorization" header, as a GET request parameter,
         or in a POST body.
         """
-        log.info("OAuth20Authentication")
+        log.debug("OAuth20Authentication")
         try:
-            key = request.GET.get('oauth_consumer_key')
+            started = stage_started()
+            key = self.extract_key(request)
+            stage_finished(self.__class__, 'extract_key', started)
             if not key:
-                for header in ['Authorization', 'HTTP_AUTHORIZATION']:
-                    auth_header_value = request.META.get(header)
-                    if auth_header_value:
-                        key = auth_header_value.split(' ', 1)[1]
-                        break
-            if not key and request.method == 'POST':
-                if request.META.get('CONTENT_TYPE') == 'application/json':
-                    decoded_body = request.body.decode('utf8')
-                    key = json.loads(decoded_body)['oauth_consumer_key']
-            if not key:
-                log.info('OAuth20Authentication. No consumer_key found.')
-                return None
-            """
-            If verify_access_token() does not pass, it will raise an error
-            """
-            token = self.verify_access_token(key, request, **kwargs)
-
-            # If OAuth authentication is successful, set the request user to
-            # the token user for authorization
-            request.user = token.user
+                return self.no_credentials(request)
+            if self.overrides('verify_access_token'):
+                # If verify_access_token() does not pass, it will raise an error
+                token = self.verify_access_token(key, request, **kwargs)
+                status = TOKEN_VALID
+            else:
+                token, status = self.resolve_access_token(key, request, **kwargs)
+            return self.authentication_result(request, token, key, status)
+        except Exception as e:
+            return self.authentication_error(request, e)
 
-            # If OAuth authentication is successful, set oauth_consumer_key on
-            # request in case we need it later
-            request.META['oauth_consumer_key'] = key
-            return True
-        except KeyError:
-            log.exception("Error in OAuth20Authentication.")
+    def overrides(self, name):
+        """Whether a subclass overrides the method ``name`` of this class."""
+        method = getattr(self.__class__, name)
+        base = getattr(OAuth20Authentication, name)
+        return getattr(method, '__func__', method) is not getattr(base, '__func__', base)
+
+    def no_credentials(self, request):
+        log.debug('OAuth20Authentication. No consumer_key found.')
+        send_outcome(self.__class__, OUTCOME_NO_CREDENTIALS, request)
+        return None
+
+    def authentication_result(self, request, token, key, status):
+        if status != TOKEN_VALID:
+            return self.authentication_rejected(request, status)
+        return self.authentication_succeeded(request, token, key)
+
+    def authentication_error(self, request, error):
+        if isinstance(error, OAuthError):
+            return self.authentication_rejected(
+                request, error.status or OUTCOME_ERROR)
+        return self.authentication_failed(request, error)
+
+    def authentication_succeeded(self, request, token, key):
+        counted = request_counted(request)
+        if self.quotas is not None and (key, self.quotas) not in counted:
+            retry_after = self.quotas.check(key, token)
+            if retry_after is not None:
+                return self.over_quota(request, retry_after)
+            counted.add((key, self.quotas))
+        self.set_request_token(request, token, key)
+        if (self.usage_recorder is not None
+                and (key, self.usage_recorder) not in counted):
+            self.usage_recorder.record(key, token)
+            counted.add((key, self.usage_recorder))
+        send_outcome(self.__class__, OUTCOME_SUCCESS, request)
+        return True
+
+    def authentication_rejected(self, request, reason):
+        """
+        Handle an expected failure: no traceback, and a rate-limited log
+        record per reason and client.
+        """
+        failure_log.log(reason, request.META.get('REMOTE_ADDR'))
+        send_outcome(self.__class__, reason, request)
+        return False
+
+    def over_quota(self, request, retry_after):
+        failure_log.log(OUTCOME_OVER_QUOTA, request.META.get('REMOTE_ADDR'))
+        send_outcome(self.__class__, OUTCOME_OVER_QUOTA, request)
+        response = HttpTooManyRequests()
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    def authentication_failed(self, request, error):
+        log.exception("Error in OAuth20Authentication.")
+        if isinstance(error, KeyError):
             request.user = AnonymousUser()
-            return False
-        except Exception:
-            log.exception("Error in OAuth20Authentication.")
-            return False
+        send_outcome(self.__class__, OUTCOME_ERROR, request)
+        return False
 
-    def verify_access_token(self, key, request, **kwargs):
-        # Check if key is in AccessToken key
+    def extract_key(self, request):
+        """
+        Return the access token sent with ``request``, or None. The
+        extractors are tried in order until one finds a key.
+        """
         try:
-            token = AccessToken.objects.get(token=key)
+            for extractor in self.extractors:
+                key = extractor(request, self)
+                if key:
+                    return key
+        except MalformedCredentials as e:
+            raise OAuthError(str(e), OUTCOME_MALFORMED_HEADER)
+        return None
+
+    def set_request_token(self, request, token, key):
+        # If OAuth authentication is successful, set the request user to
+        # the token user for authorization
+        user_id = getattr(token, 'user_id', None)
+        if self.user_cache is not None and user_id is not None:
+            request.user = SimpleLazyObject(
+                functools.partial(self.user_cache.get, user_id))
+        else:
+            request.user = token.user
 
-            # Check if token has expired
-            if token.expires < timezone.now():
-                raise OAuthError('AccessToken has expired.')
-        except AccessToken.DoesNotExist:
-            raise OAuthError("AccessToken not found at all.")
+        # If OAuth authentication is successful, set oauth_consumer_key on
+        # request in case we need it later
+        request.META['oauth_consumer_key'] = key
+        request._oauth_token = token
 
-        log.info('Valid access')
+    def verify_access_token(self, key, request, **kwargs):
+        token, status = self.resolve_access_token(key, request, **kwargs)
+        self.check_status(status)
         return token
 
+    def resolve_access_token(self, key, request, **kwargs):
+        """
+        Like verify_access_token(), but return a ``TokenResult(token,
+        status)`` instead of raising for expected failures.
+        """
+        lookups = request_lookups(request)
+        lookup_key = self.lookup_key(key)
+        if lookup_key in lookups:
+            token, status = lookups[lookup_key]
+            if status is None:
+                status = self.token_status(token, request)
+            return TokenResult(token, status)
+        token = None
+        status = self.negative_status(key)
+        if status is None:
+            started = stage_started()
+            token = self.lookup_token(key)
+            stage_finished(self.__class__, 'lookup_token', started)
+        lookups[lookup_key] = (token, status)
+        if status is None:
+            status = self.token_status(token, request)
+            self.remember_status(key, status)
+        return TokenResult(token, status)
+
+    def lookup_key(self, key):
+        """
+        Return the key of ``key``'s lookup in the request's memo.
+        Authentication classes that look keys up alike share lookups, others
+        (e.g. one accepting signed tokens and one not) do not.
+        """
+        return (key, self.token_store.memo_key(), self.signed_tokens,
+                self.negative_cache)
+
+    def negative_status(self, key):
+        """Return the status remembered for a rejected key, or None."""
+        if self.negative_cache is None:
+            return None
+        status = self.negative_cache.get(key)
+        send_cache_lookup(self.__class__, 'negative', status is not None)
+        return status
+
+    def remember_status(self, key, status):
+        """Remember unknown and expired keys in the negative cache."""
+        if self.negative_cache is not None and status in NEGATIVE_STATUSES:
+            self.negative_cache.set(key, status)
+
+    def lookup_token(self, key):
+        """
+        Return the token for ``key`` from the token cache or the token
+        store, or None if it is unknown. Signed tokens are verified in place.
+        """
+        if self.signed_tokens and is_signed_key(key):
+            return load_signed_token(key)
+        token = None
+        if self.token_cache is not None:
+            token = self.token_cache.get(key)
+            send_cache_lookup(self.__class__, 'token', token is not None)
+        # Check if key is in AccessToken key
+        if token is None:
+            token = lookup_flight.do(
+                (self.token_store, token_fingerprint(key)), self.fetch_token, key)
+        return token
+
+    def fetch_token(self, key):
+        """
+        Look ``key`` up in the token store and cache the token. Concurrent
+        calls for one key are coalesced: one thread does the lookup and the
+        others wait up to ``TASTYPIE_OAUTH_LOOKUP_TIMEOUT`` seconds for its
+        result, looking the key up themselves if it fails or times out.
+        """
+        token = self.token_store.get_token(key)
+        if token is not None and self.token_cache is not None:
+            self.token_cache.set(key, token)
+        return token
+
+    def check_status(self, status):
+        """Raise OAuthError unless ``status`` is TOKEN_VALID."""
+        if status != TOKEN_VALID:
+            raise OAuthError(STATUS_MESSAGES[status], status)
+        log.debug('Valid access')
+
+    def verify_access_tokens(self, keys, request=None, **kwargs):
+        """
+        Verify many access tokens at once, with the same rules as
+        verify_access_token(). Tokens missing from the cache are fetched
+        from the token store in bulk. ``request`` is optional, e.g. for
+        background jobs, except for scoped authentication classes.
+
+        Returns a dict mapping each key to a ``TokenResult(token, status)``
+        where status is one of the ``TOKEN_*`` constants.
+        """
+        keys = set(keys)
+        results = {}
+        tokens = {}
+        missing = []
+        for key in keys:
+            if self.signed_tokens and is_signed_key(key):
+                # Verified in place, as lookup_token() does
+                tokens[key] = load_signed_token(key)
+                continue
+            status = self.negative_status(key)
+            if status is not None:
+                results[key] = TokenResult(None, status)
+                continue
+            token = None
+            if self.token_cache is not None:
+                token = self.token_cache.get(key)
+            if token is None:
+                missing.append(key)
+            else:
+                tokens[key] = token
+        if missing:
+            found = self.token_store.get_tokens(missing)
+            if self.token_cache is not None:
+                for key, token in found.items():
+                    self.token_cache.set(key, token)
+            tokens.update(found)
+        for key in keys:
+            if key in results:
+                continue
+            token = tokens.get(key)
+            status = self.token_status(token, request)
+            self.remember_status(key, status)
+            results[key] = TokenResult(token, status)
+        return results
+
+    def token_status(self, token, request):
+        """Return the TOKEN_* status of a looked up token (or None)."""
+        if token is None:
+            return TOKEN_NOT_FOUND
+        started = stage_started()
+        expired = self.is_expired(token)
+        stage_finished(self.__class__, 'check_expiry', started)
+        if expired:
+            return TOKEN_EXPIRED
+        return TOKEN_VALID
+
+    def is_expired(self, token):
+        return token.expires < timezone.now()
+
 class OAuth2ScopedAuthentication(OAuth20Authentication):
     def __init__(self, realm="API", post=None, get=None, patch=None, put=None, delete=None, use_default=True, **kwargs):
         """
@@ -112,7 +453,10 @@ class OAuth2ScopedAuthentication(OAuth20Authentication):
                  Note: for oauth2-toolkit, you have to provide a space seperated string of combination of scopes
             you can also specify only one scope(instead of a list), and that scope will the only scope that has permission to the according method
         """
-        super(OAuth2ScopedAuthentication, self).__init__(realm)
+        # Other keyword arguments have always been ignored
+        super(OAuth2ScopedAuthentication, self).__init__(realm, **dict(
+            (name, value) for name, value in kwargs.items()
+            if name in self.options))
         self.POST = post
         if use_default:
             self.GET = get or post
@@ -129,38 +473,56 @@ class OAuth2ScopedAuthentication(OAuth20Authentication):
             self.PUT = put
             self.PATCH = patch
             self.DELETE = delete
+        self.compile_scope_requirements()
 
-    def verify_access_token(self, key, request, **kwargs):
-        token = super(OAuth2ScopedAuthentication, self).verify_access_token(key, request, **kwargs)
-        if not self.check_scope(token, request):
-            raise OAuthError("AccessToken does not meet scope requirement")
+    def compile_scope_requirements(self):
+        """
+        Compile the per-method scope requirements. Call this again after
+        changing ``GET``, ``POST``, ``PUT``, ``PATCH`` or ``DELETE``.
+        """
+        self.scope_requirements = compile_scope_requirements(dict(
+            (method, getattr(self, method)) for method in SCOPED_METHODS))
+
+    def token_status(self, token, request):
         # TODO: Return the actual scope granted if it is different
-        return token
+        status = super(OAuth2ScopedAuthentication, self).token_status(token, request)
+        if status == TOKEN_VALID:
+            started = stage_started()
+            allowed = self.check_scope(token, request)
+            stage_finished(self.__class__, 'check_scope', started)
+            if not allowed:
+                return TOKEN_INSUFFICIENT_SCOPE
+        return status
+
+    def verify_access_tokens(self, keys, request=None, method=None, **kwargs):
+        """
+        Like OAuth20Authentication.verify_access_tokens(), checking the
+        scopes required for ``method``, by default ``request``'s method.
+        """
+        if method is not None:
+            request = HttpRequest()
+            request.method = method
+        elif request is None:
+            raise TypeError(
+                'verify_access_tokens() needs a request or a method to check '
+                'scopes for.')
+        return super(OAuth2ScopedAuthentication, self).verify_access_tokens(
+            keys, request, **kwargs)
 
     def check_scope(self, token, request):
-        http_method = request.method
-        if not hasattr(self, http_method):
+        try:
+            requirement = self.scope_requirements[request.method]
+        except KeyError:
             raise OAuthError("HTTP method is not recognized")
-        required_scopes = getattr(self, http_method)
         # a None scope means always allowed
-        if required_scopes is None:
+        if requirement is None:
             return True
         """
-        The required scope is either a string or an iterable. If string,
-        check if it is allowed for our access token otherwise, iterate through
-        the required_scopes to see which scopes are allowed
+        Returns the required scopes (alternatives) allowed for our access
+        token. Tokens exposing a scope string are checked against its
+        memoized frozenset, others through allow_scopes
         """
-        # for non iterable types
-        if isinstance(required_scopes, six.string_types):
-            if token.allow_scopes(required_scopes.split()):
-                return [required_scopes]
-            return []
-        allowed_scopes = []
-        try:
-            for scope in required_scopes:
-                if token.allow_scopes(scope.split()):
-                    allowed_scopes.append(scope)
-        except:
-            raise Exception('Invalid required scope values')
-        else:
-            return allowed_scopes
+        scope = getattr(token, 'scope', None)
+        if scope is None:
+            return requirement.allowed_by_token(token)
+        return requirement.allowed(parse_scopes(scope))
@@ -0,0 +1,149 @@
+from django.db.models import Q
+from tastypie.authorization import Authorization
+from tastypie.exceptions import Unauthorized
+
+from .middleware import request_token
+from .scopes import MAX_MEMO_SIZE, parse_scopes
+
+"""
+Scope-aware tastypie authorization.
+
+``OAuth2ScopedAuthorization`` maps the scopes of the access token accepted
+by the authentication class to queryset filters. List operations apply the
+filters of all granted scopes as one ``filter()`` call, so restricting a
+large list costs no per-object checks; detail operations check the object
+with a single ``exists()`` query. The token is the one looked up while
+authenticating the request, so no further token query is made.
+"""
+
+# Marker for "every object"
+ALL = object()
+
+
+class ScopeFilters(object):
+    """
+    The compiled ``{scope: filter}`` rules of one operation.
+
+    Keys are space separated scope strings, all of which the token needs
+    for the rule to apply. A filter is a dict of lookups, a ``Q`` object, a
+    callable taking ``(bundle, token)`` and returning either, or None for
+    every object. The filters of all applying rules are combined with a
+    logic "or".
+    """
+    def __init__(self, rules):
+        self.rules = tuple(
+            (scope, frozenset(scope.split()), self.compile(value))
+            for scope, value in rules.items())
+        self.dynamic = any(callable(value) for _, _, value in self.rules)
+        self._results = {}
+
+    @staticmethod
+    def compile(value):
+        if value is None or callable(value):
+            return value
+        if isinstance(value, dict):
+            value = Q(**value)
+        # An empty Q would vanish when combined with another one
+        return value or None
+
+    def applying(self, token):
+        scope = getattr(token, 'scope', None)
+        if scope is None:
+            return [rule for rule in self.rules if token.allow_scopes(rule[1])]
+        granted = parse_scopes(scope)
+        return [rule for rule in self.rules if rule[1] <= granted]
+
+    def combine(self, rules, bundle, token):
+        combined = None
+        for _, _, value in rules:
+            if callable(value):
+                value = self.compile(value(bundle, token))
+            if value is None:
+                return ALL
+            combined = value if combined is None else combined | value
+        return combined
+
+    def filter_for(self, bundle, token):
+        """
+        Return the ``Q`` that objects visible to ``token`` must match, ``ALL``,
+        or None if the token may not see any.
+        """
+        scope = getattr(token, 'scope', None)
+        if self.dynamic or scope is None:
+            return self.combine(self.applying(token), bundle, token)
+        granted = parse_scopes(scope)
+        result = self._results.get(granted)
+        if result is None:
+            result = self.combine(self.applying(token), bundle, token)
+            if len(self._results) >= MAX_MEMO_SIZE:
+                self._results.clear()
+            self._results[granted] = result
+        return result
+
+
+class OAuth2ScopedAuthorization(Authorization):
+    """
+    Restricts what a token may read, update and delete by its scopes.
+
+    ``read``, ``update`` and ``delete`` are ``{scope: filter}`` dicts (see
+    ``ScopeFilters``), or None to leave that operation unrestricted. e.g.
+    ``read={'read': {'published': True}, 'admin': None}`` lets "read" tokens
+    see published objects and "admin" tokens see all of them. Requests
+    without an accepted OAuth token are denied restricted operations.
+    """
+    def __init__(self, read=None, update=None, delete=None):
+        self.filters = {}
+        for operation, rules in (('read', read), ('update', update),
+                                 ('delete', delete)):
+            if rules is not None:
+                self.filters[operation] = ScopeFilters(rules)
+
+    def get_filter(self, operation, bundle):
+        """Return the filter of ``operation`` for the bundle's request."""
+        filters = self.filters.get(operation)
+        if filters is None:
+            return ALL
+        token = None
+        if bundle.request is not None:
+            token = request_token(bundle.request)
+        if token is None:
+            return None
+        return filters.filter_for(bundle, token)
+
+    def filter_list(self, operation, object_list, bundle):
+        condition = self.get_filter(operation, bundle)
+        if condition is ALL:
+            return object_list
+        if condition is None:
+            return object_list.none()
+        return object_list.filter(condition)
+
+    def check_detail(self, operation, object_list, bundle):
+        condition = self.get_filter(operation, bundle)
+        if condition is ALL:
+            return True
+        if condition is None:
+            raise Unauthorized("The access token does not allow this.")
+        pk = getattr(bundle.obj, 'pk', None)
+        # Objects being created through PUT only need an applying scope
+        if pk is None or object_list.filter(condition).filter(pk=pk).exists():
+            return True
+        raise Unauthorized("The access token does not allow this.")
+
+    def read_list(self, object_list, bundle):
+        return self.filter_list('read', object_list, bundle)
+
+    def read_detail(self, object_list, bundle):
+        return self.check_detail('read', object_list, bundle)
+
+    def update_list(self, object_list, bundle):
+        return self.filter_list('update', object_list, bundle)
+
+    def update_detail(self, object_list, bundle):
+        return self.check_detail('update', object_list, bundle)
+
+    def delete_list(self, object_list, bundle):
+        return self.filter_list('delete', object_list, bundle)
+
+    def delete_detail(self, object_list, bundle):
+        return self.check_detail('delete', object_list, bundle)
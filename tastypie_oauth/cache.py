@@ -0,0 +1,379 @@
+import hashlib
+import math
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+import six
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+"""
+Caches for verified access tokens.
+
+Entries are keyed by a SHA-256 fingerprint of the access token so the raw
+secret never ends up as a dictionary or cache key.
+
+Every cache registers itself so that saving or deleting an ``AccessToken``
+drops the token from all of them (see ``invalidate_token``).
+
+The same classes serve as negative caches, remembering the status of
+unknown and expired keys (see ``get_default_negative_cache``).
+"""
+
+_token_caches = weakref.WeakSet()
+
+
+def token_fingerprint(key):
+    """Return the hex SHA-256 fingerprint used to key cached tokens."""
+    if isinstance(key, six.text_type):
+        key = key.encode('utf8')
+    return hashlib.sha256(key).hexdigest()
+
+
+def token_deadline(token, ttl):
+    """
+    Return the epoch time at which a cached token must be dropped: the
+    earlier of ``ttl`` seconds from now and the token's own expiry.
+    """
+    now = time.time()
+    deadline = now + ttl
+    expires = getattr(token, 'expires', None)
+    if expires is not None:
+        remaining = (expires - timezone.now()).total_seconds()
+        deadline = min(deadline, now + remaining)
+    return deadline
+
+
+class LocalTokenCache(object):
+    """
+    Bounded in-process LRU cache of verified access tokens.
+
+    Each entry lives for at most ``ttl`` seconds and never outlives the
+    token's ``expires``. Once ``max_size`` entries are held, the least
+    recently used entry is evicted. ``hits``, ``misses`` and ``evictions``
+    are kept so the cache can be sized against real traffic.
+    """
+    # Lookups never wait on I/O, so async code may call them directly
+    blocking = False
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _token_caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        fingerprint = token_fingerprint(key)
+        with self._lock:
+            entry = self._entries.pop(fingerprint, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            token, deadline = entry
+            if deadline <= time.time():
+                self.misses += 1
+                return None
+            # Re-insert to mark the entry as most recently used
+            self._entries[fingerprint] = entry
+            self.hits += 1
+            return token
+
+    def set(self, key, token):
+        deadline = token_deadline(token, self.ttl)
+        if deadline <= time.time():
+            return
+        fingerprint = token_fingerprint(key)
+        with self._lock:
+            self._entries.pop(fingerprint, None)
+            self._entries[fingerprint] = (token, deadline)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(token_fingerprint(key), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
+
+
+class DjangoTokenCache(object):
+    """
+    Token cache stored in a Django cache backend, shared by every worker
+    that points at the same backend (memcached, redis, ...).
+
+    Entries expire like ``LocalTokenCache`` entries; revocation is handled
+    by ``invalidate_token`` rather than by waiting for the TTL.
+    """
+    blocking = True
+
+    def __init__(self, alias='default', ttl=300, key_prefix='tastypie_oauth:token:'):
+        self.alias = alias
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        _token_caches.add(self)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return self.key_prefix + token_fingerprint(key)
+
+    def get(self, key):
+        token = self.cache.get(self.make_key(key))
+        if token is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return token
+
+    def set(self, key, token):
+        timeout = token_deadline(token, self.ttl) - time.time()
+        if timeout <= 0:
+            return
+        self.cache.set(self.make_key(key), token, int(math.ceil(timeout)))
+
+    def delete(self, key):
+        self.cache.delete(self.make_key(key))
+
+    @property
+    def version_key(self):
+        return self.key_prefix + 'version'
+
+    def get_version(self):
+        """Return the invalidation version (None until the first one)."""
+        return self.cache.get(self.version_key)
+
+    def invalidate(self, key):
+        """
+        Delete ``key`` and bump the invalidation version, so that the
+        earlier tiers of every process's ``TieredTokenCache`` are dropped.
+        """
+        self.delete(key)
+        try:
+            self.cache.incr(self.version_key)
+        except ValueError:
+            self.cache.add(self.version_key, 1, None)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class TieredTokenCache(object):
+    """
+    Chain of token caches, fastest first. A hit in a later tier is copied
+    into the earlier ones.
+
+    Invalidations only reach the caches of the process that saves or
+    deletes the token. To bound how long other processes keep serving it,
+    a tier exposing ``get_version`` (``DjangoTokenCache``) is polled at most
+    every ``version_interval`` seconds, and the tiers before it are cleared
+    when its invalidation version changed.
+    """
+    version_interval = 1
+
+    def __init__(self, *tiers):
+        self.tiers = tiers
+        self.versioned = None
+        for index, tier in enumerate(tiers):
+            if hasattr(tier, 'get_version'):
+                self.versioned = index
+                break
+        self._version = None
+        self._version_checked = None
+
+    @property
+    def blocking(self):
+        return any(tier.blocking for tier in self.tiers)
+
+    def version_due(self):
+        # Nothing to clear without a versioned tier after the first one
+        if not self.versioned:
+            return False
+        return (self._version_checked is None or
+                time.time() - self._version_checked >= self.version_interval)
+
+    def check_version(self):
+        """Clear the tiers before the versioned one if it was invalidated."""
+        checked = self._version_checked
+        self._version_checked = time.time()
+        version = self.tiers[self.versioned].get_version()
+        if checked is not None and version != self._version:
+            for tier in self.tiers[:self.versioned]:
+                if hasattr(tier, 'clear_for_version'):
+                    # Shared by the host's processes, cleared by one of them
+                    tier.clear_for_version(version)
+                else:
+                    tier.clear()
+        self._version = version
+
+    def get(self, key):
+        if self.version_due():
+            self.check_version()
+        for index, tier in enumerate(self.tiers):
+            token = tier.get(key)
+            if token is not None:
+                for earlier in self.tiers[:index]:
+                    earlier.set(key, token)
+                return token
+        return None
+
+    def set(self, key, token):
+        for tier in self.tiers:
+            tier.set(key, token)
+
+    def delete(self, key):
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def stats(self):
+        return [tier.stats() for tier in self.tiers]
+
+
+_default_token_cache = None
+_default_shared_token_cache = None
+_default_negative_cache = None
+_default_token_cache_lock = threading.Lock()
+
+
+def get_shared_token_cache():
+    """
+    Return the Django-cache token tier configured by the
+    ``TASTYPIE_OAUTH_SHARED_TOKEN_CACHE`` setting, or None if it is not set.
+
+    The setting is a dict with optional ``ALIAS``, ``TTL`` and
+    ``KEY_PREFIX`` keys.
+    """
+    global _default_shared_token_cache
+    options = getattr(settings, 'TASTYPIE_OAUTH_SHARED_TOKEN_CACHE', None)
+    if options is None:
+        return None
+    with _default_token_cache_lock:
+        if _default_shared_token_cache is None:
+            _default_shared_token_cache = DjangoTokenCache(
+                alias=options.get('ALIAS', 'default'),
+                ttl=options.get('TTL', 300),
+                key_prefix=options.get('KEY_PREFIX', 'tastypie_oauth:token:'),
+            )
+        return _default_shared_token_cache
+
+
+def get_default_token_cache():
+    """
+    Return the process-wide token cache configured by the
+    ``TASTYPIE_OAUTH_TOKEN_CACHE``, ``TASTYPIE_OAUTH_SHM_TOKEN_CACHE`` and
+    ``TASTYPIE_OAUTH_SHARED_TOKEN_CACHE`` settings, or None if none is set.
+
+    ``TASTYPIE_OAUTH_TOKEN_CACHE`` is a dict with optional ``MAX_SIZE`` and
+    ``TTL`` keys. When several settings are given, the in-process cache is
+    checked first, then the host's shared memory cache (see
+    ``tastypie_oauth.shm``), then the shared one.
+    """
+    global _default_token_cache
+    from .shm import get_shm_token_cache
+    shm = get_shm_token_cache()
+    shared = get_shared_token_cache()
+    options = getattr(settings, 'TASTYPIE_OAUTH_TOKEN_CACHE', None)
+    with _default_token_cache_lock:
+        if _default_token_cache is None:
+            tiers = []
+            if options is not None:
+                tiers.append(LocalTokenCache(
+                    max_size=options.get('MAX_SIZE', 1024),
+                    ttl=options.get('TTL', 60),
+                ))
+            tiers.extend(tier for tier in (shm, shared) if tier is not None)
+            if len(tiers) == 1:
+                _default_token_cache = tiers[0]
+            elif tiers:
+                _default_token_cache = TieredTokenCache(*tiers)
+        return _default_token_cache
+
+
+def get_default_negative_cache():
+    """
+    Return the process-wide negative cache configured by the
+    ``TASTYPIE_OAUTH_NEGATIVE_TOKEN_CACHE`` setting, or None if it is not
+    set.
+
+    The setting is a dict with optional ``MAX_SIZE`` and ``TTL`` keys. With
+    an ``ALIAS`` key the entries are kept in that Django cache instead, so
+    that a token created by another process clears them too.
+    """
+    global _default_negative_cache
+    options = getattr(settings, 'TASTYPIE_OAUTH_NEGATIVE_TOKEN_CACHE', None)
+    if options is None:
+        return None
+    with _default_token_cache_lock:
+        if _default_negative_cache is None:
+            if options.get('ALIAS'):
+                _default_negative_cache = DjangoTokenCache(
+                    alias=options['ALIAS'],
+                    ttl=options.get('TTL', 30),
+                    key_prefix=options.get(
+                        'KEY_PREFIX', 'tastypie_oauth:negative:'),
+                )
+            else:
+                _default_negative_cache = LocalTokenCache(
+                    max_size=options.get('MAX_SIZE', 10000),
+                    ttl=options.get('TTL', 30),
+                )
+        return _default_negative_cache
+
+
+def reset_default_caches(setting=None, **kwargs):
+    """
+    ``setting_changed`` receiver dropping the process-wide caches when their
+    settings change, e.g. under ``override_settings`` in tests.
+    """
+    global _default_token_cache, _default_shared_token_cache, _default_negative_cache
+    if setting in ('TASTYPIE_OAUTH_TOKEN_CACHE',
+                   'TASTYPIE_OAUTH_SHM_TOKEN_CACHE',
+                   'TASTYPIE_OAUTH_SHARED_TOKEN_CACHE'):
+        with _default_token_cache_lock:
+            _default_token_cache = _default_shared_token_cache = None
+    elif setting == 'TASTYPIE_OAUTH_NEGATIVE_TOKEN_CACHE':
+        with _default_token_cache_lock:
+            _default_negative_cache = None
+
+
+def invalidate_token(sender, instance, **kwargs):
+    """
+    Signal receiver dropping a saved or deleted ``AccessToken`` from every
+    token and negative cache, including the shared ones of processes that
+    never authenticate requests themselves. Caches that can tell other
+    processes (``invalidate``) do so, unless the token was just created.
+    """
+    # Make sure the configured caches exist and are registered
+    get_default_token_cache()
+    get_default_negative_cache()
+    created = kwargs.get('created', False)
+    for cache in list(_token_caches):
+        if not created and hasattr(cache, 'invalidate'):
+            cache.invalidate(instance.token)
+        else:
+            cache.delete(instance.token)
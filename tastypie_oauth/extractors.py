@@ -0,0 +1,197 @@
+import re
+from json.decoder import scanstring
+
+import six
+from django.conf import settings
+from django.utils.module_loading import import_string
+from six.moves.urllib.parse import unquote_plus
+
+"""
+Extraction of the access token from requests.
+
+The authentication classes run an ordered list of extractors, stopping at
+the first one that finds a key. Each extractor only touches the part of
+the request it reads: the ``Authorization`` header extractor never parses
+the query string or reads the body, so header-only configurations leave
+streamed uploads alone.
+
+The JSON scanner walks the body only as far as the top-level
+``oauth_consumer_key`` member, skipping over other values without building
+them, and never looks past ``max_bytes``. Keys beyond the cap are treated
+as missing.
+"""
+
+CONSUMER_KEY = 'oauth_consumer_key'
+
+# Accepted Authorization header schemes, compared case-insensitively
+AUTHORIZATION_SCHEMES = ('bearer', 'oauth')
+
+# RFC 6750 b64token, plus ":" used by signed tokens
+_CREDENTIALS = re.compile(r'[A-Za-z0-9\-._~+/:]+=*\Z')
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_STRUCTURE = re.compile(r'["{}\[\]]')
+_SCALAR = re.compile(r'[^,}\]\s]*')
+
+
+def _skip_value(s, pos):
+    """Return the index just past the JSON value starting at ``pos``."""
+    char = s[pos]
+    if char == '"':
+        return _STRING.match(s, pos).end()
+    if char not in '{[':
+        return _SCALAR.match(s, pos).end()
+    depth = 0
+    while True:
+        match = _STRUCTURE.search(s, pos)
+        char = match.group()
+        if char == '"':
+            pos = _STRING.match(s, match.start()).end()
+            continue
+        pos = match.end()
+        depth += 1 if char in '{[' else -1
+        if depth == 0:
+            return pos
+
+
+def find_json_key(body, name=CONSUMER_KEY, max_bytes=65536):
+    """
+    Return the string value of the top-level member ``name`` of the JSON
+    object in ``body`` (bytes), or None if it is missing, is not a string,
+    lies beyond ``max_bytes`` or the document is malformed.
+    """
+    s = body[:max_bytes].decode('utf8', 'ignore')
+    # Skip a byte order mark
+    pos = 1 if s.startswith(u'\ufeff') else 0
+    try:
+        pos = _WHITESPACE.match(s, pos).end()
+        if s[pos] != '{':
+            return None
+        pos += 1
+        while True:
+            pos = _WHITESPACE.match(s, pos).end()
+            if s[pos] != '"':
+                return None
+            key, pos = scanstring(s, pos + 1)
+            pos = _WHITESPACE.match(s, pos).end()
+            if s[pos] != ':':
+                return None
+            pos = _WHITESPACE.match(s, pos + 1).end()
+            if key == name:
+                if s[pos] != '"':
+                    return None
+                return scanstring(s, pos + 1)[0]
+            pos = _WHITESPACE.match(s, _skip_value(s, pos)).end()
+            if s[pos] != ',':
+                return None
+            pos += 1
+    except (AttributeError, IndexError, ValueError):
+        # Truncated or malformed document
+        return None
+
+
+def find_form_key(body, name=CONSUMER_KEY, max_bytes=65536):
+    """
+    Return the value of ``name`` in an ``application/x-www-form-urlencoded``
+    ``body`` (bytes), or None if it is missing or lies beyond ``max_bytes``.
+    """
+    prefix = body[:max_bytes]
+    truncated = len(body) > max_bytes
+    marker = name.encode('ascii') + b'='
+    start = 0
+    while start <= len(prefix):
+        end = prefix.find(b'&', start)
+        if end == -1:
+            if truncated:
+                return None
+            end = len(prefix)
+        if prefix.startswith(marker, start):
+            value = prefix[start + len(marker):end].decode('utf8', 'replace')
+            return unquote_plus(value)
+        start = end + 1
+    return None
+
+
+def _content_type(request):
+    return request.META.get('CONTENT_TYPE', '').split(';')[0].strip()
+
+
+class MalformedCredentials(ValueError):
+    pass
+
+
+def parse_authorization(value, schemes=AUTHORIZATION_SCHEMES):
+    """
+    Return the credentials of an ``Authorization`` header value using one
+    of ``schemes``, or None for other schemes. Raise MalformedCredentials
+    if the value is not exactly a scheme, one space and a token.
+    """
+    scheme, space, credentials = value.partition(' ')
+    if not space:
+        raise MalformedCredentials('Malformed Authorization header.')
+    if scheme.lower() not in schemes:
+        return None
+    if not _CREDENTIALS.match(credentials):
+        raise MalformedCredentials('Malformed Authorization header.')
+    return credentials
+
+
+def header_key(request, authentication):
+    """The token of a Bearer (or OAuth) ``Authorization`` header."""
+    for header in ('HTTP_AUTHORIZATION', 'Authorization'):
+        value = request.META.get(header)
+        if value:
+            return parse_authorization(
+                value, authentication.authorization_schemes)
+    return None
+
+
+def query_key(request, authentication):
+    """The ``oauth_consumer_key`` query string parameter."""
+    return request.GET.get(CONSUMER_KEY)
+
+
+def form_body_key(request, authentication):
+    """``oauth_consumer_key`` in a form-encoded POST body."""
+    if (request.method == 'POST' and authentication.body_credentials
+            and _content_type(request) == 'application/x-www-form-urlencoded'):
+        return find_form_key(request.body, max_bytes=authentication.max_body_bytes)
+    return None
+
+
+def json_body_key(request, authentication):
+    """``oauth_consumer_key`` in a JSON POST body."""
+    if (request.method == 'POST' and authentication.body_credentials
+            and _content_type(request) == 'application/json'):
+        return find_json_key(request.body, max_bytes=authentication.max_body_bytes)
+    return None
+
+
+EXTRACTORS = {
+    'header': header_key,
+    'query': query_key,
+    'form': form_body_key,
+    'json': json_body_key,
+}
+
+DEFAULT_EXTRACTORS = ('header', 'query', 'form', 'json')
+
+
+def get_extractors(extractors=None):
+    """
+    Return a list of extractor functions. ``extractors`` is a sequence of
+    names from ``EXTRACTORS``, functions ``(request, authentication)`` or
+    dotted paths to them; it defaults to the
+    ``TASTYPIE_OAUTH_CREDENTIAL_EXTRACTORS`` setting, then
+    ``DEFAULT_EXTRACTORS``.
+    """
+    if extractors is None:
+        extractors = getattr(settings, 'TASTYPIE_OAUTH_CREDENTIAL_EXTRACTORS',
+                             DEFAULT_EXTRACTORS)
+    result = []
+    for extractor in extractors:
+        if isinstance(extractor, six.string_types):
+            extractor = EXTRACTORS.get(extractor) or import_string(extractor)
+        result.append(extractor)
+    return result
@@ -0,0 +1,51 @@
+import logging
+import threading
+import time
+
+"""
+Rate-limited logging of expected authentication failures.
+
+Expected failures (unknown, expired or under-scoped tokens, malformed
+headers) are routine under bad traffic, so they are logged without a
+traceback and at most once per ``interval`` seconds for each reason and
+client. The next record for a reason and client reports how many similar
+failures were suppressed in between.
+"""
+
+
+class FailureLogger(object):
+    level = logging.INFO
+    # Upper bound on tracked (reason, client) pairs
+    max_entries = 10000
+
+    def __init__(self, logger, interval=60):
+        self.logger = logger
+        self.interval = interval
+        # (reason, client) -> [time of the last record, suppressed count]
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget all rate-limiting state."""
+        with self._lock:
+            self._entries.clear()
+
+    def log(self, reason, client):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        now = time.time()
+        key = (reason, client)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.interval:
+                entry[1] += 1
+                return
+            suppressed = entry[1] if entry is not None else 0
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = [now, 0]
+        self.logger.log(
+            self.level,
+            'OAuth20Authentication failed: reason=%s client=%s suppressed=%d',
+            reason, client, suppressed,
+            extra={'reason': reason, 'client': client, 'suppressed': suppressed})
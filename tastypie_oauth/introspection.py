@@ -0,0 +1,140 @@
+import datetime
+import threading
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .cache import LocalTokenCache, token_fingerprint
+from .scopes import parse_scopes
+from .signed import _from_epoch
+from .singleflight import SingleFlight
+from .stores import BaseTokenStore
+
+"""
+Token store backed by an RFC 7662 token introspection endpoint, for
+services that do not share a database with the authorization server.
+
+Use it with ``TASTYPIE_OAUTH_TOKEN_STORE =
+'tastypie_oauth.introspection.IntrospectionTokenStore'`` and configure it
+with ``TASTYPIE_OAUTH_INTROSPECTION``, a dict with keys:
+
+- ``URL``: the introspection endpoint (required)
+- ``AUTH``: ``(client_id, client_secret)`` for HTTP basic authentication
+- ``TOKEN``: a bearer token to authenticate with instead
+- ``TIMEOUT``: request timeout in seconds (5)
+- ``POOL_SIZE``: pooled connections kept open to the endpoint (10)
+- ``MAX_SIZE``: responses cached in process (10000)
+- ``TTL``: upper bound in seconds on caching an active response (300);
+  active responses are never cached past their ``exp``
+- ``INACTIVE_TTL``: seconds an inactive response is cached (30)
+
+Needs the ``requests`` package.
+"""
+
+_INACTIVE = object()
+
+
+class IntrospectedToken(object):
+    """
+    An active introspection response, shaped like an ``AccessToken``.
+    ``user`` is the local user named by the response's ``username``,
+    loaded when it is used, or ``AnonymousUser`` if the response names no
+    user (e.g. for client credentials tokens) or no local user matches.
+    """
+    def __init__(self, data, expires):
+        self.data = data
+        self.scope = data.get('scope', '')
+        self.client_id = data.get('client_id')
+        self.expires = expires
+        self.user = SimpleLazyObject(self.get_user)
+
+    def get_user(self):
+        username = self.data.get('username')
+        if username is None:
+            return AnonymousUser()
+        user_model = get_user_model()
+        try:
+            return user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            return AnonymousUser()
+
+    def is_expired(self):
+        return timezone.now() >= self.expires
+
+    def allow_scopes(self, scopes):
+        if not scopes:
+            return True
+        return set(scopes).issubset(parse_scopes(self.scope))
+
+
+class IntrospectionTokenStore(BaseTokenStore):
+    token_class = IntrospectedToken
+
+    def __init__(self, url=None, auth=None, token=None, timeout=None,
+                 pool_size=None, max_size=None, ttl=None, inactive_ttl=None):
+        try:
+            import requests
+        except ImportError:
+            raise ImproperlyConfigured(
+                'IntrospectionTokenStore needs the requests package.')
+        options = getattr(settings, 'TASTYPIE_OAUTH_INTROSPECTION', {})
+        self.url = url or options.get('URL')
+        if not self.url:
+            raise ImproperlyConfigured(
+                'TASTYPIE_OAUTH_INTROSPECTION needs a URL.')
+        self.auth = auth or options.get('AUTH')
+        self.timeout = timeout or options.get('TIMEOUT', 5)
+        token = token or options.get('TOKEN')
+        self.ttl = ttl or options.get('TTL', 300)
+
+        pool_size = pool_size or options.get('POOL_SIZE', 10)
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if token:
+            self.session.headers['Authorization'] = 'Bearer ' + token
+
+        max_size = max_size or options.get('MAX_SIZE', 10000)
+        self.active = LocalTokenCache(max_size=max_size, ttl=self.ttl)
+        self.inactive = LocalTokenCache(
+            max_size=max_size, ttl=inactive_ttl or options.get('INACTIVE_TTL', 30))
+        self.flight = SingleFlight(timeout=self.timeout)
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    def get_token(self, key):
+        token = self.active.get(key)
+        if token is not None:
+            return token
+        if self.inactive.get(key) is not None:
+            return None
+        return self.flight.do(token_fingerprint(key), self.introspect, key)
+
+    def introspect(self, key):
+        """Ask the endpoint about ``key`` and cache the answer."""
+        with self._calls_lock:
+            self.calls += 1
+        response = self.session.post(
+            self.url,
+            data={'token': key, 'token_type_hint': 'access_token'},
+            auth=self.auth,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        if not data.get('active'):
+            self.inactive.set(key, _INACTIVE)
+            return None
+        if data.get('exp') is not None:
+            expires = _from_epoch(data['exp'])
+        else:
+            expires = timezone.now() + datetime.timedelta(seconds=self.ttl)
+        token = self.token_class(data, expires)
+        self.active.set(key, token)
+        return token
@@ -0,0 +1,94 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from django.utils import timezone
+from oauth2_provider.models import AccessToken, RefreshToken
+
+"""
+Delete expired access tokens in small primary key ranges, so that no
+statement holds locks for long and nothing but primary keys is read into
+Python.
+
+Tokens that still have a refresh token are kept, as deleting them would
+cascade to the refresh token. Token caches need no invalidation: cache
+entries never outlive the token's expiry, and negatively cached keys stay
+rejected either way.
+"""
+
+
+class Command(BaseCommand):
+    help = 'Delete expired access tokens in bounded batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Maximum number of tokens deleted per statement.')
+        parser.add_argument(
+            '--sleep', type=float, default=0.1,
+            help='Seconds to pause between batches.')
+        parser.add_argument(
+            '--dry-run', action='store_true', default=False,
+            help='Only report how many tokens would be deleted.')
+
+    def handle(self, *args, **options):
+        self.now = timezone.now()
+        self.using = router.db_for_write(AccessToken)
+        started = time.time()
+        if options['dry_run']:
+            count = self.get_queryset().count()
+            self.stdout.write('Would delete %d expired tokens.' % count)
+            return
+        count = 0
+        batches = 0
+        for start, end in self.batches(options['batch_size']):
+            if batches and options['sleep']:
+                time.sleep(options['sleep'])
+            count += self.delete_batch(start, end)
+            batches += 1
+        elapsed = time.time() - started
+        self.stdout.write(
+            'Deleted %d expired tokens in %d batches in %.2fs (%d rows/s).' % (
+                count, batches, elapsed, count / elapsed if elapsed else count))
+
+    def get_queryset(self):
+        return AccessToken.objects.using(self.using).filter(
+            expires__lt=self.now, refresh_token__isnull=True)
+
+    def batches(self, batch_size):
+        """
+        Yield ``(start, end)`` primary key ranges holding at most
+        ``batch_size`` deletable tokens each; ``end`` is None for the last.
+        """
+        pks = self.get_queryset().order_by('pk').values_list('pk', flat=True)
+        start = pks.first()
+        while start is not None:
+            end = pks.filter(pk__gte=start)[batch_size:batch_size + 1].first()
+            yield start, end
+            start = end
+
+    def delete_batch(self, start, end):
+        """Delete the deletable tokens with ``start <= pk < end``."""
+        connection = connections[self.using]
+        quote = connection.ops.quote_name
+        table = quote(AccessToken._meta.db_table)
+        pk = quote(AccessToken._meta.pk.column)
+        refresh_field = RefreshToken._meta.get_field('access_token')
+        sql = (
+            'DELETE FROM {table} WHERE {pk} >= %s{end} AND {expires} < %s '
+            'AND NOT EXISTS (SELECT 1 FROM {refresh} WHERE {refresh}.{fk} = {table}.{pk})'
+        ).format(
+            table=table,
+            pk=pk,
+            end=' AND %s < %%s' % pk if end is not None else '',
+            expires=quote(AccessToken._meta.get_field('expires').column),
+            refresh=quote(RefreshToken._meta.db_table),
+            fk=quote(refresh_field.column),
+        )
+        params = [start] + ([end] if end is not None else [])
+        params.append(AccessToken._meta.get_field('expires').get_db_prep_value(
+            self.now, connection))
+        with transaction.atomic(using=self.using):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                return cursor.rowcount
@@ -0,0 +1,98 @@
+import sys
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tastypie_oauth.cache import LocalTokenCache, get_default_token_cache
+from tastypie_oauth.models import TokenUsage
+from tastypie_oauth.stores import ModelTokenStore
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+"""
+Fill the token caches with the tokens most likely to be used next, so
+that the first requests after a deploy or a cache flush do not all hit
+the database.
+"""
+
+
+def peak_memory():
+    """Return the peak resident memory of this process in MB, or None."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return rss / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0)
+
+
+class Command(BaseCommand):
+    help = 'Load recently active, unexpired access tokens into the token cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=10000,
+            help='Maximum number of tokens to load.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Rows fetched from the database at a time.')
+        parser.add_argument(
+            '--order', choices=['expires', 'activity'], default='expires',
+            help='Load the tokens expiring last, or the ones used last '
+                 '(needs TASTYPIE_OAUTH_USAGE_TRACKING).')
+
+    def handle(self, *args, **options):
+        token_cache = get_default_token_cache()
+        if token_cache is None:
+            raise CommandError(
+                'No token cache is configured; set TASTYPIE_OAUTH_TOKEN_CACHE '
+                'or TASTYPIE_OAUTH_SHARED_TOKEN_CACHE.')
+        if isinstance(token_cache, LocalTokenCache):
+            self.stderr.write(
+                'Only an in-process token cache is configured; it is dropped '
+                'when this command exits. Configure '
+                'TASTYPIE_OAUTH_SHARED_TOKEN_CACHE, or call this command from '
+                'each worker on startup.')
+        started = time.time()
+        count = 0
+        for token in self.tokens(
+                options['limit'], options['chunk_size'], options['order']):
+            token_cache.set(token.token, token)
+            count += 1
+        elapsed = time.time() - started
+        memory = peak_memory()
+        self.stdout.write('Warmed %d tokens in %.2fs (%d rows/s%s).' % (
+            count, elapsed, count / elapsed if elapsed else count,
+            ', peak memory %.1f MB' % memory if memory is not None else ''))
+
+    def tokens(self, limit, chunk_size, order):
+        queryset = ModelTokenStore().get_queryset().filter(
+            expires__gt=timezone.now())
+        if order == 'activity':
+            return self.active_tokens(queryset, limit, chunk_size)
+        queryset = queryset.order_by('-expires')[:limit]
+        if django.VERSION >= (2, 0):
+            return queryset.iterator(chunk_size=chunk_size)
+        return queryset.iterator()
+
+    def active_tokens(self, queryset, limit, chunk_size):
+        """Yield tokens by their last use, newest first, a chunk at a time."""
+        usage = TokenUsage.objects.filter(token_id__isnull=False).order_by(
+            '-last_used').values_list('token_id', flat=True)
+        count = 0
+        start = 0
+        while count < limit:
+            ids = list(usage[start:start + chunk_size])
+            if not ids:
+                return
+            start += chunk_size
+            tokens = dict((token.pk, token)
+                          for token in queryset.filter(pk__in=ids))
+            for pk in ids:
+                if pk in tokens and count < limit:
+                    count += 1
+                    yield tokens[pk]
@@ -0,0 +1,98 @@
+from django.utils.functional import cached_property
+
+try:
+    from django.utils.deprecation import MiddlewareMixin
+except ImportError:  # Django < 1.10
+    MiddlewareMixin = object
+
+"""
+Authenticate-once support for requests handled by several authentication
+classes and views.
+
+Token lookups are memoized on the request (see ``request_lookups``), so a
+request going through several tastypie resources, ``prepend_urls`` views
+and plain Django views costs one lookup per key. ``OAuthTokenMiddleware``
+additionally gives every request a lazy ``request.oauth`` for views that do
+not use tastypie authentication.
+"""
+
+
+def request_lookups(request):
+    """
+    Return the lookups memoized on ``request``, mapping the authentication
+    classes' ``lookup_key(key)`` to ``(token, negative status)``. Expiry and
+    scopes are still checked by each authentication class.
+    """
+    try:
+        return request._oauth_lookups
+    except AttributeError:
+        request._oauth_lookups = {}
+        return request._oauth_lookups
+
+
+def request_counted(request):
+    """
+    Return the ``(key, quotas or usage recorder)`` pairs that already
+    counted ``request``, so that a request authenticated by several
+    resources is counted once.
+    """
+    try:
+        return request._oauth_counted
+    except AttributeError:
+        request._oauth_counted = set()
+        return request._oauth_counted
+
+
+def request_token(request):
+    """
+    Return the token an authentication class accepted for ``request``, or
+    None, without a query.
+    """
+    return getattr(request, '_oauth_token', None)
+
+
+class OAuthRequestState(object):
+    """
+    The OAuth state of a request, resolved on first use: ``key`` is the
+    access token sent with it and ``token`` the valid token it names (or
+    None), as checked by ``authentication``.
+    """
+    def __init__(self, request, authentication):
+        self.request = request
+        self.authentication = authentication
+
+    @cached_property
+    def key(self):
+        from .authentication import OAuthError
+        try:
+            return self.authentication.extract_key(self.request) or None
+        except OAuthError:
+            return None
+
+    @cached_property
+    def result(self):
+        """The ``TokenResult`` of ``key``, or None without a key."""
+        if self.key is None:
+            return None
+        return self.authentication.resolve_access_token(self.key, self.request)
+
+    @property
+    def token(self):
+        from .authentication import TOKEN_VALID
+        if self.result is None or self.result.status != TOKEN_VALID:
+            return None
+        return self.result.token
+
+
+class OAuthTokenMiddleware(MiddlewareMixin):
+    """Sets a lazily resolved ``OAuthRequestState`` as ``request.oauth``."""
+    authentication = None
+
+    def get_authentication(self):
+        if self.authentication is None:
+            from .authentication import OAuth20Authentication
+            self.authentication = OAuth20Authentication()
+        return self.authentication
+
+    def process_request(self, request):
+        request.oauth = OAuthRequestState(request, self.get_authentication())
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenUsage',
+            fields=[
+                ('fingerprint', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('token_id', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('request_count', models.BigIntegerField(default=0)),
+                ('last_used', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'token usage',
+                'verbose_name_plural': 'token usage',
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import models
+
+
+class TokenUsage(models.Model):
+    """
+    How often, and when last, an access token was used. Rows are written
+    in batches by ``tastypie_oauth.usage.UsageRecorder``; ``fingerprint`` is
+    the token's ``token_fingerprint`` so the secret itself is not stored.
+    """
+    fingerprint = models.CharField(max_length=64, primary_key=True)
+    token_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    request_count = models.BigIntegerField(default=0)
+    last_used = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'token usage'
+        verbose_name_plural = 'token usage'
+
+    def __str__(self):
+        return self.fingerprint
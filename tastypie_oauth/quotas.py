@@ -0,0 +1,242 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+from .cache import token_fingerprint
+
+"""
+Per-token and per-application request quotas.
+
+Quotas are sliding windows: a request is allowed while the requests of the
+current window, plus the previous window's weighted by how much of it
+still overlaps the last ``period`` seconds, stay below ``limit``. Counters
+live in a Django cache backend shared by all workers.
+
+To keep the cache off the request path, each worker counts locally and only
+pushes its increments and reads the shared counters every ``sync_interval``
+seconds per client. Across workers a client can therefore exceed its quota
+by up to what the other workers let through in one sync interval.
+"""
+
+
+class _Counter(object):
+    __slots__ = ('window', 'previous', 'shared', 'pending', 'synced',
+                 'syncing')
+
+    def __init__(self):
+        self.window = None
+        self.previous = 0
+        self.shared = 0
+        self.pending = 0
+        self.synced = None
+        self.syncing = False
+
+
+class SlidingWindowQuota(object):
+    """
+    At most ``limit`` requests per client in any ``period`` seconds.
+
+    The lock only guards in-process state; cache round trips are made
+    outside of it, so one client's sync does not hold up other requests.
+    """
+    # Clients whose counters are kept in process
+    max_size = 10000
+
+    def __init__(self, limit, period=60, name='quota', alias='default',
+                 sync_interval=1, key_prefix='tastypie_oauth:quota:',
+                 clock=time.time):
+        if limit <= 0 or period <= 0:
+            raise ImproperlyConfigured(
+                'Quota limits and periods must be positive, got %r requests '
+                'per %r seconds.' % (limit, period))
+        self.limit = limit
+        self.period = period
+        self.name = name
+        self.alias = alias
+        self.sync_interval = sync_interval
+        self.key_prefix = key_prefix
+        self.clock = clock
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def make_key(self, client, window):
+        return '%s%s:%s:%d' % (self.key_prefix, self.name, client, window)
+
+    def check(self, client):
+        """
+        Return the seconds until ``client`` may make another request, or
+        None if it may make one now. Allowed requests are not counted until
+        ``consume`` is called.
+        """
+        now = self.clock()
+        counter = self.counter(client, now)
+        with self._lock:
+            elapsed = (now - counter.window * self.period) / float(self.period)
+            current = counter.shared + counter.pending
+            if counter.previous * (1 - elapsed) + current + 1 <= self.limit:
+                return None
+            if current + 1 > self.limit:
+                # Only the next window can make room
+                wait = 2 - elapsed - (self.limit - 1.0) / current
+            else:
+                room = float(self.limit - current - 1)
+                wait = 1 - room / counter.previous - elapsed
+        # Rounded so float noise cannot add a second
+        return max(1, int(math.ceil(round(wait * self.period, 6))))
+
+    def consume(self, client):
+        counter = self.counter(client, self.clock())
+        with self._lock:
+            counter.pending += 1
+
+    def sync_due(self, client, now):
+        """Whether ``counter()`` would sync ``client``'s counter."""
+        window = int(now // self.period)
+        with self._lock:
+            counter = self._counters.get(client)
+            if counter is None or counter.window != window:
+                return True
+            return (not counter.syncing
+                    and now - counter.synced >= self.sync_interval)
+
+    def counter(self, client, now):
+        """Return ``client``'s counter, synced first if it is due."""
+        window = int(now // self.period)
+        with self._lock:
+            counter = self._counters.pop(client, None)
+            if counter is None:
+                counter = _Counter()
+            self._counters[client] = counter
+            while len(self._counters) > self.max_size:
+                self._counters.popitem(last=False)
+            if counter.window == window and (
+                    counter.syncing
+                    or now - counter.synced < self.sync_interval):
+                # Current, or being synced by another thread
+                return counter
+            counter.syncing = True
+            pushed_window, pending = counter.window, counter.pending
+            counter.pending = 0
+        try:
+            previous, shared = self.sync(client, pushed_window, pending, window)
+        except Exception:
+            with self._lock:
+                counter.pending += pending
+                counter.syncing = False
+            raise
+        with self._lock:
+            counter.window = window
+            counter.previous = previous
+            counter.shared = shared
+            counter.synced = now
+            counter.syncing = False
+        return counter
+
+    def sync(self, client, pushed_window, pending, window):
+        """
+        Add ``pending`` requests to the shared count of ``pushed_window``
+        and return the shared counts of the window before ``window`` and of
+        ``window`` itself.
+        """
+        cache = self.cache
+        if pending:
+            key = self.make_key(client, pushed_window)
+            # Keep counters for two periods: one as current, one as previous
+            cache.add(key, 0, self.period * 2)
+            try:
+                cache.incr(key, pending)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.add(key, pending, self.period * 2)
+        previous_key = self.make_key(client, window - 1)
+        current_key = self.make_key(client, window)
+        counts = cache.get_many([previous_key, current_key])
+        return counts.get(previous_key, 0), counts.get(current_key, 0)
+
+
+class TokenQuotas(object):
+    """
+    The quotas enforced by the authentication classes: one per access
+    token and one per application (``application_id`` or the ``client_id``
+    of introspected tokens). Either may be None.
+    """
+    def __init__(self, token=None, application=None):
+        self.token = token
+        self.application = application
+
+    def clients(self, key, token):
+        if self.token is not None:
+            yield self.token, token_fingerprint(key)
+        if self.application is not None:
+            application = (getattr(token, 'application_id', None)
+                           or getattr(token, 'client_id', None))
+            if application is not None:
+                yield self.application, application
+
+    def sync_due(self, key, token):
+        return any(quota.sync_due(client, quota.clock())
+                   for quota, client in self.clients(key, token))
+
+    def sync(self, key, token):
+        """
+        Sync the counters ``check`` reads for ``token`` with the cache, e.g.
+        in a worker thread so that ``check`` makes no cache round trip on an
+        event loop.
+        """
+        for quota, client in self.clients(key, token):
+            quota.counter(client, quota.clock())
+
+    def check(self, key, token):
+        """
+        Count a request made with ``token`` and return None, or return the
+        seconds to wait if it is over one of the quotas.
+        """
+        clients = list(self.clients(key, token))
+        for quota, client in clients:
+            retry_after = quota.check(client)
+            if retry_after is not None:
+                return retry_after
+        for quota, client in clients:
+            quota.consume(client)
+        return None
+
+
+_default_quotas = None
+_default_quotas_lock = threading.Lock()
+
+
+def get_default_quotas():
+    """
+    Return the quotas configured by the ``TASTYPIE_OAUTH_QUOTAS`` setting,
+    or None if it is not set.
+
+    The setting is a dict with optional ``TOKEN`` and ``APPLICATION`` keys,
+    each a ``(limit, period in seconds)`` pair, and optional ``ALIAS`` (the
+    Django cache holding the counters) and ``SYNC_INTERVAL`` keys.
+    """
+    global _default_quotas
+    options = getattr(settings, 'TASTYPIE_OAUTH_QUOTAS', None)
+    if options is None:
+        return None
+    with _default_quotas_lock:
+        if _default_quotas is None:
+            quotas = {}
+            for name in ('TOKEN', 'APPLICATION'):
+                if options.get(name):
+                    limit, period = options[name]
+                    quotas[name.lower()] = SlidingWindowQuota(
+                        limit, period, name=name.lower(),
+                        alias=options.get('ALIAS', 'default'),
+                        sync_interval=options.get('SYNC_INTERVAL', 1),
+                    )
+            _default_quotas = TokenQuotas(**quotas)
+        return _default_quotas
@@ -0,0 +1,82 @@
+import threading
+
+import six
+
+"""
+Precompiled scope checks for OAuth2ScopedAuthentication.
+
+Required scopes are compiled once into frozensets, and the scope string of
+each token is parsed once and memoized, so checking a request is a couple
+of dictionary lookups and set comparisons.
+"""
+
+SCOPED_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+
+# Upper bound on memoized entries, so arbitrary scope strings cannot grow
+# the memo without limit
+MAX_MEMO_SIZE = 1024
+
+_parsed_scopes = {}
+_parsed_scopes_lock = threading.Lock()
+
+
+def parse_scopes(scope_string):
+    """Return the scopes of a space separated scope string as a frozenset."""
+    scopes = _parsed_scopes.get(scope_string)
+    if scopes is None:
+        scopes = frozenset((scope_string or '').split())
+        with _parsed_scopes_lock:
+            if len(_parsed_scopes) >= MAX_MEMO_SIZE:
+                _parsed_scopes.clear()
+            _parsed_scopes[scope_string] = scopes
+    return scopes
+
+
+class ScopeRequirement(object):
+    """
+    The compiled scope requirement of one HTTP method.
+
+    ``required`` is either a single space separated scope string or an
+    iterable of them with a logic "or" between them. ``allowed(granted)``
+    returns the alternatives satisfied by the ``granted`` frozenset; results
+    are memoized per granted set, so repeated checks do not grow with the
+    number of alternatives. The returned list is shared and must not be
+    modified.
+    """
+    def __init__(self, required):
+        if isinstance(required, six.string_types):
+            required = (required,)
+        try:
+            self.alternatives = tuple(
+                (scope, frozenset(scope.split())) for scope in required)
+        except Exception:
+            raise Exception('Invalid required scope values')
+        self._results = {}
+
+    def allowed(self, granted):
+        result = self._results.get(granted)
+        if result is None:
+            result = [scope for scope, needed in self.alternatives
+                      if needed <= granted]
+            if len(self._results) >= MAX_MEMO_SIZE:
+                self._results.clear()
+            self._results[granted] = result
+        return result
+
+    def allowed_by_token(self, token):
+        """
+        Like ``allowed`` for tokens that only implement ``allow_scopes``
+        rather than exposing a ``scope`` string.
+        """
+        return [scope for scope, needed in self.alternatives
+                if token.allow_scopes(needed)]
+
+
+def compile_scope_requirements(requirements):
+    """
+    Compile a ``{method: required scopes}`` mapping into
+    ``{method: ScopeRequirement}``. None (no requirement) is kept as None.
+    """
+    return dict(
+        (method, None if required is None else ScopeRequirement(required))
+        for method, required in requirements.items())
@@ -0,0 +1,363 @@
+"""
+Token cache shared by all worker processes of a host through a memory
+mapped file, typically under ``/dev/shm``.
+
+The file is a fixed-size set-associative hash table: a token's fingerprint
+picks a bucket of ``ways`` slots, and each slot holds the fingerprint, the
+user, access token and application ids, the token's expiry, the cache
+deadline and the token's scopes as a bitmask over a fixed scope vocabulary.
+Tokens with scopes outside the vocabulary, or without one of the ids, are
+not cached.
+
+Reads take no lock: every slot carries a sequence number that writers make
+odd while they write, and readers retry when it changed under them. Writes
+take one of ``stripes`` locks, each a thread lock plus an ``fcntl`` lock on
+one byte of the file. A full bucket evicts expired entries first, then the
+first entry not read since the clock hand last passed it.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+import six
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .cache import _token_caches
+from .scopes import parse_scopes
+from .signed import SignedAccessToken, _from_epoch, _to_epoch
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MAGIC = b'TPOSHM02'
+# Magic, buckets, ways, layout digest (see layout_digest())
+HEADER = struct.Struct('<8sII32s')
+# Invalidation version the table was last cleared for, after the header
+VERSION = struct.Struct('<q')
+HEADER_SIZE = 64
+# Clock hand of a bucket, padded to 8 bytes
+BUCKET_HEADER_SIZE = 8
+# seq, referenced, fingerprint, user id, access token id, application id,
+# expires, deadline, scope mask
+SLOT = struct.Struct('<IB3x32sqqqddQ')
+SEQ = struct.Struct('<I')
+BYTE = struct.Struct('<B')
+# Offset of the referenced flag in a slot
+REFERENCED = 4
+READ_RETRIES = 3
+EMPTY = b'\0' * 32
+
+
+class SharedToken(SignedAccessToken):
+    """A token read back from a ``SharedMemoryTokenCache``."""
+    def __init__(self, user_id, scope, expires, access_token_id,
+                 application_id):
+        super(SharedToken, self).__init__(user_id, scope, expires,
+                                          access_token_id)
+        self.application_id = application_id
+
+
+class SharedMemoryTokenCache(object):
+    # Lookups never wait on I/O, so async code may call them directly
+    blocking = False
+
+    def __init__(self, path, buckets=8192, ways=8, ttl=60, scopes=None,
+                 stripes=64):
+        if fcntl is None:
+            raise ImproperlyConfigured(
+                'SharedMemoryTokenCache needs fcntl, which is not available '
+                'on this platform.')
+        if scopes is None:
+            scopes = default_scopes()
+        if len(scopes) > 64:
+            raise ImproperlyConfigured(
+                'SharedMemoryTokenCache supports at most 64 scopes.')
+        self.path = path
+        self.buckets = buckets
+        self.ways = ways
+        self.ttl = ttl
+        self.scopes = tuple(scopes)
+        self.scope_bits = dict(
+            (scope, 1 << bit) for bit, scope in enumerate(self.scopes))
+        self.digest = layout_digest(self.scopes)
+        self.stripes = min(stripes, buckets)
+        self.bucket_size = BUCKET_HEADER_SIZE + ways * SLOT.size
+        self.size = HEADER_SIZE + buckets * self.bucket_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._locks = [threading.Lock() for _ in range(self.stripes)]
+        self._version_lock = threading.Lock()
+        self._open()
+        _token_caches.add(self)
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # Byte 0 guards initialization; bytes 1.. are the stripe locks
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, 0)
+            try:
+                header = os.read(fd, HEADER.size)
+                expected = HEADER.pack(
+                    MAGIC, self.buckets, self.ways, self.digest)
+                if len(header) < HEADER.size or header[:8] != MAGIC:
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self.size)
+                    os.lseek(fd, 0, os.SEEK_SET)
+                    os.write(fd, expected)
+                elif header[:16] != expected[:16]:
+                    raise ImproperlyConfigured(
+                        '%s was created with another geometry; remove it or '
+                        'use the same number of buckets and ways.' % self.path)
+                elif header != expected:
+                    # Scope masks would be decoded with other scopes
+                    raise ImproperlyConfigured(
+                        '%s was created with another scope vocabulary or slot '
+                        'format; use another path when SCOPES change.'
+                        % self.path)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, 1, 0)
+            self._map = mmap.mmap(fd, self.size)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def close(self):
+        _token_caches.discard(self)
+        self._map.close()
+        os.close(self._fd)
+
+    def _locate(self, key):
+        if isinstance(key, six.text_type):
+            key = key.encode('utf8')
+        fingerprint = hashlib.sha256(key).digest()
+        bucket = struct.unpack_from('<Q', fingerprint)[0] % self.buckets
+        return fingerprint, bucket
+
+    def _slot_offset(self, bucket, way):
+        return (HEADER_SIZE + bucket * self.bucket_size + BUCKET_HEADER_SIZE
+                + way * SLOT.size)
+
+    def _read(self, offset):
+        """Return a consistent copy of the slot at ``offset``, or None."""
+        data = self._map
+        for _ in range(READ_RETRIES):
+            seq = SEQ.unpack_from(data, offset)[0]
+            if seq & 1:
+                continue
+            slot = SLOT.unpack_from(data, offset)
+            if SEQ.unpack_from(data, offset)[0] == seq == slot[0]:
+                return slot
+        return None
+
+    def _write(self, offset, fingerprint, user_id=0, token_id=0,
+               application_id=0, expires=0, deadline=0, mask=0):
+        odd = ((SEQ.unpack_from(self._map, offset)[0] + 1) | 1) & 0xFFFFFFFF
+        SEQ.pack_into(self._map, offset, odd)
+        SLOT.pack_into(self._map, offset, odd, 0, fingerprint, user_id,
+                       token_id, application_id, expires, deadline, mask)
+        SEQ.pack_into(self._map, offset, (odd + 1) & 0xFFFFFFFF)
+
+    def _lock(self, bucket):
+        stripe = bucket % self.stripes
+        lock = self._locks[stripe]
+        lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe + 1)
+        except Exception:
+            lock.release()
+            raise
+        return stripe
+
+    def _unlock(self, stripe):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe + 1)
+        self._locks[stripe].release()
+
+    def get(self, key):
+        fingerprint, bucket = self._locate(key)
+        now = time.time()
+        for way in range(self.ways):
+            offset = self._slot_offset(bucket, way)
+            slot = self._read(offset)
+            if slot is None or slot[2] != fingerprint:
+                continue
+            if slot[7] <= now:
+                break
+            # Racy on purpose: a lost update only costs a second chance
+            BYTE.pack_into(self._map, offset + REFERENCED, 1)
+            self.hits += 1
+            return SharedToken(slot[3], self.scope_string(slot[8]),
+                               _from_epoch(slot[6]), slot[4], slot[5])
+        self.misses += 1
+        return None
+
+    def set(self, key, token):
+        user_id = getattr(token, 'user_id', None)
+        token_id = (getattr(token, 'access_token_id', None)
+                    or getattr(token, 'pk', None))
+        application_id = getattr(token, 'application_id', None)
+        if user_id is None or token_id is None or application_id is None:
+            return
+        mask = self.scope_mask(token.scope)
+        if mask is None:
+            return
+        expires = _to_epoch(token.expires)
+        now = time.time()
+        deadline = min(now + self.ttl, expires)
+        if deadline <= now:
+            return
+        fingerprint, bucket = self._locate(key)
+        stripe = self._lock(bucket)
+        try:
+            way = self._choose_way(bucket, fingerprint, now)
+            self._write(self._slot_offset(bucket, way), fingerprint, user_id,
+                        token_id, application_id, expires, deadline, mask)
+        finally:
+            self._unlock(stripe)
+
+    def _choose_way(self, bucket, fingerprint, now):
+        """Return the way to write ``fingerprint`` to; called locked."""
+        free = None
+        for way in range(self.ways):
+            slot = SLOT.unpack_from(self._map, self._slot_offset(bucket, way))
+            if slot[2] == fingerprint:
+                return way
+            if free is None and (slot[2] == EMPTY or slot[7] <= now):
+                free = way
+        if free is not None:
+            return free
+        hand_offset = HEADER_SIZE + bucket * self.bucket_size
+        hand = BYTE.unpack_from(self._map, hand_offset)[0] % self.ways
+        while True:
+            offset = self._slot_offset(bucket, hand)
+            if not BYTE.unpack_from(self._map, offset + REFERENCED)[0]:
+                break
+            BYTE.pack_into(self._map, offset + REFERENCED, 0)
+            hand = (hand + 1) % self.ways
+        BYTE.pack_into(self._map, hand_offset, (hand + 1) % self.ways)
+        self.evictions += 1
+        return hand
+
+    def delete(self, key):
+        fingerprint, bucket = self._locate(key)
+        stripe = self._lock(bucket)
+        try:
+            for way in range(self.ways):
+                offset = self._slot_offset(bucket, way)
+                if SLOT.unpack_from(self._map, offset)[2] == fingerprint:
+                    self._write(offset, EMPTY)
+        finally:
+            self._unlock(stripe)
+
+    def clear(self):
+        for bucket in range(self.buckets):
+            stripe = self._lock(bucket)
+            try:
+                for way in range(self.ways):
+                    offset = self._slot_offset(bucket, way)
+                    if SLOT.unpack_from(self._map, offset)[2] != EMPTY:
+                        self._write(offset, EMPTY)
+            finally:
+                self._unlock(stripe)
+
+    def clear_for_version(self, version):
+        """
+        Clear the table for the shared cache's invalidation ``version``
+        (see ``TieredTokenCache.check_version``), unless another process of
+        the host already did.
+        """
+        version = version or 0
+        with self._version_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, 0)
+            try:
+                if VERSION.unpack_from(self._map, HEADER.size)[0] == version:
+                    return False
+                self.clear()
+                VERSION.pack_into(self._map, HEADER.size, version)
+                return True
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, 0)
+
+    def scope_mask(self, scope):
+        """Return the bitmask of a scope string, or None if it cannot be."""
+        mask = 0
+        for name in parse_scopes(scope):
+            bit = self.scope_bits.get(name)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+    def scope_string(self, mask):
+        return ' '.join(scope for scope in self.scopes
+                        if mask & self.scope_bits[scope])
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions}
+
+
+def layout_digest(scopes):
+    """
+    Digest of the slot format and the ordered scope vocabulary, which
+    processes sharing a file must agree on to decode its scope masks.
+    """
+    layout = SLOT.format
+    if not isinstance(layout, six.text_type):
+        layout = layout.decode('ascii')
+    return hashlib.sha256(
+        u'\n'.join((layout,) + tuple(scopes)).encode('utf8')).digest()
+
+
+def default_scopes():
+    """The scopes declared in django-oauth-toolkit's ``SCOPES`` setting."""
+    try:
+        from oauth2_provider.settings import oauth2_settings
+    except ImportError:
+        return ()
+    return sorted(oauth2_settings.SCOPES)
+
+
+_default_shm_cache = None
+_default_shm_cache_lock = threading.Lock()
+
+
+def get_shm_token_cache():
+    """
+    Return the shared memory token tier configured by the
+    ``TASTYPIE_OAUTH_SHM_TOKEN_CACHE`` setting, or None if it is not set.
+
+    The setting is a dict with a ``PATH`` key and optional ``BUCKETS``,
+    ``WAYS``, ``TTL`` and ``SCOPES`` keys. Every process using the same
+    path must use the same settings.
+    """
+    global _default_shm_cache
+    options = getattr(settings, 'TASTYPIE_OAUTH_SHM_TOKEN_CACHE', None)
+    if options is None:
+        return None
+    with _default_shm_cache_lock:
+        if _default_shm_cache is None:
+            _default_shm_cache = SharedMemoryTokenCache(
+                options['PATH'],
+                buckets=options.get('BUCKETS', 8192),
+                ways=options.get('WAYS', 8),
+                ttl=options.get('TTL', 60),
+                scopes=options.get('SCOPES'),
+            )
+        return _default_shm_cache
+
+
+def reset_default_shm_cache(setting=None, **kwargs):
+    """``setting_changed`` receiver dropping the process-wide shm cache."""
+    global _default_shm_cache
+    if setting == 'TASTYPIE_OAUTH_SHM_TOKEN_CACHE':
+        with _default_shm_cache_lock:
+            _default_shm_cache = None
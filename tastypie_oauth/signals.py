@@ -0,0 +1,48 @@
+from timeit import default_timer
+
+from django.dispatch import Signal
+
+"""
+Instrumentation signals sent while authenticating requests. The sender is
+the authentication class.
+
+Nothing is timed or sent unless a receiver is connected, so unused signals
+cost a single attribute check per stage.
+"""
+
+# Sent after each stage of the authentication pipeline with ``stage``
+# ("extract_key", "lookup_token", "check_expiry" or "check_scope") and its
+# ``duration`` in seconds.
+auth_stage = Signal()
+
+# Sent once per is_authenticated() call with ``outcome`` (see the OUTCOME_*
+# and TOKEN_* constants of tastypie_oauth.authentication) and ``request``.
+auth_outcome = Signal()
+
+# Sent after each cache lookup with ``cache`` ("token" or "negative") and
+# ``hit`` (a bool).
+token_cache_lookup = Signal()
+
+
+def stage_started():
+    """Return the start time of a stage, or None if nobody is listening."""
+    if auth_stage.receivers:
+        return default_timer()
+    return None
+
+
+def stage_finished(sender, stage, started):
+    """Send ``auth_stage`` for a stage begun at ``started``."""
+    if started is not None:
+        auth_stage.send(sender, stage=stage,
+                        duration=default_timer() - started)
+
+
+def send_outcome(sender, outcome, request):
+    if auth_outcome.receivers:
+        auth_outcome.send(sender, outcome=outcome, request=request)
+
+
+def send_cache_lookup(sender, cache, hit):
+    if token_cache_lookup.receivers:
+        token_cache_lookup.send(sender, cache=cache, hit=hit)
@@ -0,0 +1,141 @@
+import calendar
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .scopes import parse_scopes
+
+"""
+Stateless signed access tokens.
+
+A signed token carries its user id, scopes and expiry, signed with Django's
+signing framework, so it is verified without a database lookup. Signed
+tokens are told apart from opaque django-oauth-toolkit tokens by their
+``SIGNED_TOKEN_PREFIX``.
+
+Settings:
+
+- ``TASTYPIE_OAUTH_SIGNING_KEYS``: the keys signed tokens are verified with;
+  the first one signs new tokens. Keep retired keys in the list until the
+  tokens signed with them have expired. Defaults to ``[SECRET_KEY]``.
+- ``TASTYPIE_OAUTH_SIGNED_TOKEN_DENYLIST``: alias of a Django cache used to
+  revoke signed tokens before they expire, or None (the default).
+"""
+
+SIGNED_TOKEN_PREFIX = 'st1.'
+SALT = 'tastypie_oauth.signed'
+DENYLIST_KEY_PREFIX = 'tastypie_oauth:denied:'
+
+
+def get_signing_keys():
+    return getattr(settings, 'TASTYPIE_OAUTH_SIGNING_KEYS', None) or [settings.SECRET_KEY]
+
+
+def get_denylist():
+    alias = getattr(settings, 'TASTYPIE_OAUTH_SIGNED_TOKEN_DENYLIST', None)
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+def _to_epoch(value):
+    if timezone.is_aware(value):
+        return calendar.timegm(value.utctimetuple())
+    return int(time.mktime(value.timetuple()))
+
+
+def _from_epoch(value):
+    if settings.USE_TZ:
+        return datetime.datetime.fromtimestamp(value, timezone.utc)
+    return datetime.datetime.fromtimestamp(value)
+
+
+def is_signed_key(key):
+    return key.startswith(SIGNED_TOKEN_PREFIX)
+
+
+class SignedAccessToken(object):
+    """
+    A verified signed token. It quacks like an ``AccessToken`` as far as the
+    authentication classes are concerned; ``user`` is only loaded from the
+    database when it is used.
+    """
+    def __init__(self, user_id, scope, expires, access_token_id=None):
+        self.user_id = user_id
+        self.scope = scope
+        self.expires = expires
+        self.access_token_id = access_token_id
+        self.user = SimpleLazyObject(
+            lambda: get_user_model()._default_manager.get(pk=user_id))
+
+    def is_expired(self):
+        return timezone.now() >= self.expires
+
+    def allow_scopes(self, scopes):
+        if not scopes:
+            return True
+        return set(scopes).issubset(parse_scopes(self.scope))
+
+
+def mint_signed_token(access_token, expires=None, key=None):
+    """
+    Return a signed token with the user and scopes of ``access_token``.
+    It expires at ``expires`` but never after ``access_token`` does.
+    """
+    if expires is None or expires > access_token.expires:
+        expires = access_token.expires
+    payload = {
+        'u': access_token.user_id,
+        's': access_token.scope,
+        'e': _to_epoch(expires),
+        'a': access_token.pk,
+    }
+    return SIGNED_TOKEN_PREFIX + signing.dumps(
+        payload, key=key or get_signing_keys()[0], salt=SALT)
+
+
+def load_signed_token(key, keys=None):
+    """
+    Return the SignedAccessToken for ``key``, or None if its signature does
+    not match any of the signing keys or it has been revoked.
+    """
+    value = key[len(SIGNED_TOKEN_PREFIX):]
+    for signing_key in keys or get_signing_keys():
+        try:
+            payload = signing.loads(value, key=signing_key, salt=SALT)
+            break
+        except signing.BadSignature:
+            continue
+    else:
+        return None
+    denylist = get_denylist()
+    if denylist is not None and payload.get('a') is not None:
+        if denylist.get(DENYLIST_KEY_PREFIX + str(payload['a'])):
+            return None
+    return SignedAccessToken(payload['u'], payload['s'],
+                             _from_epoch(payload['e']), payload.get('a'))
+
+
+def revoke_signed_tokens(access_token):
+    """
+    Reject every signed token minted from ``access_token`` until it
+    expires. Needs ``TASTYPIE_OAUTH_SIGNED_TOKEN_DENYLIST``.
+    """
+    denylist = get_denylist()
+    if denylist is None:
+        return
+    timeout = (access_token.expires - timezone.now()).total_seconds()
+    if timeout > 0:
+        denylist.set(DENYLIST_KEY_PREFIX + str(access_token.pk), True,
+                     int(timeout) + 1)
+
+
+def revoke_deleted_token(sender, instance, **kwargs):
+    """Signal receiver revoking signed tokens of a deleted AccessToken."""
+    revoke_signed_tokens(instance)
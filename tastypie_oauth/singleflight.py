@@ -0,0 +1,45 @@
+import threading
+
+"""
+Coalescing of concurrent calls for the same key.
+
+The first caller for a key runs the call; callers arriving while it is in
+flight wait for its result instead of repeating the work. A waiter that
+times out, or whose leader failed, makes the call itself.
+"""
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight(object):
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args):
+        """Return ``func(*args)``, sharing one call per in-flight ``key``."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.event.wait(self.timeout) and not call.failed:
+                return call.result
+            return func(*args)
+        try:
+            call.result = func(*args)
+        except Exception:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
@@ -0,0 +1,289 @@
+import threading
+
+import six
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+from oauth2_provider.models import AccessToken, get_application_model
+
+from .scopes import parse_scopes
+
+try:
+    from .aio import AsyncModelTokenStoreMixin, AsyncTokenViewStoreMixin
+except SyntaxError:  # Python < 3.5
+    class AsyncModelTokenStoreMixin(object):
+        pass
+
+    class AsyncTokenViewStoreMixin(object):
+        pass
+
+"""
+Token stores look access tokens up by key for the authentication classes.
+
+A store returns an object exposing ``expires``, ``user`` and
+``allow_scopes(scopes)`` (an ``AccessToken`` or anything shaped like one),
+or None when the key is unknown. Expiry and scope checks are done by the
+authentication classes, so every store gets the same rules.
+"""
+
+
+class BaseTokenStore(object):
+    def get_token(self, key):
+        raise NotImplementedError()
+
+    def get_tokens(self, keys):
+        """
+        Return a dict mapping the known keys among ``keys`` to their tokens.
+        Stores that can look many tokens up at once should override this.
+        """
+        tokens = {}
+        for key in keys:
+            token = self.get_token(key)
+            if token is not None:
+                tokens[key] = token
+        return tokens
+
+    def memo_key(self):
+        """
+        Return what identifies this store in the lookups memoized on a
+        request (see ``tastypie_oauth.middleware``). Stores with equal memo
+        keys must return the same tokens for the same keys.
+        """
+        return self
+
+
+class ModelTokenStore(AsyncModelTokenStoreMixin, BaseTokenStore):
+    """
+    Default store backed by django-oauth-toolkit's ``AccessToken`` model.
+
+    The token's user and application are fetched in the same query so that
+    reading ``token.user`` afterwards does not hit the database again.
+
+    With ``using`` (``TASTYPIE_OAUTH_TOKEN_DATABASE``) tokens are read from
+    that database alias, typically a read replica. As a replica may lag
+    behind, keys it does not know or holds as expired are looked up once
+    more on the primary database (the router's write database).
+    ``replica_hits`` and ``primary_fallbacks`` count both cases.
+    """
+    select_related = ('user', 'application')
+    # Keys per query in get_tokens(), below SQLite's 999 parameter limit
+    batch_size = 500
+
+    def __init__(self, select_related=None, batch_size=None, using=None):
+        if select_related is not None:
+            self.select_related = select_related
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if using is None:
+            using = getattr(settings, 'TASTYPIE_OAUTH_TOKEN_DATABASE', None)
+        self.using = using
+        self.replica_hits = 0
+        self.primary_fallbacks = 0
+
+    def memo_key(self):
+        return (self.__class__, self.using, tuple(self.select_related or ()))
+
+    def get_queryset(self, using=None):
+        if not self.select_related:
+            queryset = AccessToken.objects.all()
+        else:
+            queryset = AccessToken.objects.select_related(*self.select_related)
+        if using is not None:
+            queryset = queryset.using(using)
+        return queryset
+
+    def get_primary(self):
+        """Return the alias of the primary database, or None if it is ``using``."""
+        primary = router.db_for_write(AccessToken)
+        if self.using is None or self.using == primary:
+            return None
+        return primary
+
+    def is_current(self, token):
+        """Whether a token read from the replica can be trusted as is."""
+        return token is not None and token.expires >= timezone.now()
+
+    def get_token(self, key):
+        token = self.fetch_token(key, self.using)
+        primary = self.get_primary()
+        if primary is None:
+            return token
+        if self.is_current(token):
+            self.replica_hits += 1
+            return token
+        self.primary_fallbacks += 1
+        return self.fetch_token(key, primary)
+
+    def fetch_token(self, key, using):
+        try:
+            return self.get_queryset(using).get(token=key)
+        except AccessToken.DoesNotExist:
+            return None
+
+    def get_tokens(self, keys):
+        keys = list(keys)
+        tokens = self.fetch_tokens(keys, self.using)
+        primary = self.get_primary()
+        if primary is None:
+            return tokens
+        stale = [key for key in keys if not self.is_current(tokens.get(key))]
+        self.replica_hits += len(keys) - len(stale)
+        if stale:
+            self.primary_fallbacks += len(stale)
+            tokens.update(self.fetch_tokens(stale, primary))
+        return tokens
+
+    def fetch_tokens(self, keys, using):
+        tokens = {}
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            for token in self.get_queryset(using).filter(token__in=batch):
+                tokens[token.token] = token
+        return tokens
+
+    def stats(self):
+        return {'replica_hits': self.replica_hits,
+                'primary_fallbacks': self.primary_fallbacks}
+
+
+class TokenView(object):
+    """
+    Compact read-only stand-in for an ``AccessToken`` holding only the
+    columns authentication needs. ``user`` and ``application`` are lazy
+    objects, loaded from the database when they are first used.
+    """
+    __slots__ = ('id', 'token', 'user_id', 'application_id', 'scope',
+                 'expires', '_user', '_application')
+    # Columns fetched by TokenViewStore, in constructor order
+    fields = ('id', 'token', 'user_id', 'application_id', 'scope', 'expires')
+
+    def __init__(self, id, token, user_id, application_id, scope, expires):
+        self.id = id
+        self.token = token
+        self.user_id = user_id
+        self.application_id = application_id
+        self.scope = scope
+        self.expires = expires
+        self._user = self._application = None
+
+    def __getstate__(self):
+        # Pickling a lazy object would load it
+        return tuple(getattr(self, field) for field in self.fields)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def user(self):
+        if self.user_id is None:
+            return None
+        if self._user is None:
+            user_id = self.user_id
+            self._user = SimpleLazyObject(
+                lambda: get_user_model()._default_manager.get(pk=user_id))
+        return self._user
+
+    @property
+    def application(self):
+        if self.application_id is None:
+            return None
+        if self._application is None:
+            application_id = self.application_id
+            self._application = SimpleLazyObject(
+                lambda: get_application_model()._default_manager.get(
+                    pk=application_id))
+        return self._application
+
+    def is_valid(self, scopes=None):
+        return not self.is_expired() and self.allow_scopes(scopes)
+
+    def is_expired(self):
+        return not self.expires or timezone.now() >= self.expires
+
+    def allow_scopes(self, scopes):
+        if not scopes:
+            return True
+        return set(scopes).issubset(parse_scopes(self.scope))
+
+    def __repr__(self):
+        return '<TokenView: %s>' % self.id
+
+
+class TokenViewStore(AsyncTokenViewStoreMixin, ModelTokenStore):
+    """
+    ``ModelTokenStore`` returning ``TokenView`` objects built from
+    ``values_list()`` rows rather than model instances, which saves the
+    memory and time of hydrating every ``AccessToken`` field. The user is
+    loaded on first use, with a query of its own, so pair this store with
+    a user cache (``TASTYPIE_OAUTH_USER_CACHE``) when resources use it.
+    """
+    token_class = TokenView
+
+    def get_queryset(self, using=None):
+        queryset = AccessToken.objects.values_list(*self.token_class.fields)
+        if using is not None:
+            queryset = queryset.using(using)
+        return queryset
+
+    def fetch_token(self, key, using):
+        try:
+            return self.token_class(*self.get_queryset(using).get(token=key))
+        except AccessToken.DoesNotExist:
+            return None
+
+    def fetch_tokens(self, keys, using):
+        tokens = {}
+        for start in range(0, len(keys), self.batch_size):
+            batch = keys[start:start + self.batch_size]
+            for row in self.get_queryset(using).filter(token__in=batch):
+                token = self.token_class(*row)
+                tokens[token.token] = token
+        return tokens
+
+
+_default_token_store = None
+_default_token_store_lock = threading.Lock()
+
+
+def get_token_store(store=None):
+    """
+    Return a token store instance.
+
+    ``store`` may be a store instance, a store class or a dotted path to
+    one. When it is None the ``TASTYPIE_OAUTH_TOKEN_STORE`` setting is used,
+    falling back to ``ModelTokenStore``. The store named by the setting is
+    created once per process and shared by every authentication class, so
+    are its connections, caches and coalesced lookups.
+    """
+    global _default_token_store
+    if store is None:
+        setting = getattr(settings, 'TASTYPIE_OAUTH_TOKEN_STORE', None)
+        if setting is None:
+            return ModelTokenStore()
+        with _default_token_store_lock:
+            if _default_token_store is None:
+                _default_token_store = get_token_store(setting)
+            return _default_token_store
+    if isinstance(store, six.string_types):
+        store = import_string(store)
+    if isinstance(store, type):
+        store = store()
+    return store
+
+
+def reset_default_token_store(setting=None, **kwargs):
+    """``setting_changed`` receiver dropping the process-wide token store."""
+    global _default_token_store
+    if setting in ('TASTYPIE_OAUTH_TOKEN_STORE',
+                   'TASTYPIE_OAUTH_TOKEN_DATABASE',
+                   'TASTYPIE_OAUTH_INTROSPECTION'):
+        with _default_token_store_lock:
+            _default_token_store = None
@@ -0,0 +1,189 @@
+import atexit
+import logging
+import os
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .cache import token_fingerprint
+from .models import TokenUsage
+
+"""
+Write-behind recording of token usage.
+
+Successful authentications only bump an in-memory counter. A background
+thread writes the pending counts to ``TokenUsage`` every ``interval``
+seconds, or sooner once ``max_pending`` tokens are waiting, with one UPDATE
+for the known tokens and one bulk INSERT for the new ones per batch. The
+write rate of a worker is therefore bounded by the flush interval, not by
+its request rate. Pending counts are flushed at interpreter exit. A forked
+child starts with nothing pending, as its parent writes what it counted.
+"""
+
+log = logging.getLogger('tastypie_oauth')
+
+_recorders = weakref.WeakSet()
+
+
+class UsageRecorder(object):
+    # Rows per UPDATE statement: each takes five parameters (one in the IN
+    # clause, two in each CASE), below SQLite's limit of 999
+    batch_size = 999 // 5
+
+    def __init__(self, max_pending=1000, interval=5, using='default'):
+        self.max_pending = max_pending
+        self.interval = interval
+        self.using = using
+        self._stopped = False
+        self.reset()
+        _recorders.add(self)
+
+    def reset(self):
+        """Drop pending counts and thread state, e.g. in a forked child."""
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+
+    def record(self, key, token):
+        """Count one use of ``token``, authenticated with ``key``."""
+        if self._pid != os.getpid():
+            self.start()
+        now = timezone.now()
+        fingerprint = token_fingerprint(key)
+        token_id = getattr(token, 'access_token_id', None) or getattr(token, 'pk', None)
+        with self._lock:
+            entry = self._pending.get(fingerprint)
+            if entry is None:
+                self._pending[fingerprint] = [1, now, token_id]
+            else:
+                entry[0] += 1
+                entry[1] = now
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wakeup.set()
+
+    def start(self):
+        """Start the flushing thread (again after a fork)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Forked without an after-fork hook (Python < 3.7)
+                self._pending = {}
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self.run, name='tastypie-oauth-usage')
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception('Error flushing token usage.')
+            finally:
+                connections[self.using].close()
+
+    def stop(self):
+        """Stop the flushing thread and write what is pending."""
+        self._stopped = True
+        self._wakeup.set()
+        try:
+            self.flush()
+        except Exception:
+            log.exception('Error flushing token usage.')
+
+    def flush(self):
+        """Write the pending counts to the database."""
+        # Held throughout, so a flush returns after any in-flight one
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            items = list(pending.items())
+            for start in range(0, len(items), self.batch_size):
+                self.write(dict(items[start:start + self.batch_size]))
+
+    def existing_fingerprints(self, queryset, batch):
+        return set(queryset.filter(
+            fingerprint__in=list(batch)).values_list('fingerprint', flat=True))
+
+    def write(self, batch):
+        queryset = TokenUsage.objects.using(self.using)
+        existing = self.existing_fingerprints(queryset, batch)
+        if existing:
+            queryset.filter(fingerprint__in=list(existing)).update(
+                request_count=F('request_count') + Case(*[
+                    When(fingerprint=fingerprint, then=Value(batch[fingerprint][0]))
+                    for fingerprint in existing]),
+                last_used=Case(*[
+                    When(fingerprint=fingerprint, then=Value(batch[fingerprint][1]))
+                    for fingerprint in existing]),
+            )
+        new = [
+            TokenUsage(fingerprint=fingerprint, request_count=count,
+                       last_used=last_used, token_id=token_id)
+            for fingerprint, (count, last_used, token_id) in batch.items()
+            if fingerprint not in existing]
+        if not new:
+            return
+        try:
+            with transaction.atomic(using=self.using):
+                queryset.bulk_create(new)
+        except IntegrityError:
+            # Another process inserted some of these rows first
+            for usage in new:
+                updated = queryset.filter(fingerprint=usage.fingerprint).update(
+                    request_count=F('request_count') + usage.request_count,
+                    last_used=usage.last_used)
+                if not updated:
+                    usage.save(using=self.using, force_insert=True)
+
+
+def stop_recorders():
+    """Flush every usage recorder; run at interpreter exit."""
+    for recorder in list(_recorders):
+        recorder.stop()
+
+
+def reset_recorders():
+    for recorder in list(_recorders):
+        recorder.reset()
+
+
+atexit.register(stop_recorders)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_recorders)
+
+
+_default_usage_recorder = None
+_default_usage_recorder_lock = threading.Lock()
+
+
+def get_default_usage_recorder():
+    """
+    Return the process-wide usage recorder configured by the
+    ``TASTYPIE_OAUTH_USAGE_TRACKING`` setting, or None if it is not set.
+
+    The setting is a dict with optional ``MAX_PENDING``, ``INTERVAL`` and
+    ``DATABASE`` keys.
+    """
+    global _default_usage_recorder
+    options = getattr(settings, 'TASTYPIE_OAUTH_USAGE_TRACKING', None)
+    if options is None:
+        return None
+    with _default_usage_recorder_lock:
+        if _default_usage_recorder is None:
+            _default_usage_recorder = UsageRecorder(
+                max_pending=options.get('MAX_PENDING', 1000),
+                interval=options.get('INTERVAL', 5),
+                using=options.get('DATABASE', 'default'),
+            )
+        return _default_usage_recorder
@@ -0,0 +1,122 @@
+import copy
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+
+"""
+Per-process cache of the users behind access tokens.
+
+With a user cache, the authentication classes set ``request.user`` to a
+lazy object: the user is only fetched when a resource actually uses it, and
+then usually from this cache rather than the database. Every request gets
+its own copy of the cached user, so per-request state such as the
+permission cache of ``has_perm`` is not shared between requests.
+
+Saving or deleting a user (which includes changing ``is_active``) drops it
+from every user cache; changes made with ``QuerySet.update()`` are seen
+once the entry's ``ttl`` runs out.
+"""
+
+_user_caches = weakref.WeakSet()
+
+
+class UserProjectionCache(object):
+    """
+    Bounded LRU cache of users keyed by primary key. With ``fields``, only
+    those fields are loaded; others are fetched on access like any deferred
+    field.
+    """
+    def __init__(self, max_size=1024, ttl=60, fields=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.fields = fields
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _user_caches.add(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_queryset(self):
+        queryset = get_user_model()._default_manager.all()
+        if self.fields:
+            queryset = queryset.only(*self.fields)
+        return queryset
+
+    def get(self, user_id):
+        """Return a copy of the user ``user_id``, or AnonymousUser if gone."""
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None and entry[1] > time.time():
+                self._entries[user_id] = entry
+                self.hits += 1
+                return copy.copy(entry[0])
+            self.misses += 1
+        try:
+            user = self.get_queryset().get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return AnonymousUser()
+        with self._lock:
+            self._entries[user_id] = (user, time.time() + self.ttl)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return copy.copy(user)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._entries)}
+
+
+_default_user_cache = None
+_default_user_cache_lock = threading.Lock()
+
+
+def get_default_user_cache():
+    """
+    Return the process-wide user cache configured by the
+    ``TASTYPIE_OAUTH_USER_CACHE`` setting, or None if it is not set.
+
+    The setting is a dict with optional ``MAX_SIZE``, ``TTL`` and
+    ``FIELDS`` keys.
+    """
+    global _default_user_cache
+    options = getattr(settings, 'TASTYPIE_OAUTH_USER_CACHE', None)
+    if options is None:
+        return None
+    with _default_user_cache_lock:
+        if _default_user_cache is None:
+            _default_user_cache = UserProjectionCache(
+                max_size=options.get('MAX_SIZE', 1024),
+                ttl=options.get('TTL', 60),
+                fields=options.get('FIELDS'),
+            )
+        return _default_user_cache
+
+
+def reset_default_user_cache(setting=None, **kwargs):
+    """``setting_changed`` receiver dropping the process-wide user cache."""
+    global _default_user_cache
+    if setting == 'TASTYPIE_OAUTH_USER_CACHE':
+        with _default_user_cache_lock:
+            _default_user_cache = None
+
+
+def invalidate_user(sender, instance, **kwargs):
+    """Signal receiver dropping a saved or deleted user from every cache."""
+    for cache in list(_user_caches):
+        cache.delete(instance.pk)
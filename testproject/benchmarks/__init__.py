@@ -0,0 +1,62 @@
+"""
+Benchmarks for tastypie_oauth.
+
+Run them from the testproject directory, e.g. ``python -m benchmarks.scopes``.
+Each benchmark prints its results as JSON on stdout (or writes them to the
+file given with ``--output`` where supported).
+"""
+import json
+import os
+import sys
+import timeit
+
+
+def setup():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "settings")
+    import django
+    from django.conf import settings
+    django.setup()
+    # Keep query logging from skewing the measurements
+    settings.DEBUG = False
+
+
+def setup_database():
+    """Create an (in-memory) test database with all migrations applied."""
+    from django.db import connection
+    connection.creation.create_test_db(verbosity=0)
+
+
+def create_tokens(count, scope='read write', prefix='TOKEN'):
+    """Create ``count`` unexpired access tokens and return their keys."""
+    import datetime
+    from django.contrib.auth.models import User
+    from oauth2_provider.models import AccessToken, Application
+
+    user, _ = User.objects.get_or_create(username='benchmark')
+    application, _ = Application.objects.get_or_create(
+        name='Benchmark', user=user,
+        client_type=Application.CLIENT_CONFIDENTIAL,
+        authorization_grant_type=Application.GRANT_AUTHORIZATION_CODE)
+    expires = datetime.datetime.now() + datetime.timedelta(days=10)
+    keys = ['%s%d' % (prefix, i) for i in range(count)]
+    for start in range(0, count, 5000):
+        AccessToken.objects.bulk_create([
+            AccessToken(user=user, application=application, token=key,
+                        scope=scope, expires=expires)
+            for key in keys[start:start + 5000]])
+    return keys
+
+
+def measure(func, number=10000, repeat=5):
+    """Return the best per-call time of ``func`` in nanoseconds."""
+    best = min(timeit.repeat(func, number=number, repeat=repeat))
+    return best / number * 1e9
+
+
+def report(name, results, output=None):
+    stream = open(output, 'w') if output else sys.stdout
+    json.dump({'benchmark': name, 'results': results}, stream,
+              indent=2, sort_keys=True)
+    stream.write('\n')
+    if output:
+        stream.close()
@@ -0,0 +1,74 @@
+"""
+Concurrent throughput of is_authenticated (in a thread pool, as under a
+threaded WSGI server) versus ais_authenticated (on one event loop), with and
+without an in-process token cache.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import create_tokens, report, setup, setup_database
+
+REQUESTS = 2000
+CONCURRENCY = 32
+
+
+def main():
+    setup()
+    setup_database()
+    from django.test.client import RequestFactory
+    from tastypie_oauth.authentication import OAuth20Authentication
+    from tastypie_oauth.cache import LocalTokenCache
+
+    keys = create_tokens(100)
+    factory = RequestFactory()
+
+    def make_requests():
+        # Fresh requests per run, so no run reuses lookups memoized on them
+        return [
+            factory.get('/', HTTP_AUTHORIZATION='OAuth ' + keys[i % len(keys)])
+            for i in range(REQUESTS)]
+
+    def sync_throughput(auth, requests):
+        start = time.time()
+        with ThreadPoolExecutor(CONCURRENCY) as pool:
+            assert all(pool.map(auth.is_authenticated, requests))
+        return REQUESTS / (time.time() - start)
+
+    def async_throughput(auth, requests):
+        semaphore = asyncio.Semaphore(CONCURRENCY)
+
+        async def authenticate(request):
+            async with semaphore:
+                return await auth.ais_authenticated(request)
+
+        async def authenticate_all():
+            return await asyncio.gather(*map(authenticate, requests))
+
+        start = time.time()
+        loop = asyncio.get_event_loop()
+        assert all(loop.run_until_complete(authenticate_all()))
+        return REQUESTS / (time.time() - start)
+
+    results = []
+    for cached in (False, True):
+        def make_auth():
+            auth = OAuth20Authentication(
+                token_cache=LocalTokenCache() if cached else None)
+            # Warm the cache (and the worker threads' connections)
+            for key in keys:
+                auth.is_authenticated(factory.get('/', {'oauth_consumer_key': key}))
+            return auth
+        results.append({
+            'cached': cached,
+            'concurrency': CONCURRENCY,
+            'sync_requests_per_second': sync_throughput(
+                make_auth(), make_requests()),
+            'async_requests_per_second': async_throughput(
+                make_auth(), make_requests()),
+        })
+    report('async_auth', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Per-request latency and query count of is_authenticated for the polls API
+resources, by credential source, authentication class and outcome, with
+the access token table seeded at several sizes.
+
+    python -m benchmarks.auth --rows 1000 100000 1000000 --output auth.json
+"""
+import argparse
+import json
+
+from benchmarks import create_tokens, measure, report, setup, setup_database
+
+SOURCES = ('header', 'get', 'json')
+
+
+def make_request(factory, source, key):
+    if source == 'header':
+        return factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+    if source == 'get':
+        return factory.get('/', {'oauth_consumer_key': key})
+    return factory.post('/', json.dumps({'choice': 'Maybe', 'oauth_consumer_key': key}),
+                        content_type='application/json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000])
+    parser.add_argument('--number', type=int, default=1000,
+                        help='requests per measurement')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    setup()
+    setup_database()
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.client import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+    from polls.api import ChoiceResourceOAuthToolkit, ScopedChoiceResourceOAuthToolkit
+
+    call_command('loaddata', 'polls_api_testdata.json', verbosity=0)
+    classes = {
+        'unscoped': ChoiceResourceOAuthToolkit._meta.authentication,
+        'scoped': ScopedChoiceResourceOAuthToolkit._meta.authentication,
+    }
+    factory = RequestFactory()
+    results = []
+    seeded = 0
+    for rows in sorted(args.rows):
+        keys = create_tokens(rows - seeded, scope='read write',
+                             prefix='TOKEN%d-' % rows)
+        seeded = rows
+        outcomes = {'success': keys[len(keys) // 2], 'failure': 'UNKNOWN'}
+        for class_name, auth in sorted(classes.items()):
+            for source in SOURCES:
+                for outcome, key in sorted(outcomes.items()):
+                    request = make_request(factory, source, key)
+
+                    def authenticate():
+                        # Forget the lookup memoized on the request
+                        request.__dict__.pop('_oauth_lookups', None)
+                        return auth.is_authenticated(request)
+
+                    connection.queries_log.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        authenticated = authenticate()
+                    assert authenticated == (outcome == 'success')
+                    results.append({
+                        'rows': rows,
+                        'class': class_name,
+                        'source': source,
+                        'outcome': outcome,
+                        'queries': len(queries),
+                        'latency_ns': measure(authenticate, number=args.number,
+                                              repeat=3),
+                    })
+    report('auth', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Throughput under a 100% invalid-token load, with the tastypie_oauth logger
+writing to an in-memory stream at INFO level.
+
+``legacy`` reproduces the previous failure path: verify_access_token raises
+and every rejection is logged with ``log.exception`` and a traceback.
+"""
+import io
+import logging
+
+from benchmarks import create_tokens, measure, report, setup, setup_database
+
+
+def main():
+    setup()
+    setup_database()
+    from django.test.client import RequestFactory
+    from tastypie_oauth.authentication import OAuth20Authentication, log
+    from tastypie_oauth.cache import LocalTokenCache
+
+    class LegacyAuthentication(OAuth20Authentication):
+        def verify_access_token(self, key, request, **kwargs):
+            return super(LegacyAuthentication, self).verify_access_token(
+                key, request, **kwargs)
+
+        def authentication_rejected(self, request, reason):
+            log.exception("Error in OAuth20Authentication.")
+            return False
+
+    create_tokens(1000)
+    handler = logging.StreamHandler(io.StringIO())
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    factory = RequestFactory()
+    requests = [factory.get('/', HTTP_AUTHORIZATION='OAuth INVALID%d' % i,
+                            REMOTE_ADDR='10.0.0.%d' % (i % 4))
+                for i in range(100)]
+
+    def run(auth):
+        for request in requests:
+            # Forget the lookup memoized on the request
+            request.__dict__.pop('_oauth_lookups', None)
+            assert auth.is_authenticated(request) is False
+
+    results = []
+    for negative_cache in (False, True):
+        for name, cls in (('legacy', LegacyAuthentication),
+                          ('current', OAuth20Authentication)):
+            auth = cls(negative_cache=LocalTokenCache() if negative_cache else None)
+            per_request = measure(lambda: run(auth), number=20, repeat=3) / len(requests)
+            results.append({
+                'path': name,
+                'negative_cache': negative_cache,
+                'requests_per_second': 1e9 / per_request,
+            })
+    report('failures', results)
+
+
+if __name__ == '__main__':
+    main()
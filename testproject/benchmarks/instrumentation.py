@@ -0,0 +1,44 @@
+"""
+Overhead of the instrumentation signals on the fastest authentication path
+(a token cache hit), with no receivers connected and with no-op receivers
+connected to every signal.
+"""
+from benchmarks import create_tokens, measure, report, setup, setup_database
+
+
+def main():
+    setup()
+    setup_database()
+    from django.test.client import RequestFactory
+    from tastypie_oauth import signals
+    from tastypie_oauth.authentication import OAuth2ScopedAuthentication
+    from tastypie_oauth.cache import LocalTokenCache
+
+    key = create_tokens(1)[0]
+    auth = OAuth2ScopedAuthentication(get='read', token_cache=LocalTokenCache())
+    request = RequestFactory().get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+
+    def authenticate():
+        # Forget the lookup memoized on the request
+        request.__dict__.pop('_oauth_lookups', None)
+        return auth.is_authenticated(request)
+
+    assert authenticate()
+
+    def receiver(sender, **kwargs):
+        pass
+
+    all_signals = (signals.auth_stage, signals.auth_outcome,
+                   signals.token_cache_lookup)
+    disabled = measure(authenticate)
+    for signal in all_signals:
+        signal.connect(receiver)
+    enabled = measure(authenticate)
+    report('instrumentation', {
+        'disabled_ns': disabled,
+        'enabled_ns': enabled,
+    })
+
+
+if __name__ == '__main__':
+    main()
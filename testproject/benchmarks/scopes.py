@@ -0,0 +1,37 @@
+"""
+Per-check cost of OAuth2ScopedAuthentication.check_scope as the number of
+"or" alternatives configured for a method grows.
+
+``legacy`` re-implements the check done before requirements were compiled
+(split every required scope and call ``token.allow_scopes`` for each).
+"""
+from benchmarks import measure, report, setup
+
+
+def legacy_check(required_scopes, token):
+    return [scope for scope in required_scopes
+            if token.allow_scopes(scope.split())]
+
+
+def main():
+    setup()
+    from django.test.client import RequestFactory
+    from oauth2_provider.models import AccessToken
+    from tastypie_oauth.authentication import OAuth2ScopedAuthentication
+
+    request = RequestFactory().get('/')
+    token = AccessToken(scope='read write scope7')
+    results = []
+    for count in (1, 4, 16, 64):
+        required = tuple('scope%d extra' % i for i in range(count - 1)) + ('read',)
+        auth = OAuth2ScopedAuthentication(get=required)
+        results.append({
+            'alternatives': count,
+            'compiled_ns': measure(lambda: auth.check_scope(token, request)),
+            'legacy_ns': measure(lambda: legacy_check(required, token)),
+        })
+    report('check_scope', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Per-lookup latency and memory of ModelTokenStore's ``AccessToken`` model
+instances versus TokenViewStore's ``TokenView`` objects: a single key
+lookup, a full is_authenticated, and the bytes held per token for a batch
+fetched with get_tokens().
+
+    python -m benchmarks.token_view --tokens 10000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from benchmarks import create_tokens, measure, report, setup, setup_database
+
+
+def held_bytes(func):
+    """Return the result of ``func`` and the bytes still allocated for it."""
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tokens', type=int, default=10000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    setup()
+    setup_database()
+    from django.test.client import RequestFactory
+    from tastypie_oauth.authentication import OAuth20Authentication
+    from tastypie_oauth.stores import ModelTokenStore, TokenViewStore
+
+    keys = create_tokens(args.tokens)
+    factory = RequestFactory()
+    request = factory.get('/', HTTP_AUTHORIZATION='OAuth ' + keys[0])
+
+    results = []
+    for name, store in (('model', ModelTokenStore()),
+                        ('view', TokenViewStore())):
+        auth = OAuth20Authentication(token_store=store)
+
+        def authenticate():
+            # Forget the lookup memoized on the request
+            request.__dict__.pop('_oauth_lookups', None)
+            assert auth.is_authenticated(request)
+
+        tokens, held = held_bytes(lambda: store.get_tokens(keys))
+        assert len(tokens) == len(keys)
+        results.append({
+            'store': name,
+            'get_token_ns': measure(lambda: store.get_token(keys[0]),
+                                    number=2000, repeat=3),
+            'is_authenticated_ns': measure(authenticate, number=2000, repeat=3),
+            'bytes_per_token': held / len(keys),
+        })
+    report('token_view', results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ from tastypie_oauth.authentication import (
     OAuth20Authentication,
     OAuth2ScopedAuthentication
 )
+from tastypie_oauth.authorization import OAuth2ScopedAuthorization
 
 from .models import Poll, Choice
 
@@ -55,8 +56,38 @@ class ScopedPollResourceOAuthToolkit(ModelResource):
         authentication = ToolkitScopedAuthentication()
 
 
+class ScopedChoiceAuthorizationOAuthToolkit(ModelResource):
+    poll = fields.ToOneField("polls.api.ScopedPollAuthorizationOAuthToolkit", "poll", full=False)
+    class Meta:
+        resource_name = 'authorized_choice_toolkit'
+        queryset = Choice.objects.all()
+        authorization = OAuth2ScopedAuthorization(
+            read={"read": {"poll__pub_date__year__lt": 2020}, "read write": None},
+        )
+        authentication = OAuth20Authentication()
+
+
+class ScopedPollAuthorizationOAuthToolkit(ModelResource):
+    choices = fields.ToManyField(ScopedChoiceAuthorizationOAuthToolkit, 'choice_set', full=True)
+    class Meta:
+        resource_name = 'authorized_poll_toolkit'
+        queryset = Poll.objects.all()
+        # "read" and "write" tokens only see past polls, "read write"
+        # tokens see all; only "write" tokens may change and delete them
+        authorization = OAuth2ScopedAuthorization(
+            read={"read": {"pub_date__year__lt": 2020},
+                  "write": {"pub_date__year__lt": 2020},
+                  "read write": None},
+            update={"write": {"pub_date__year__lt": 2020}},
+            delete={"write": {"pub_date__year__lt": 2020}},
+        )
+        authentication = OAuth20Authentication()
+
+
 api = Api(api_name='v1')
 api.register(ChoiceResourceOAuthToolkit())
 api.register(ScopedChoiceResourceOAuthToolkit())
 api.register(PollResourceOAuthToolkit())
 api.register(ScopedPollResourceOAuthToolkit())
+api.register(ScopedChoiceAuthorizationOAuthToolkit())
+api.register(ScopedPollAuthorizationOAuthToolkit())
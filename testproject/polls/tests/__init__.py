@@ -1 +1,21 @@
 from polls.tests.test_api import *
+from polls.tests.test_cache import *
+from polls.tests.test_stores import *
+from polls.tests.test_scopes import *
+from polls.tests.test_extractors import *
+from polls.tests.test_bulk import *
+from polls.tests.test_async import *
+from polls.tests.test_queries import *
+from polls.tests.test_signals import *
+from polls.tests.test_failures import *
+from polls.tests.test_signed import *
+from polls.tests.test_introspection import *
+from polls.tests.test_usage import *
+from polls.tests.test_quotas import *
+from polls.tests.test_middleware import *
+from polls.tests.test_singleflight import *
+from polls.tests.test_commands import *
+from polls.tests.test_users import *
+from polls.tests.test_replica import *
+from polls.tests.test_shm import *
+from polls.tests.test_authorization import *
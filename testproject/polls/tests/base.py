@@ -0,0 +1,46 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+from django.test.client import RequestFactory
+
+from oauth2_provider.models import AccessToken, Application
+
+
+class OAuthTestMixin(object):
+    """
+    Creates a user, an application and a "TOKEN" access token, and provides
+    a RequestFactory for calling authentication classes directly.
+    """
+    def setUp(self):
+        super(OAuthTestMixin, self).setUp()
+        self.user = User.objects.create_user(
+            'username', 'username@example.com', 'password')
+        self.application = Application.objects.create(
+            user=self.user,
+            redirect_uris='http://example.com',
+            client_type=Application.CLIENT_CONFIDENTIAL,
+            authorization_grant_type=Application.GRANT_AUTHORIZATION_CODE,
+            name='Test Application'
+        )
+        self.access_token = self.create_token('TOKEN')
+        self.factory = RequestFactory()
+
+    def create_token(self, key, scope='', expires=None):
+        if expires is None:
+            expires = datetime.datetime.now() + datetime.timedelta(days=10)
+        return AccessToken.objects.create(
+            user=self.user,
+            application=self.application,
+            token=key,
+            scope=scope,
+            expires=expires
+        )
+
+
+class OAuthTestCase(OAuthTestMixin, TestCase):
+    pass
+
+
+class OAuthTransactionTestCase(OAuthTestMixin, TransactionTestCase):
+    """For tests whose token lookups happen in other threads."""
@@ -0,0 +1,154 @@
+import json
+import threading
+import unittest
+
+try:
+    import asyncio
+except ImportError:  # Python < 3.4
+    asyncio = None
+
+from tastypie_oauth.authentication import (
+    OAuth20Authentication,
+    OAuth2ScopedAuthentication,
+    OAuthError,
+)
+from tastypie_oauth.cache import LocalTokenCache
+from tastypie_oauth.middleware import request_token
+from tastypie_oauth.quotas import SlidingWindowQuota, TokenQuotas
+from tastypie_oauth.stores import ModelTokenStore, TokenView, TokenViewStore
+
+from polls.tests.base import OAuthTransactionTestCase
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+@unittest.skipUnless(hasattr(OAuth20Authentication, 'ais_authenticated'),
+                     'async authentication needs Python 3.5+')
+class AsyncAuthenticationTestCase(OAuthTransactionTestCase):
+    """Runs the polls API scenarios through both authentication paths."""
+    def setUp(self):
+        super(AsyncAuthenticationTestCase, self).setUp()
+        for scope in ('read', 'write', 'read write'):
+            self.create_token('TOKEN' + scope.replace(' ', '_'), scope=scope)
+        self.auth = OAuth20Authentication()
+        self.scoped_auth = OAuth2ScopedAuthentication(
+            post=("read write",), get=("read",), put=("read", "write"))
+
+    def assertSamePaths(self, auth, make_request, expected):
+        sync_request = make_request()
+        async_request = make_request()
+        self.assertEqual(auth.is_authenticated(sync_request), expected)
+        self.assertEqual(run(auth.ais_authenticated(async_request)), expected)
+        self.assertEqual(getattr(async_request, 'user', None),
+                         getattr(sync_request, 'user', None))
+        self.assertEqual(async_request.META.get('oauth_consumer_key'),
+                         sync_request.META.get('oauth_consumer_key'))
+
+    def post(self, data, **extra):
+        return self.factory.post('/', json.dumps(data),
+                                 content_type='application/json', **extra)
+
+    def test_regular_authorization(self):
+        scenarios = [
+            lambda: self.factory.get('/?oauth_consumer_key=TOKEN'),
+            lambda: self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN'),
+            lambda: self.factory.get('/', Authorization='OAuth TOKEN'),
+            lambda: self.post({'choice': 'Maybe'},
+                              HTTP_AUTHORIZATION='OAuth TOKEN'),
+            lambda: self.post({'choice': 'Maybe', 'oauth_consumer_key': 'TOKEN'}),
+        ]
+        for make_request in scenarios:
+            self.assertSamePaths(self.auth, make_request, True)
+
+    def test_unauthorized(self):
+        self.assertSamePaths(self.auth, lambda: self.factory.get('/'), None)
+        self.assertSamePaths(
+            self.auth, lambda: self.post({'choice': 'Maybe'}), None)
+        self.assertSamePaths(
+            self.auth, lambda: self.factory.get('/?oauth_consumer_key=NOPE'),
+            False)
+
+    def test_scope_authorizations(self):
+        for key, expected in [('TOKENwrite', False), ('TOKENread', True),
+                              ('TOKENread_write', True)]:
+            self.assertSamePaths(
+                self.scoped_auth,
+                lambda: self.factory.get('/', {'oauth_consumer_key': key}),
+                expected)
+        for key, expected in [('TOKENread', False), ('TOKENwrite', False),
+                              ('TOKENread_write', True)]:
+            self.assertSamePaths(
+                self.scoped_auth,
+                lambda: self.post({}, HTTP_AUTHORIZATION='OAuth ' + key),
+                expected)
+
+    def test_cache_hit_stays_on_event_loop(self):
+        auth = OAuth20Authentication(token_cache=LocalTokenCache())
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        self.assertTrue(run(auth.ais_authenticated(request)))
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        with self.assertNumQueries(0):
+            self.assertTrue(run(auth.ais_authenticated(request)))
+        self.assertEqual(request.user, self.user)
+
+    def test_quota_sync_off_event_loop(self):
+        quota = SlidingWindowQuota(10, 60, name='token')
+        sync = quota.sync
+        threads = []
+        quota.sync = lambda *args: (
+            threads.append(threading.current_thread()) or sync(*args))
+        auth = OAuth20Authentication(quotas=TokenQuotas(token=quota))
+        for _ in range(2):
+            request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+            self.assertTrue(run(auth.ais_authenticated(request)))
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_token_view_store(self):
+        auth = OAuth20Authentication(token_store=TokenViewStore())
+        self.assertSamePaths(
+            auth, lambda: self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN'),
+            True)
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        self.assertTrue(run(auth.ais_authenticated(request)))
+        self.assertIsInstance(request_token(request), TokenView)
+        self.assertIsNone(run(auth.token_store.aget_token('UNKNOWN')))
+
+    def test_overridden_verify_access_token(self):
+        class StrictAuthentication(OAuth20Authentication):
+            def verify_access_token(self, key, request, **kwargs):
+                if request.GET.get('strict'):
+                    raise OAuthError("Strict mode")
+                return super(StrictAuthentication, self).verify_access_token(
+                    key, request, **kwargs)
+
+        auth = StrictAuthentication()
+        self.assertSamePaths(
+            auth, lambda: self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN'),
+            True)
+        self.assertSamePaths(
+            auth, lambda: self.factory.get(
+                '/?strict=1', HTTP_AUTHORIZATION='OAuth TOKEN'),
+            False)
+
+
+@unittest.skipUnless(hasattr(OAuth20Authentication, 'ais_authenticated'),
+                     'async authentication needs Python 3.5+')
+class AsyncReplicaTokenStoreTestCase(OAuthTransactionTestCase):
+    multi_db = True
+
+    def setUp(self):
+        super(AsyncReplicaTokenStoreTestCase, self).setUp()
+        for instance in (self.user, self.application, self.access_token):
+            instance.save(using='replica')
+        self.create_token('NEW')
+        self.store = ModelTokenStore(using='replica')
+
+    def test_primary_fallback(self):
+        self.assertEqual(run(self.store.aget_token('TOKEN')), self.access_token)
+        self.assertEqual(run(self.store.aget_token('NEW')).token, 'NEW')
+        self.assertIsNone(run(self.store.aget_token('UNKNOWN')))
+        self.assertEqual(self.store.stats(), {
+            'replica_hits': 1, 'primary_fallbacks': 2})
@@ -0,0 +1,108 @@
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db.models import QuerySet
+from tastypie.bundle import Bundle
+
+try:
+    from tastypie.test import ResourceTestCaseMixin
+except ImportError:  # Fallback for tastypie<0.13
+    from tastypie.test import ResourceTestCase as ResourceTestCaseMixin
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.authorization import OAuth2ScopedAuthorization
+
+from polls.models import Choice, Poll
+from polls.tests.base import OAuthTestCase
+
+
+class ScopedAuthorizationTestCase(ResourceTestCaseMixin, OAuthTestCase):
+    def setUp(self):
+        super(ScopedAuthorizationTestCase, self).setUp()
+        call_command('loaddata', 'polls_api_testdata.json', verbosity=0)
+        Choice.objects.create(poll_id=2, choice='Surely')
+        for key, scope in (('READ', 'read'), ('WRITE', 'write'),
+                           ('READWRITE', 'read write')):
+            self.create_token(key, scope=scope)
+        kwargs = {'api_name': 'v1'}
+        self.poll_url = reverse('api_dispatch_list', kwargs=dict(
+            kwargs, resource_name='authorized_poll_toolkit'))
+        self.choice_url = reverse('api_dispatch_list', kwargs=dict(
+            kwargs, resource_name='authorized_choice_toolkit'))
+
+    def get_objects(self, url, key):
+        resp = self.api_client.get(url, authentication='OAuth ' + key)
+        self.assertValidJSONResponse(resp)
+        return self.deserialize(resp)['objects']
+
+    def test_read_list(self):
+        polls = self.get_objects(self.poll_url, 'READ')
+        self.assertEqual([poll['id'] for poll in polls], [1])
+        self.assertEqual(len(polls[0]['choices']), 2)
+        polls = self.get_objects(self.poll_url, 'READWRITE')
+        self.assertEqual([poll['id'] for poll in polls], [1, 2])
+        self.assertEqual(len(polls[1]['choices']), 1)
+        polls = self.get_objects(self.poll_url, 'WRITE')
+        self.assertEqual([poll['id'] for poll in polls], [1])
+
+    def test_read_list_follows_relations(self):
+        self.assertEqual(len(self.get_objects(self.choice_url, 'READ')), 2)
+        self.assertEqual(len(self.get_objects(self.choice_url, 'READWRITE')), 3)
+
+    def test_read_detail(self):
+        resp = self.api_client.get(self.poll_url + '1/',
+                                   authentication='OAuth READ')
+        self.assertValidJSONResponse(resp)
+        resp = self.api_client.get(self.poll_url + '2/',
+                                   authentication='OAuth READ')
+        self.assertHttpUnauthorized(resp)
+
+    def test_update_detail(self):
+        data = {'question': 'Changed'}
+        resp = self.api_client.patch(self.poll_url + '2/', data=data,
+                                     authentication='OAuth READWRITE')
+        self.assertHttpUnauthorized(resp)
+        resp = self.api_client.patch(self.poll_url + '1/', data=data,
+                                     authentication='OAuth WRITE')
+        self.assertHttpAccepted(resp)
+        self.assertEqual(Poll.objects.get(pk=1).question, 'Changed')
+        self.assertEqual(Poll.objects.get(pk=2).question, "IT'S THE FUTURE...")
+
+    def test_delete_list(self):
+        resp = self.api_client.delete(self.poll_url,
+                                      authentication='OAuth READ')
+        self.assertHttpAccepted(resp)
+        self.assertEqual(Poll.objects.count(), 2)
+        resp = self.api_client.delete(self.poll_url,
+                                      authentication='OAuth WRITE')
+        self.assertHttpAccepted(resp)
+        self.assertEqual(list(Poll.objects.values_list('pk', flat=True)), [2])
+
+    def test_reuses_authenticated_token(self):
+        authorization = OAuth2ScopedAuthorization(
+            read={'read': {'pub_date__year__lt': 2020}})
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth READ')
+        self.assertTrue(OAuth20Authentication().is_authenticated(request))
+        with self.assertNumQueries(0):
+            polls = authorization.read_list(
+                Poll.objects.all(), Bundle(request=request))
+        self.assertIsInstance(polls, QuerySet)
+        self.assertEqual(list(polls), [Poll.objects.get(pk=1)])
+
+    def test_callable_filter(self):
+        authorization = OAuth2ScopedAuthorization(
+            read={'read': lambda bundle, token: {'question__startswith': 'IT'},
+                  'write': {'pk': 1}})
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth READWRITE')
+        self.assertTrue(OAuth20Authentication().is_authenticated(request))
+        polls = authorization.read_list(
+            Poll.objects.order_by('pk'), Bundle(request=request))
+        self.assertEqual([poll.pk for poll in polls], [1, 2])
+
+    def test_without_token(self):
+        authorization = OAuth2ScopedAuthorization(read={'read': None})
+        request = self.factory.get('/')
+        self.assertEqual(list(authorization.read_list(
+            Poll.objects.all(), Bundle(request=request))), [])
+        # Operations without rules are not restricted
+        self.assertEqual(authorization.delete_list(
+            Poll.objects.all(), Bundle(request=request)).count(), 2)
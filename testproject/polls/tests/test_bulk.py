@@ -0,0 +1,78 @@
+import datetime
+
+from tastypie_oauth.authentication import (
+    OAuth20Authentication,
+    OAuth2ScopedAuthentication,
+    TOKEN_EXPIRED,
+    TOKEN_INSUFFICIENT_SCOPE,
+    TOKEN_NOT_FOUND,
+    TOKEN_VALID,
+)
+from tastypie_oauth.cache import LocalTokenCache
+from tastypie_oauth.stores import ModelTokenStore
+
+from polls.tests.base import OAuthTestCase
+
+
+class BulkVerificationTestCase(OAuthTestCase):
+    def setUp(self):
+        super(BulkVerificationTestCase, self).setUp()
+        self.create_token('READ', scope='read')
+        self.create_token('WRITE', scope='write')
+        self.create_token('EXPIRED', scope='read', expires=(
+            datetime.datetime.now() - datetime.timedelta(days=1)))
+        self.keys = ['TOKEN', 'READ', 'WRITE', 'EXPIRED', 'UNKNOWN']
+        self.request = self.factory.get('/')
+
+    def statuses(self, results):
+        return dict((key, result.status) for key, result in results.items())
+
+    def test_single_query(self):
+        auth = OAuth20Authentication()
+        with self.assertNumQueries(1):
+            results = auth.verify_access_tokens(self.keys, self.request)
+            self.assertEqual(results['READ'].token.user, self.user)
+        self.assertEqual(self.statuses(results), {
+            'TOKEN': TOKEN_VALID,
+            'READ': TOKEN_VALID,
+            'WRITE': TOKEN_VALID,
+            'EXPIRED': TOKEN_EXPIRED,
+            'UNKNOWN': TOKEN_NOT_FOUND,
+        })
+        self.assertIsNone(results['UNKNOWN'].token)
+
+    def test_scoped(self):
+        auth = OAuth2ScopedAuthentication(get='read')
+        results = auth.verify_access_tokens(self.keys, self.request)
+        self.assertEqual(self.statuses(results), {
+            'TOKEN': TOKEN_INSUFFICIENT_SCOPE,
+            'READ': TOKEN_VALID,
+            'WRITE': TOKEN_INSUFFICIENT_SCOPE,
+            'EXPIRED': TOKEN_EXPIRED,
+            'UNKNOWN': TOKEN_NOT_FOUND,
+        })
+
+    def test_without_request(self):
+        results = OAuth20Authentication().verify_access_tokens(self.keys)
+        self.assertEqual(results['READ'].status, TOKEN_VALID)
+        auth = OAuth2ScopedAuthentication(get='read', post='write')
+        results = auth.verify_access_tokens(self.keys, method='POST')
+        self.assertEqual(results['WRITE'].status, TOKEN_VALID)
+        self.assertEqual(results['READ'].status, TOKEN_INSUFFICIENT_SCOPE)
+        with self.assertRaises(TypeError):
+            auth.verify_access_tokens(self.keys)
+
+    def test_chunking(self):
+        auth = OAuth20Authentication(token_store=ModelTokenStore(batch_size=2))
+        with self.assertNumQueries(3):
+            results = auth.verify_access_tokens(self.keys, self.request)
+        self.assertEqual(results['WRITE'].status, TOKEN_VALID)
+
+    def test_uses_cache(self):
+        auth = OAuth20Authentication(token_cache=LocalTokenCache())
+        auth.verify_access_tokens(['TOKEN', 'READ'], self.request)
+        with self.assertNumQueries(1):
+            results = auth.verify_access_tokens(self.keys, self.request)
+        self.assertEqual(results['TOKEN'].status, TOKEN_VALID)
+        with self.assertNumQueries(0):
+            auth.verify_access_tokens(['TOKEN', 'READ'], self.request)
@@ -0,0 +1,189 @@
+import datetime
+import time
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from oauth2_provider.models import AccessToken
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.cache import (
+    DjangoTokenCache,
+    LocalTokenCache,
+    TieredTokenCache,
+    token_fingerprint,
+)
+
+from polls.tests.base import OAuthTestCase
+
+
+class LocalTokenCacheTestCase(TestCase):
+    def setUp(self):
+        super(LocalTokenCacheTestCase, self).setUp()
+        self.expires = datetime.datetime.now() + datetime.timedelta(days=1)
+
+    def make_token(self, key, expires=None):
+        return AccessToken(token=key, expires=expires or self.expires)
+
+    def test_keys_are_fingerprints(self):
+        cache = LocalTokenCache()
+        cache.set('SECRET', self.make_token('SECRET'))
+        self.assertNotIn('SECRET', cache._entries)
+        self.assertIn(token_fingerprint('SECRET'), cache._entries)
+
+    def test_lru_eviction(self):
+        cache = LocalTokenCache(max_size=2)
+        cache.set('a', self.make_token('a'))
+        cache.set('b', self.make_token('b'))
+        # Touch "a" so "b" becomes the least recently used entry
+        self.assertEqual(cache.get('a').token, 'a')
+        cache.set('c', self.make_token('c'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c').token, 'c')
+        self.assertEqual(cache.stats(), {
+            'hits': 2, 'misses': 1, 'evictions': 1, 'size': 2})
+
+    def test_ttl(self):
+        cache = LocalTokenCache(ttl=0.05)
+        cache.set('a', self.make_token('a'))
+        self.assertIsNotNone(cache.get('a'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_entry_does_not_outlive_token(self):
+        cache = LocalTokenCache(ttl=60)
+        expires = datetime.datetime.now() + datetime.timedelta(seconds=0.05)
+        cache.set('a', self.make_token('a', expires))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+
+        expired = datetime.datetime.now() - datetime.timedelta(seconds=1)
+        cache.set('b', self.make_token('b', expired))
+        self.assertEqual(len(cache), 0)
+
+
+class CachedAuthenticationTestCase(OAuthTestCase):
+    def test_cached_token_skips_database(self):
+        token_cache = LocalTokenCache()
+        auth = OAuth20Authentication(token_cache=token_cache)
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        self.assertTrue(auth.is_authenticated(request))
+        self.assertEqual(token_cache.stats()['misses'], 1)
+
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        with self.assertNumQueries(0):
+            self.assertTrue(auth.is_authenticated(request))
+        self.assertEqual(request.user, self.user)
+        self.assertEqual(token_cache.stats()['hits'], 1)
+
+    def test_unknown_token_is_not_cached(self):
+        token_cache = LocalTokenCache()
+        auth = OAuth20Authentication(token_cache=token_cache)
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth NOPE')
+        self.assertFalse(auth.is_authenticated(request))
+        self.assertEqual(len(token_cache), 0)
+
+
+class SharedCacheAuthenticationTestCase(OAuthTestCase):
+    def setUp(self):
+        super(SharedCacheAuthenticationTestCase, self).setUp()
+        cache.clear()
+        self.local = LocalTokenCache()
+        self.shared = DjangoTokenCache()
+        self.auth = OAuth20Authentication(
+            token_cache=TieredTokenCache(self.local, self.shared))
+
+    def authenticate(self):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        return self.auth.is_authenticated(request)
+
+    def token_queries(self, queries):
+        table = AccessToken._meta.db_table
+        return [q for q in queries if table in q['sql']]
+
+    def test_hot_token_skips_token_table(self):
+        self.assertTrue(self.authenticate())
+        self.assertIsNotNone(cache.get(self.shared.make_key('TOKEN')))
+        for _ in range(3):
+            # Simulate another worker whose in-process tier is cold
+            self.local.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertTrue(self.authenticate())
+            self.assertEqual(self.token_queries(queries), [])
+        self.assertEqual(self.shared.stats()['hits'], 3)
+
+    def test_revoked_token_rejected_immediately(self):
+        self.assertTrue(self.authenticate())
+        self.access_token.revoke()
+        self.assertIsNone(cache.get(self.shared.make_key('TOKEN')))
+        self.assertFalse(self.authenticate())
+
+    def test_saved_token_invalidated(self):
+        self.assertTrue(self.authenticate())
+        self.access_token.expires = (
+            datetime.datetime.now() - datetime.timedelta(seconds=1))
+        self.access_token.save()
+        self.assertFalse(self.authenticate())
+
+    def test_invalidation_reaches_other_processes(self):
+        self.assertTrue(self.authenticate())
+        # Another worker, whose in-process tier this process cannot reach
+        other_local = LocalTokenCache()
+        other = TieredTokenCache(other_local, DjangoTokenCache())
+        self.assertIsNotNone(other.get('TOKEN'))
+        self.assertEqual(len(other_local), 1)
+        # What invalidate_token does in the process revoking the token
+        self.local.delete('TOKEN')
+        self.shared.invalidate('TOKEN')
+        # Served from the in-process tier until the version is checked again
+        self.assertIsNotNone(other.get('TOKEN'))
+        other.version_interval = 0
+        self.assertIsNone(other.get('TOKEN'))
+        self.assertEqual(len(other_local), 0)
+
+    def test_created_token_keeps_other_processes_warm(self):
+        self.assertTrue(self.authenticate())
+        version = self.shared.get_version()
+        self.create_token('NEW')
+        self.assertEqual(self.shared.get_version(), version)
+
+
+class NegativeCacheTestCase(OAuthTestCase):
+    def setUp(self):
+        super(NegativeCacheTestCase, self).setUp()
+        self.negative_cache = LocalTokenCache(ttl=30)
+        self.auth = OAuth20Authentication(negative_cache=self.negative_cache)
+        self.create_token('EXPIRED', expires=(
+            datetime.datetime.now() - datetime.timedelta(seconds=1)))
+
+    def authenticate(self, key):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+        return self.auth.is_authenticated(request)
+
+    def test_rejected_without_lookup(self):
+        for key in ('UNKNOWN', 'EXPIRED'):
+            with self.assertNumQueries(1):
+                self.assertFalse(self.authenticate(key))
+            with self.assertNumQueries(0):
+                self.assertFalse(self.authenticate(key))
+        self.assertEqual(self.negative_cache.stats()['hits'], 2)
+        # Valid tokens are never negatively cached
+        self.assertTrue(self.authenticate('TOKEN'))
+        self.assertEqual(len(self.negative_cache), 2)
+
+    def test_created_token_clears_entry(self):
+        self.assertFalse(self.authenticate('NEW'))
+        self.create_token('NEW')
+        self.assertTrue(self.authenticate('NEW'))
+
+    def test_shared_negative_cache(self):
+        cache.clear()
+        self.auth.negative_cache = DjangoTokenCache(
+            key_prefix='tastypie_oauth:negative:')
+        self.assertFalse(self.authenticate('NEW'))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.authenticate('NEW'))
+        self.create_token('NEW')
+        self.assertTrue(self.authenticate('NEW'))
@@ -0,0 +1,125 @@
+import datetime
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+from oauth2_provider.models import AccessToken, RefreshToken
+from six import StringIO
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.cache import get_default_token_cache
+from tastypie_oauth.management.commands.purge_expired_tokens import (
+    Command as PurgeCommand,
+)
+from tastypie_oauth.models import TokenUsage
+
+from polls.tests.base import OAuthTestCase
+
+
+@override_settings(TASTYPIE_OAUTH_SHARED_TOKEN_CACHE={'TTL': 300})
+class WarmTokensTestCase(OAuthTestCase):
+    def setUp(self):
+        super(WarmTokensTestCase, self).setUp()
+        cache.clear()
+        now = datetime.datetime.now()
+        for day in range(1, 6):
+            self.create_token('T%d' % day, scope='read',
+                              expires=now + datetime.timedelta(days=day))
+        self.create_token('EXPIRED', expires=now - datetime.timedelta(days=1))
+
+    def warm(self, *args):
+        out = StringIO()
+        call_command('warm_oauth_tokens', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def cached(self):
+        token_cache = get_default_token_cache()
+        return sorted(key for key in ['TOKEN', 'EXPIRED', 'T1', 'T2', 'T3', 'T4', 'T5']
+                      if token_cache.get(key) is not None)
+
+    def test_latest_expiry_first(self):
+        output = self.warm('--limit', '3', '--chunk-size', '2')
+        self.assertIn('Warmed 3 tokens', output)
+        self.assertIn('rows/s', output)
+        self.assertEqual(self.cached(), ['T4', 'T5', 'TOKEN'])
+        auth = OAuth20Authentication()
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth T5')
+        with self.assertNumQueries(0):
+            self.assertTrue(auth.is_authenticated(request))
+            self.assertEqual(request.user.username, 'username')
+
+    def test_recent_activity_first(self):
+        now = timezone.now()
+        for minutes, key in enumerate(['T1', 'EXPIRED', 'T2', 'T3']):
+            token = self.user.oauth2_provider_accesstoken.get(token=key)
+            TokenUsage.objects.create(
+                fingerprint=key, token_id=token.pk, request_count=1,
+                last_used=now - datetime.timedelta(minutes=minutes))
+        self.assertIn('Warmed 2 tokens', self.warm(
+            '--order', 'activity', '--limit', '2', '--chunk-size', '1'))
+        self.assertEqual(self.cached(), ['T1', 'T2'])
+
+    @override_settings(TASTYPIE_OAUTH_SHARED_TOKEN_CACHE=None)
+    def test_no_cache(self):
+        with self.assertRaises(CommandError):
+            self.warm()
+
+
+class RecordingPurgeCommand(PurgeCommand):
+    def delete_batch(self, start, end):
+        count = super(RecordingPurgeCommand, self).delete_batch(start, end)
+        self.deleted.append(count)
+        return count
+
+
+class PurgeExpiredTokensTestCase(OAuthTestCase):
+    def setUp(self):
+        super(PurgeExpiredTokensTestCase, self).setUp()
+        now = datetime.datetime.now()
+        expired = now - datetime.timedelta(days=1)
+        valid = now + datetime.timedelta(days=1)
+        # Every third token is still valid
+        AccessToken.objects.bulk_create([
+            AccessToken(user=self.user, application=self.application,
+                        token='T%d' % i, expires=valid if i % 3 == 0 else expired)
+            for i in range(1500)])
+        self.refreshable = AccessToken.objects.get(token='T1')
+        RefreshToken.objects.create(
+            user=self.user, application=self.application, token='REFRESH',
+            access_token=self.refreshable)
+
+    def purge(self, *args):
+        command = RecordingPurgeCommand()
+        command.deleted = []
+        out = StringIO()
+        call_command(command, *args, stdout=out)
+        return command.deleted, out.getvalue()
+
+    def test_dry_run(self):
+        with self.assertNumQueries(1):
+            deleted, output = self.purge('--dry-run')
+        self.assertEqual(deleted, [])
+        self.assertIn('Would delete 999 expired tokens', output)
+        self.assertEqual(AccessToken.objects.count(), 1501)
+
+    def test_bounded_batches(self):
+        deleted, output = self.purge('--batch-size', '100', '--sleep', '0')
+        self.assertEqual(deleted, [100] * 9 + [99])
+        self.assertIn('Deleted 999 expired tokens in 10 batches', output)
+        self.assertEqual(AccessToken.objects.count(), 502)
+        self.assertFalse(AccessToken.objects.filter(
+            expires__lt=datetime.datetime.now()).exclude(
+            pk=self.refreshable.pk).exists())
+        self.assertTrue(RefreshToken.objects.filter(token='REFRESH').exists())
+        auth = OAuth20Authentication()
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        self.assertTrue(auth.is_authenticated(request))
+
+    def test_nothing_to_delete(self):
+        AccessToken.objects.filter(
+            expires__lt=datetime.datetime.now()).delete()
+        deleted, output = self.purge()
+        self.assertEqual(deleted, [])
+        self.assertIn('Deleted 0 expired tokens', output)
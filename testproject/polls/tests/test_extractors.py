@@ -0,0 +1,161 @@
+import json
+
+from django.test import SimpleTestCase
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.extractors import (
+    MalformedCredentials,
+    find_form_key,
+    find_json_key,
+    parse_authorization,
+)
+
+from polls.tests.base import OAuthTestCase
+
+
+class FindJSONKeyTestCase(SimpleTestCase):
+    def find(self, document, **kwargs):
+        if not isinstance(document, bytes):
+            document = json.dumps(document).encode('utf8')
+        return find_json_key(document, **kwargs)
+
+    def test_found(self):
+        self.assertEqual(self.find({'oauth_consumer_key': 'TOKEN'}), 'TOKEN')
+        self.assertEqual(self.find(
+            b'\xef\xbb\xbf {\n "oauth_consumer_key" : "TO\\u004bEN"}'), 'TOKEN')
+
+    def test_skips_preceding_values(self):
+        document = (
+            b'{"objects": [{"a": "}\\"]", "b": [1, 2, {"c": null}]}, true],'
+            b' "n": -1.5e3, "s": "oauth_consumer_key", "t": false,'
+            b' "oauth_consumer_key": "TOKEN", "after": [')
+        self.assertEqual(self.find(document), 'TOKEN')
+
+    def test_nested_key_ignored(self):
+        self.assertIsNone(self.find({'data': {'oauth_consumer_key': 'TOKEN'}}))
+        self.assertIsNone(self.find([{'oauth_consumer_key': 'TOKEN'}]))
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(self.find({}))
+        self.assertIsNone(self.find({'oauth_consumer_key': 1}))
+        self.assertIsNone(self.find(b'not json'))
+        self.assertIsNone(self.find(b''))
+        self.assertIsNone(self.find(b'{"a": [1, 2'))
+
+    def test_max_bytes(self):
+        document = {'objects': ['x' * 100], 'oauth_consumer_key': 'TOKEN'}
+        self.assertIsNone(self.find(document, max_bytes=50))
+        # A key cut off by the cap is not returned truncated
+        document = b'{"oauth_consumer_key": "TOKEN"}'
+        self.assertIsNone(self.find(document, max_bytes=26))
+        self.assertEqual(self.find(document, max_bytes=len(document)), 'TOKEN')
+
+
+class FindFormKeyTestCase(SimpleTestCase):
+    def test_found(self):
+        self.assertEqual(find_form_key(b'oauth_consumer_key=TOKEN'), 'TOKEN')
+        self.assertEqual(find_form_key(
+            b'a=1&oauth_consumer_key=TO%4BEN+&b=2'), 'TOKEN ')
+
+    def test_missing(self):
+        self.assertIsNone(find_form_key(b''))
+        self.assertIsNone(find_form_key(b'xoauth_consumer_key=TOKEN&a=1'))
+
+    def test_max_bytes(self):
+        body = b'a=' + b'x' * 100 + b'&oauth_consumer_key=TOKEN'
+        self.assertIsNone(find_form_key(body, max_bytes=50))
+        self.assertIsNone(find_form_key(b'oauth_consumer_key=TOKEN', max_bytes=22))
+
+
+class BodyCredentialsTestCase(OAuthTestCase):
+    def post(self, data, content_type='application/json'):
+        if content_type.startswith('application/json'):
+            data = json.dumps(data)
+        return self.factory.post('/', data, content_type=content_type)
+
+    def test_json_body(self):
+        auth = OAuth20Authentication()
+        request = self.post({'choice': 'Maybe', 'oauth_consumer_key': 'TOKEN'},
+                            'application/json; charset=utf-8')
+        self.assertTrue(auth.is_authenticated(request))
+        self.assertEqual(request.META['oauth_consumer_key'], 'TOKEN')
+
+    def test_form_body(self):
+        auth = OAuth20Authentication()
+        request = self.post('choice=Maybe&oauth_consumer_key=TOKEN',
+                            'application/x-www-form-urlencoded')
+        self.assertTrue(auth.is_authenticated(request))
+
+    def test_body_credentials_disabled(self):
+        auth = OAuth20Authentication(body_credentials=False)
+        request = self.post({'oauth_consumer_key': 'TOKEN'})
+        self.assertFalse(auth.is_authenticated(request))
+
+    def test_max_body_bytes(self):
+        auth = OAuth20Authentication(max_body_bytes=16)
+        request = self.post({'oauth_consumer_key': 'TOKEN'})
+        self.assertFalse(auth.is_authenticated(request))
+
+
+class ParseAuthorizationTestCase(SimpleTestCase):
+    def test_schemes(self):
+        self.assertEqual(parse_authorization('Bearer TOKEN'), 'TOKEN')
+        self.assertEqual(parse_authorization('bearer a-b.c_d~e+f/g=='), 'a-b.c_d~e+f/g==')
+        self.assertEqual(parse_authorization('OAuth st1.eyJ1:1ab:xyz'), 'st1.eyJ1:1ab:xyz')
+        self.assertIsNone(parse_authorization('Basic dXNlcjpwYXNz'))
+
+    def test_malformed(self):
+        for value in ('Bearer', 'Bearer ', 'Bearer  TOKEN', 'Bearer TOKEN extra',
+                      'Bearer TO,KEN', 'Bearer ==TOKEN'):
+            with self.assertRaises(MalformedCredentials):
+                parse_authorization(value)
+
+
+class Untouchable(object):
+    def __getattr__(self, name):
+        raise AssertionError('%s should not be used' % name)
+
+
+class ExtractorPipelineTestCase(OAuthTestCase):
+    def untouchable_post(self, **extra):
+        request = self.factory.post(
+            '/?oauth_consumer_key=TOKEN', json.dumps({'oauth_consumer_key': 'TOKEN'}),
+            content_type='application/json', **extra)
+        request.GET = Untouchable()
+        request._stream = Untouchable()
+        return request
+
+    def test_header_only(self):
+        auth = OAuth20Authentication(extractors=['header'])
+        request = self.untouchable_post(HTTP_AUTHORIZATION='Bearer TOKEN')
+        self.assertTrue(auth.is_authenticated(request))
+        self.assertIsNone(auth.is_authenticated(self.untouchable_post()))
+        request = self.factory.get('/?oauth_consumer_key=TOKEN')
+        self.assertIsNone(auth.is_authenticated(request))
+
+    def test_stops_at_first_hit(self):
+        auth = OAuth20Authentication()
+        request = self.untouchable_post(HTTP_AUTHORIZATION='Bearer TOKEN')
+        self.assertTrue(auth.is_authenticated(request))
+        request = self.factory.get('/?oauth_consumer_key=TOKEN')
+        request._stream = Untouchable()
+        self.assertTrue(auth.is_authenticated(request))
+
+    def test_order_and_custom_extractors(self):
+        def cookie_key(request, authentication):
+            return request.COOKIES.get('token')
+        auth = OAuth20Authentication(extractors=['query', cookie_key])
+        request = self.factory.get('/')
+        request.COOKIES['token'] = 'TOKEN'
+        self.assertTrue(auth.is_authenticated(request))
+        request = self.factory.get('/?oauth_consumer_key=NOPE')
+        request.COOKIES['token'] = 'TOKEN'
+        self.assertFalse(auth.is_authenticated(request))
+
+    def test_other_schemes_ignored(self):
+        auth = OAuth20Authentication()
+        request = self.factory.get(
+            '/?oauth_consumer_key=TOKEN', HTTP_AUTHORIZATION='Basic dXNlcjpwYXNz')
+        self.assertTrue(auth.is_authenticated(request))
+        request = self.factory.get('/', HTTP_AUTHORIZATION='Bearer TOKEN extra')
+        self.assertFalse(auth.is_authenticated(request))
@@ -0,0 +1,106 @@
+import logging
+
+from django.test import SimpleTestCase
+
+from tastypie_oauth.authentication import (
+    OAuth20Authentication,
+    OAuthError,
+    failure_log,
+)
+from tastypie_oauth.failures import FailureLogger
+
+from polls.tests.base import OAuthTestCase
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LoggingTestMixin(object):
+    def setUp(self):
+        super(LoggingTestMixin, self).setUp()
+        self.handler = RecordingHandler()
+        self.logger = logging.getLogger('tastypie_oauth')
+        self.logger.addHandler(self.handler)
+        self.addCleanup(self.logger.removeHandler, self.handler)
+        level = self.logger.level
+        self.logger.setLevel(logging.DEBUG)
+        self.addCleanup(self.logger.setLevel, level)
+
+    def records(self, level=logging.INFO):
+        return [r for r in self.handler.records if r.levelno >= level]
+
+
+class FailureLoggerTestCase(LoggingTestMixin, SimpleTestCase):
+    def test_rate_limited_per_reason_and_client(self):
+        failures = FailureLogger(self.logger, interval=60)
+        for _ in range(3):
+            failures.log('not_found', '10.0.0.1')
+        failures.log('expired', '10.0.0.1')
+        failures.log('not_found', '10.0.0.2')
+        self.assertEqual(
+            [(r.reason, r.client, r.suppressed) for r in self.records()],
+            [('not_found', '10.0.0.1', 0), ('expired', '10.0.0.1', 0),
+             ('not_found', '10.0.0.2', 0)])
+
+    def test_reports_suppressed(self):
+        failures = FailureLogger(self.logger, interval=0)
+        failures.log('not_found', None)
+        failures.interval = 60
+        failures.log('not_found', None)
+        failures.log('not_found', None)
+        failures.interval = 0
+        failures.log('not_found', None)
+        self.assertEqual([r.suppressed for r in self.records()], [0, 2])
+
+
+class LegacyAuthentication(OAuth20Authentication):
+    def verify_access_token(self, key, request, **kwargs):
+        if key != 'LEGACY':
+            raise OAuthError('Nope', 'legacy')
+        return super(LegacyAuthentication, self).verify_access_token(
+            'TOKEN', request, **kwargs)
+
+
+class BrokenAuthentication(OAuth20Authentication):
+    def lookup_token(self, key):
+        raise ValueError('Database is gone')
+
+
+class FailurePathTestCase(LoggingTestMixin, OAuthTestCase):
+    def setUp(self):
+        super(FailurePathTestCase, self).setUp()
+        failure_log.reset()
+
+    def authenticate(self, auth, key):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+        return auth.is_authenticated(request)
+
+    def test_expected_failure_has_no_traceback(self):
+        self.assertFalse(self.authenticate(OAuth20Authentication(), 'UNKNOWN'))
+        record, = self.records()
+        self.assertEqual(record.reason, 'not_found')
+        self.assertEqual(record.client, '127.0.0.1')
+        self.assertIsNone(record.exc_info)
+
+    def test_success_logs_nothing_at_info(self):
+        self.assertTrue(self.authenticate(OAuth20Authentication(), 'TOKEN'))
+        self.assertEqual(self.records(), [])
+
+    def test_unexpected_error_keeps_traceback(self):
+        self.assertFalse(self.authenticate(BrokenAuthentication(), 'TOKEN'))
+        record, = self.records()
+        self.assertEqual(record.levelno, logging.ERROR)
+        self.assertIsNotNone(record.exc_info)
+
+    def test_overridden_verify_access_token(self):
+        auth = LegacyAuthentication()
+        self.assertTrue(self.authenticate(auth, 'LEGACY'))
+        self.assertFalse(self.authenticate(auth, 'TOKEN'))
+        record, = self.records()
+        self.assertEqual(record.reason, 'legacy')
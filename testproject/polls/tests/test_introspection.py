@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+
+from django.test.utils import override_settings
+from six.moves import BaseHTTPServer
+from six.moves.urllib.parse import parse_qs
+
+from tastypie_oauth.authentication import (
+    OAuth20Authentication,
+    OAuth2ScopedAuthentication,
+)
+from tastypie_oauth.introspection import IntrospectionTokenStore
+
+from polls.tests.base import OAuthTestCase
+
+
+class IntrospectionHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        params = parse_qs(self.rfile.read(length).decode('utf8'))
+        with server.lock:
+            server.calls.append(params)
+        time.sleep(server.delay)
+        body = json.dumps(server.responses.get(
+            params['token'][0], {'active': False})).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class IntrospectionTestCase(OAuthTestCase):
+    def setUp(self):
+        super(IntrospectionTestCase, self).setUp()
+        self.server = BaseHTTPServer.HTTPServer(
+            ('127.0.0.1', 0), IntrospectionHandler)
+        self.server.lock = threading.Lock()
+        self.server.calls = []
+        self.server.delay = 0
+        self.server.responses = {
+            'REMOTE': {
+                'active': True,
+                'scope': 'read write',
+                'client_id': 'client',
+                'username': 'username',
+                'exp': int(time.time()) + 3600,
+            },
+        }
+        # Serve each connection on its own thread
+        self.server.process_request = self.process_request
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.store = IntrospectionTokenStore(
+            url='http://127.0.0.1:%d/introspect' % self.server.server_port,
+            auth=('client', 'secret'))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(IntrospectionTestCase, self).tearDown()
+
+    def process_request(self, request, client_address):
+        def handle():
+            self.server.finish_request(request, client_address)
+            self.server.shutdown_request(request)
+        thread = threading.Thread(target=handle)
+        thread.daemon = True
+        thread.start()
+
+    def authenticate(self, auth, key):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+        return auth.is_authenticated(request), request
+
+    def test_active_token(self):
+        auth = OAuth20Authentication(token_store=self.store)
+        result, request = self.authenticate(auth, 'REMOTE')
+        self.assertTrue(result)
+        self.assertEqual(request.user, self.user)
+        self.assertEqual(self.server.calls, [{
+            'token': ['REMOTE'], 'token_type_hint': ['access_token']}])
+
+    def test_token_without_local_user(self):
+        self.server.responses['CLIENT'] = {
+            'active': True, 'scope': 'read', 'client_id': 'client'}
+        self.server.responses['STRANGER'] = dict(
+            self.server.responses['REMOTE'], username='stranger')
+        auth = OAuth20Authentication(token_store=self.store)
+        for key in ('CLIENT', 'STRANGER'):
+            result, request = self.authenticate(auth, key)
+            self.assertTrue(result)
+            self.assertIsNone(request.user.pk)
+
+    def test_scopes(self):
+        auth = OAuth2ScopedAuthentication(
+            get='read', post='admin', token_store=self.store)
+        self.assertTrue(self.authenticate(auth, 'REMOTE')[0])
+        request = self.factory.post('/', HTTP_AUTHORIZATION='OAuth REMOTE')
+        self.assertFalse(auth.is_authenticated(request))
+
+    def test_inactive_and_expired_tokens(self):
+        self.server.responses['OLD'] = dict(
+            self.server.responses['REMOTE'], exp=int(time.time()) - 10)
+        auth = OAuth20Authentication(token_store=self.store)
+        self.assertFalse(self.authenticate(auth, 'UNKNOWN')[0])
+        self.assertFalse(self.authenticate(auth, 'OLD')[0])
+
+    def test_responses_are_cached(self):
+        auth = OAuth20Authentication(token_store=self.store)
+        for _ in range(3):
+            self.assertTrue(self.authenticate(auth, 'REMOTE')[0])
+            self.assertFalse(self.authenticate(auth, 'UNKNOWN')[0])
+        self.assertEqual(self.store.calls, 2)
+        self.assertEqual(len(self.server.calls), 2)
+
+    def test_store_shared_by_resources(self):
+        with override_settings(
+                TASTYPIE_OAUTH_TOKEN_STORE=(
+                    'tastypie_oauth.introspection.IntrospectionTokenStore'),
+                TASTYPIE_OAUTH_INTROSPECTION={'URL': self.store.url}):
+            auths = [OAuth20Authentication(), OAuth2ScopedAuthentication(get='read')]
+            for auth in auths:
+                self.assertTrue(self.authenticate(auth, 'REMOTE')[0])
+        self.assertIs(auths[0].token_store, auths[1].token_store)
+        self.assertEqual(len(self.server.calls), 1)
+
+    def test_cached_responses_skip_endpoint_latency(self):
+        self.server.delay = 0.2
+        auth = OAuth20Authentication(token_store=self.store)
+        for cached in (False, True):
+            started = time.time()
+            self.assertTrue(self.authenticate(auth, 'REMOTE')[0])
+            elapsed = time.time() - started
+            if cached:
+                self.assertLess(elapsed, 0.1)
+            else:
+                self.assertGreaterEqual(elapsed, 0.2)
+
+    def test_concurrent_lookups_coalesced(self):
+        self.server.delay = 0.2
+        results = []
+
+        def lookup():
+            results.append(self.store.get_token('REMOTE'))
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.server.calls), 1)
+        self.assertEqual(len(set(map(id, results))), 1)
+        self.assertEqual(results[0].scope, 'read write')
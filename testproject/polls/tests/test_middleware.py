@@ -0,0 +1,92 @@
+from django.http import HttpResponse
+
+from tastypie_oauth.authentication import (
+    OAuth20Authentication,
+    OAuth2ScopedAuthentication,
+)
+from tastypie_oauth.middleware import OAuthTokenMiddleware, request_token
+from tastypie_oauth.signed import mint_signed_token
+from tastypie_oauth.stores import TokenView, TokenViewStore
+
+from polls.api import (
+    PollResourceOAuthToolkit,
+    ScopedChoiceResourceOAuthToolkit,
+    ScopedPollResourceOAuthToolkit,
+)
+from polls.tests.base import OAuthTestCase
+
+
+def token_view(request):
+    token = request.oauth.token
+    return HttpResponse(token.user.username if token else 'anonymous')
+
+
+class AuthenticateOnceTestCase(OAuthTestCase):
+    def setUp(self):
+        super(AuthenticateOnceTestCase, self).setUp()
+        self.middleware = OAuthTokenMiddleware()
+        self.create_token('READ', scope='read')
+
+    def request(self, key, method='get'):
+        request = getattr(self.factory, method)(
+            '/', HTTP_AUTHORIZATION='OAuth ' + key)
+        self.middleware.process_request(request)
+        return request
+
+    def authenticate(self, resource, request):
+        return resource._meta.authentication.is_authenticated(request)
+
+    def test_one_lookup_per_request(self):
+        request = self.request('READ')
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate(PollResourceOAuthToolkit, request))
+            self.assertTrue(self.authenticate(
+                ScopedPollResourceOAuthToolkit, request))
+            self.assertTrue(self.authenticate(
+                ScopedChoiceResourceOAuthToolkit, request))
+            self.assertEqual(token_view(request).content, b'username')
+        self.assertEqual(request.user, self.user)
+
+    def test_lookups_not_shared_across_configurations(self):
+        key = mint_signed_token(self.access_token)
+        request = self.request(key)
+        self.assertTrue(OAuth20Authentication(
+            signed_tokens=True).is_authenticated(request))
+        self.assertFalse(OAuth20Authentication(
+            signed_tokens=False).is_authenticated(request))
+
+        request = self.request('READ')
+        self.assertTrue(OAuth20Authentication().is_authenticated(request))
+        with self.assertNumQueries(1):
+            self.assertTrue(OAuth20Authentication(
+                token_store=TokenViewStore()).is_authenticated(request))
+        self.assertIsInstance(request_token(request), TokenView)
+
+    def test_scopes_checked_per_resource(self):
+        request = self.request('READ', 'post')
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate(PollResourceOAuthToolkit, request))
+            self.assertFalse(self.authenticate(
+                ScopedPollResourceOAuthToolkit, request))
+            self.assertEqual(token_view(request).content, b'username')
+        scoped = OAuth2ScopedAuthentication(get='write')
+        self.assertFalse(scoped.is_authenticated(self.request('READ')))
+
+    def test_lazy(self):
+        request = self.request('READ')
+        with self.assertNumQueries(0):
+            self.middleware.process_request(request)
+        with self.assertNumQueries(1):
+            token = request.oauth.token
+            self.assertIs(request.oauth.token, token)
+        self.assertEqual(token.token, 'READ')
+
+    def test_missing_and_unknown_tokens(self):
+        for key in ('UNKNOWN', ''):
+            request = self.request(key)
+            self.assertEqual(token_view(request).content, b'anonymous')
+            self.assertFalse(OAuth20Authentication().is_authenticated(request))
+        request = self.factory.get('/')
+        self.middleware.process_request(request)
+        with self.assertNumQueries(0):
+            self.assertIsNone(request.oauth.token)
@@ -0,0 +1,54 @@
+import datetime
+import json
+
+from django.core.management import call_command
+
+from polls.api import ChoiceResourceOAuthToolkit, ScopedChoiceResourceOAuthToolkit
+from polls.tests.base import OAuthTestCase
+
+
+class AuthenticationQueryCountTestCase(OAuthTestCase):
+    """
+    Exact number of queries is_authenticated may issue per request. A
+    change adding a query to the authentication path must update these.
+    """
+    def setUp(self):
+        super(AuthenticationQueryCountTestCase, self).setUp()
+        call_command('loaddata', 'polls_api_testdata.json', verbosity=0)
+        self.create_token('SCOPED', scope='read write')
+        self.create_token('EXPIRED', scope='read write', expires=(
+            datetime.datetime.now() - datetime.timedelta(days=1)))
+        self.auth = ChoiceResourceOAuthToolkit._meta.authentication
+        self.scoped_auth = ScopedChoiceResourceOAuthToolkit._meta.authentication
+
+    def requests(self, key):
+        return {
+            'header': self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key),
+            'get': self.factory.get('/', {'oauth_consumer_key': key}),
+            'json': self.factory.post(
+                '/', json.dumps({'oauth_consumer_key': key}),
+                content_type='application/json'),
+        }
+
+    def assertQueries(self, auth, key, expected, num):
+        for request in self.requests(key).values():
+            with self.assertNumQueries(num):
+                self.assertEqual(auth.is_authenticated(request), expected)
+                if expected:
+                    # The token user comes with the token query
+                    request.user.pk
+
+    def test_success(self):
+        self.assertQueries(self.auth, 'TOKEN', True, 1)
+        self.assertQueries(self.scoped_auth, 'SCOPED', True, 1)
+
+    def test_failure(self):
+        for auth in (self.auth, self.scoped_auth):
+            self.assertQueries(auth, 'UNKNOWN', False, 1)
+            self.assertQueries(auth, 'EXPIRED', False, 1)
+        self.assertQueries(self.scoped_auth, 'TOKEN', False, 1)
+
+    def test_no_credentials(self):
+        for auth in (self.auth, self.scoped_auth):
+            with self.assertNumQueries(0):
+                self.assertIsNone(auth.is_authenticated(self.factory.get('/')))
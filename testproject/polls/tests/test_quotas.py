@@ -0,0 +1,170 @@
+import threading
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+
+from tastypie.resources import ModelResource
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.quotas import SlidingWindowQuota, TokenQuotas
+
+from polls.models import Poll
+from polls.tests.base import OAuthTestCase
+
+
+class Clock(object):
+    def __init__(self, now=6000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SlidingWindowQuotaTestCase(TestCase):
+    def setUp(self):
+        super(SlidingWindowQuotaTestCase, self).setUp()
+        cache.clear()
+        self.clock = Clock()
+
+    def make_quota(self, limit=10, period=60, **kwargs):
+        return SlidingWindowQuota(limit, period, clock=self.clock, **kwargs)
+
+    def hit(self, quota, client='a'):
+        retry_after = quota.check(client)
+        if retry_after is None:
+            quota.consume(client)
+        return retry_after
+
+    def test_burst(self):
+        quota = self.make_quota()
+        self.assertEqual([self.hit(quota) for _ in range(10)], [None] * 10)
+        # The window started with the burst, so the next one frees room
+        self.assertEqual(self.hit(quota), 66)
+        self.assertIsNone(self.hit(quota, 'b'))
+        self.clock.now += 30
+        self.assertIsNotNone(self.hit(quota))
+        self.clock.now += 36
+        self.assertIsNone(self.hit(quota))
+
+    def steady(self, quota, interval, count):
+        allowed = 0
+        for _ in range(count):
+            if self.hit(quota) is None:
+                allowed += 1
+            self.clock.now += interval
+        return allowed
+
+    def test_steady_state(self):
+        # 8.5 requests per minute for 10 minutes, under the quota
+        self.assertEqual(self.steady(self.make_quota(), 7, 86), 86)
+        # 12 requests per minute for 10 minutes: about the quota gets through
+        allowed = self.steady(self.make_quota(), 5, 120)
+        self.assertGreaterEqual(allowed, 85)
+        self.assertLessEqual(allowed, 100)
+
+    def test_workers_share_counters(self):
+        workers = [self.make_quota(sync_interval=1) for _ in range(2)]
+        for _ in range(5):
+            self.assertIsNone(self.hit(workers[0]))
+            self.assertIsNone(self.hit(workers[1]))
+        self.clock.now += 1
+        # Pushes its 5 requests and sees only its own
+        self.assertIsNone(self.hit(workers[0]))
+        # Pushes its 5 requests and sees all 10
+        self.assertIsNotNone(self.hit(workers[1]))
+        self.assertEqual(cache.get(workers[0].make_key('a', 100)), 10)
+        self.clock.now += 1
+        self.assertIsNotNone(self.hit(workers[0]))
+
+    def test_cache_not_hit_between_syncs(self):
+        quota = self.make_quota(limit=100, sync_interval=10)
+        self.hit(quota)
+        sync = quota.sync
+        syncs = []
+        quota.sync = lambda *args: syncs.append(args) or sync(*args)
+        for _ in range(50):
+            self.hit(quota)
+        self.assertEqual(syncs, [])
+        self.clock.now += 10
+        self.hit(quota)
+        self.assertEqual(len(syncs), 1)
+        self.assertEqual(cache.get(quota.make_key('a', 100)), 51)
+
+    def test_sync_does_not_block_other_clients(self):
+        quota = self.make_quota()
+        sync = quota.sync
+        syncing = threading.Event()
+        release = threading.Event()
+
+        def slow_sync(client, *args):
+            if client == 'a':
+                syncing.set()
+                release.wait(5)
+            return sync(client, *args)
+        quota.sync = slow_sync
+        thread = threading.Thread(target=self.hit, args=(quota, 'a'))
+        thread.start()
+        try:
+            self.assertTrue(syncing.wait(5))
+            self.assertIsNone(self.hit(quota, 'b'))
+        finally:
+            release.set()
+            thread.join()
+
+    def test_limit_must_be_positive(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.make_quota(limit=0)
+
+
+class QuotaAuthenticationTestCase(OAuthTestCase):
+    def setUp(self):
+        super(QuotaAuthenticationTestCase, self).setUp()
+        cache.clear()
+        self.clock = Clock()
+        self.auth = OAuth20Authentication(quotas=TokenQuotas(
+            token=SlidingWindowQuota(3, 60, name='token', clock=self.clock),
+            application=SlidingWindowQuota(
+                4, 60, name='application', clock=self.clock),
+        ))
+
+    def authenticate(self, key):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+        return self.auth.is_authenticated(request)
+
+    def test_token_and_application_quotas(self):
+        self.create_token('OTHER')
+        for _ in range(3):
+            self.assertIs(self.authenticate('TOKEN'), True)
+        response = self.authenticate('TOKEN')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '80')
+        # Same application
+        self.assertIs(self.authenticate('OTHER'), True)
+        self.assertEqual(self.authenticate('OTHER').status_code, 429)
+        # Rejected tokens are not counted
+        self.assertIs(self.authenticate('UNKNOWN'), False)
+
+    def test_counted_once_per_request(self):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        other = OAuth20Authentication(quotas=self.auth.quotas)
+        for auth in (self.auth, other) * 3:
+            self.assertIs(auth.is_authenticated(request), True)
+        for _ in range(2):
+            self.assertIs(self.authenticate('TOKEN'), True)
+        self.assertEqual(self.authenticate('TOKEN').status_code, 429)
+
+    def test_resource_response(self):
+        auth = self.auth
+
+        class PollResource(ModelResource):
+            class Meta:
+                queryset = Poll.objects.all()
+                authentication = auth
+
+        view = PollResource().wrap_view('dispatch_list')
+        for status_code in (200, 200, 200, 429):
+            request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+            response = view(request)
+            self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response['Retry-After'], '80')
@@ -0,0 +1,65 @@
+import datetime
+
+from django.test.utils import override_settings
+from oauth2_provider.models import AccessToken
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.stores import ModelTokenStore
+
+from polls.tests.base import OAuthTestCase
+
+
+class ReplicaTokenStoreTestCase(OAuthTestCase):
+    multi_db = True
+
+    def setUp(self):
+        super(ReplicaTokenStoreTestCase, self).setUp()
+        # The replica has caught up with the user, application and TOKEN...
+        for instance in (self.user, self.application, self.access_token):
+            instance.save(using='replica')
+        # ...but not with NEW, nor with the extension of EXTENDED
+        self.create_token('NEW')
+        extended = self.create_token('EXTENDED', expires=(
+            datetime.datetime.now() - datetime.timedelta(days=1)))
+        extended.save(using='replica')
+        extended.expires = datetime.datetime.now() + datetime.timedelta(days=1)
+        extended.save(using='default')
+        self.store = ModelTokenStore(using='replica')
+        self.auth = OAuth20Authentication(token_store=self.store)
+
+    def authenticate(self, key):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+        return self.auth.is_authenticated(request)
+
+    def test_replica_hit(self):
+        with self.assertNumQueries(0, using='default'):
+            with self.assertNumQueries(1, using='replica'):
+                self.assertTrue(self.authenticate('TOKEN'))
+        self.assertEqual(self.store.stats(), {
+            'replica_hits': 1, 'primary_fallbacks': 0})
+
+    def test_primary_fallback(self):
+        for key in ('NEW', 'EXTENDED'):
+            with self.assertNumQueries(1, using='default'):
+                with self.assertNumQueries(1, using='replica'):
+                    self.assertTrue(self.authenticate(key))
+        self.assertFalse(self.authenticate('UNKNOWN'))
+        self.assertEqual(self.store.stats(), {
+            'replica_hits': 0, 'primary_fallbacks': 3})
+
+    def test_bulk(self):
+        results = self.auth.verify_access_tokens(
+            ['TOKEN', 'NEW', 'EXTENDED', 'UNKNOWN'], self.factory.get('/'))
+        self.assertEqual(
+            sorted(key for key, result in results.items()
+                   if result.status == 'valid'),
+            ['EXTENDED', 'NEW', 'TOKEN'])
+        self.assertEqual(self.store.stats(), {
+            'replica_hits': 1, 'primary_fallbacks': 3})
+
+    def test_setting(self):
+        self.assertIsNone(ModelTokenStore().get_primary())
+        with override_settings(TASTYPIE_OAUTH_TOKEN_DATABASE='replica'):
+            self.assertEqual(ModelTokenStore().get_primary(), 'default')
+        self.assertIsNone(ModelTokenStore(using='default').get_primary())
+        self.assertEqual(AccessToken.objects.using('replica').count(), 2)
@@ -0,0 +1,87 @@
+from django.test import SimpleTestCase
+from django.test.client import RequestFactory
+
+from oauth2_provider.models import AccessToken
+
+from tastypie_oauth.authentication import OAuth2ScopedAuthentication, OAuthError
+from tastypie_oauth.cache import LocalTokenCache
+from tastypie_oauth.scopes import ScopeRequirement, parse_scopes
+
+
+class ScopeOnlyToken(object):
+    """A token exposing allow_scopes but no scope string."""
+    def __init__(self, scope):
+        self.granted = set(scope.split())
+
+    def allow_scopes(self, scopes):
+        return set(scopes).issubset(self.granted)
+
+
+class ScopeRequirementTestCase(SimpleTestCase):
+    def test_parse_scopes(self):
+        self.assertEqual(parse_scopes('read  write'), frozenset(['read', 'write']))
+        self.assertEqual(parse_scopes(''), frozenset())
+        self.assertIs(parse_scopes('read write'), parse_scopes('read write'))
+
+    def test_allowed(self):
+        requirement = ScopeRequirement(('read write', 'admin', ''))
+        self.assertEqual(requirement.allowed(parse_scopes('read')), [''])
+        self.assertEqual(requirement.allowed(parse_scopes('write read')),
+                         ['read write', ''])
+        self.assertEqual(requirement.allowed(parse_scopes('admin')),
+                         ['admin', ''])
+
+    def test_single_string(self):
+        requirement = ScopeRequirement('read write')
+        self.assertEqual(requirement.allowed(parse_scopes('read')), [])
+        self.assertEqual(requirement.allowed(parse_scopes('read write')),
+                         ['read write'])
+
+    def test_invalid(self):
+        self.assertRaises(Exception, ScopeRequirement, ('read', None))
+
+
+class CheckScopeTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.auth = OAuth2ScopedAuthentication(
+            post=('read write',), get=('read', 'admin'), delete='admin')
+
+    def test_check_scope(self):
+        token = AccessToken(scope='read write')
+        self.assertEqual(self.auth.check_scope(token, self.factory.get('/')),
+                         ['read'])
+        self.assertEqual(self.auth.check_scope(token, self.factory.post('/')),
+                         ['read write'])
+        self.assertEqual(self.auth.check_scope(token, self.factory.put('/')),
+                         ['read write'])
+        self.assertEqual(self.auth.check_scope(token, self.factory.delete('/')),
+                         [])
+        self.assertRaises(OAuthError, self.auth.check_scope, token,
+                          self.factory.options('/'))
+
+    def test_token_without_scope_string(self):
+        token = ScopeOnlyToken('admin')
+        self.assertEqual(self.auth.check_scope(token, self.factory.get('/')),
+                         ['admin'])
+        self.assertEqual(self.auth.check_scope(token, self.factory.delete('/')),
+                         ['admin'])
+
+    def test_no_requirement(self):
+        auth = OAuth2ScopedAuthentication(get='read', use_default=False)
+        token = AccessToken(scope='')
+        self.assertIs(auth.check_scope(token, self.factory.post('/')), True)
+
+    def test_unknown_options_ignored(self):
+        cache = LocalTokenCache()
+        auth = OAuth2ScopedAuthentication(
+            get='read', token_cache=cache, custom_option=1)
+        self.assertIs(auth.token_cache, cache)
+        self.assertFalse(hasattr(auth, 'custom_option'))
+
+    def test_recompile(self):
+        self.auth.GET = 'write'
+        self.auth.compile_scope_requirements()
+        token = AccessToken(scope='write')
+        self.assertEqual(self.auth.check_scope(token, self.factory.get('/')),
+                         ['write'])
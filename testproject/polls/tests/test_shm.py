@@ -0,0 +1,257 @@
+import datetime
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from oauth2_provider.models import AccessToken
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.cache import (
+    DjangoTokenCache,
+    LocalTokenCache,
+    TieredTokenCache,
+    get_default_token_cache,
+)
+from tastypie_oauth.middleware import request_token
+from tastypie_oauth.shm import SharedMemoryTokenCache, fcntl
+
+from polls.tests.base import OAuthTestCase
+
+SCOPES = ('read', 'write', 'admin')
+
+
+@unittest.skipIf(fcntl is None, 'the shared memory cache needs fcntl')
+class SharedMemoryTokenCacheTestCase(TestCase):
+    def setUp(self):
+        super(SharedMemoryTokenCacheTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tokens')
+        self.expires = datetime.datetime.now() + datetime.timedelta(days=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(SharedMemoryTokenCacheTestCase, self).tearDown()
+
+    def make_cache(self, **kwargs):
+        kwargs.setdefault('scopes', SCOPES)
+        cache = SharedMemoryTokenCache(self.path, **kwargs)
+        self.addCleanup(cache.close)
+        return cache
+
+    def make_token(self, key, scope='read', user_id=1, expires=None, id=1,
+                   application_id=1):
+        return AccessToken(token=key, user_id=user_id, scope=scope,
+                           expires=expires or self.expires, id=id,
+                           application_id=application_id)
+
+    def test_get_set_delete(self):
+        cache = self.make_cache()
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', self.make_token('a', scope='write read', user_id=7,
+                                       id=8, application_id=9))
+        token = cache.get('a')
+        self.assertEqual(token.user_id, 7)
+        self.assertEqual(token.access_token_id, 8)
+        self.assertEqual(token.application_id, 9)
+        self.assertEqual(token.scope, 'read write')
+        self.assertEqual(token.expires, self.expires.replace(microsecond=0))
+        self.assertTrue(token.allow_scopes(['read']))
+        self.assertFalse(token.allow_scopes(['admin']))
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats(), {
+            'hits': 1, 'misses': 2, 'evictions': 0})
+
+    def test_scopes_outside_vocabulary_are_not_cached(self):
+        cache = self.make_cache()
+        cache.set('a', self.make_token('a', scope='read billing'))
+        self.assertIsNone(cache.get('a'))
+        cache.set('b', self.make_token('b', scope=''))
+        self.assertEqual(cache.get('b').scope, '')
+
+    def test_tokens_without_ids_are_not_cached(self):
+        cache = self.make_cache()
+        cache.set('a', self.make_token('a', id=None))
+        cache.set('b', self.make_token('b', application_id=None))
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+
+    def test_ttl(self):
+        cache = self.make_cache(ttl=0.05)
+        cache.set('a', self.make_token('a'))
+        self.assertIsNotNone(cache.get('a'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_entry_does_not_outlive_token(self):
+        cache = self.make_cache(ttl=60)
+        expires = datetime.datetime.now() - datetime.timedelta(seconds=1)
+        cache.set('a', self.make_token('a', expires=expires))
+        self.assertIsNone(cache.get('a'))
+
+    def test_eviction(self):
+        cache = self.make_cache(buckets=1, ways=2)
+        cache.set('a', self.make_token('a'))
+        cache.set('b', self.make_token('b'))
+        # "a" was read since the clock hand passed it, so "b" goes
+        self.assertIsNotNone(cache.get('a'))
+        cache.set('c', self.make_token('c'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_shared_between_instances(self):
+        writer = self.make_cache()
+        reader = self.make_cache()
+        writer.set('a', self.make_token('a', user_id=3))
+        self.assertEqual(reader.get('a').user_id, 3)
+        reader.delete('a')
+        self.assertIsNone(writer.get('a'))
+
+    def test_geometry_mismatch(self):
+        self.make_cache(buckets=16)
+        with self.assertRaises(ImproperlyConfigured):
+            self.make_cache(buckets=32)
+
+    def test_scope_vocabulary_mismatch(self):
+        cache = self.make_cache(scopes=('read', 'write'))
+        cache.set('a', self.make_token('a', scope='read'))
+        # The bit of "read" would decode as "admin"
+        with self.assertRaises(ImproperlyConfigured):
+            self.make_cache(scopes=('admin', 'read', 'write'))
+        self.assertEqual(
+            self.make_cache(scopes=('read', 'write')).get('a').scope, 'read')
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork')
+    def test_concurrent_processes(self):
+        """
+        Processes insert, read and delete keys of a small table at once;
+        every hit must hold the data written for its key.
+        """
+        cache = self.make_cache(buckets=4, ways=4, stripes=2)
+        keys = ['key%d' % i for i in range(64)]
+
+        def expected(key):
+            number = int(key[3:])
+            return number, SCOPES[number % 3]
+
+        children = []
+        for seed in range(4):
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    child = SharedMemoryTokenCache(
+                        self.path, buckets=4, ways=4, stripes=2,
+                        scopes=SCOPES)
+                    rng = random.Random(seed)
+                    for _ in range(3000):
+                        key = rng.choice(keys)
+                        user_id, scope = expected(key)
+                        action = rng.random()
+                        if action < 0.4:
+                            child.set(key, self.make_token(
+                                key, scope=scope, user_id=user_id))
+                        elif action < 0.9:
+                            token = child.get(key)
+                            if token is not None and (
+                                    token.user_id, token.scope) != (
+                                    user_id, scope):
+                                os._exit(2)
+                        else:
+                            child.delete(key)
+                    code = 0
+                finally:
+                    os._exit(code)
+            children.append(pid)
+        for pid in children:
+            self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        for key in keys:
+            token = cache.get(key)
+            if token is not None:
+                self.assertEqual((token.user_id, token.scope), expected(key))
+
+
+@unittest.skipIf(fcntl is None, 'the shared memory cache needs fcntl')
+class SharedMemoryAuthenticationTestCase(OAuthTestCase):
+    def setUp(self):
+        super(SharedMemoryAuthenticationTestCase, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tokens')
+        self.cache = SharedMemoryTokenCache(self.path, scopes=SCOPES)
+        self.addCleanup(self.cache.close)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(SharedMemoryAuthenticationTestCase, self).tearDown()
+
+    def test_hit_needs_no_query(self):
+        auth = OAuth20Authentication(token_cache=self.cache)
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        self.assertTrue(auth.is_authenticated(request))
+        # Another worker, with its own mapping of the same file
+        other = SharedMemoryTokenCache(self.path, scopes=SCOPES)
+        self.addCleanup(other.close)
+        auth = OAuth20Authentication(token_cache=other)
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        with self.assertNumQueries(0):
+            self.assertTrue(auth.is_authenticated(request))
+        # What per-application quotas and usage records need
+        token = request_token(request)
+        self.assertEqual(token.application_id, self.application.pk)
+        self.assertEqual(token.access_token_id, self.access_token.pk)
+        self.assertEqual(request.user, self.user)
+
+    def test_invalidation_clears_once_per_host(self):
+        cache.clear()
+        other = SharedMemoryTokenCache(self.path, scopes=SCOPES)
+        self.addCleanup(other.close)
+        workers = [TieredTokenCache(LocalTokenCache(), shm, DjangoTokenCache())
+                   for shm in (self.cache, other)]
+        for worker in workers:
+            worker.check_version()
+        DjangoTokenCache().invalidate('REVOKED')
+        self.cache.set('TOKEN', self.access_token)
+        workers[0].check_version()
+        self.assertIsNone(other.get('TOKEN'))
+        # Cached again after the first worker cleared the table
+        self.cache.set('TOKEN', self.access_token)
+        workers[1].tiers[0].set('TOKEN', self.access_token)
+        workers[1].check_version()
+        self.assertIsNotNone(other.get('TOKEN'))
+        self.assertEqual(len(workers[1].tiers[0]), 0)
+
+    def test_saved_token_is_invalidated(self):
+        self.cache.set('TOKEN', self.access_token)
+        self.access_token.scope = 'write'
+        self.access_token.save()
+        self.assertIsNone(self.cache.get('TOKEN'))
+
+    def test_default_tiers(self):
+        with override_settings(
+                TASTYPIE_OAUTH_TOKEN_CACHE={},
+                TASTYPIE_OAUTH_SHM_TOKEN_CACHE={
+                    'PATH': self.path, 'SCOPES': SCOPES}):
+            cache = get_default_token_cache()
+            self.assertIsInstance(cache, TieredTokenCache)
+            self.assertIsInstance(cache.tiers[1], SharedMemoryTokenCache)
+            cache.tiers[1].close()
+        with override_settings(TASTYPIE_OAUTH_SHM_TOKEN_CACHE={
+                'PATH': self.path, 'SCOPES': SCOPES}):
+            cache = get_default_token_cache()
+            self.assertIsInstance(cache, SharedMemoryTokenCache)
+            self.assertIs(get_default_token_cache(), cache)
+            cache.close()
+        with override_settings(TASTYPIE_OAUTH_TOKEN_CACHE={}):
+            cache = get_default_token_cache()
+            self.assertIsInstance(cache, LocalTokenCache)
+            self.assertIs(get_default_token_cache(), cache)
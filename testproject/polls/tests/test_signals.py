@@ -0,0 +1,66 @@
+import datetime
+
+from tastypie_oauth import signals
+from tastypie_oauth.authentication import (
+    OAuth20Authentication,
+    OAuth2ScopedAuthentication,
+)
+from tastypie_oauth.cache import LocalTokenCache
+
+from polls.tests.base import OAuthTestCase
+
+
+class InstrumentationTestCase(OAuthTestCase):
+    def setUp(self):
+        super(InstrumentationTestCase, self).setUp()
+        self.create_token('READ', scope='read')
+        self.create_token('EXPIRED', expires=(
+            datetime.datetime.now() - datetime.timedelta(days=1)))
+        self.events = []
+
+    def listen(self, signal, *names):
+        def receiver(sender, **kwargs):
+            self.events.append(tuple(kwargs[name] for name in names))
+        signal.connect(receiver)
+        self.addCleanup(signal.disconnect, receiver)
+
+    def authenticate(self, auth, **extra):
+        return auth.is_authenticated(self.factory.get('/', **extra))
+
+    def test_outcomes(self):
+        self.listen(signals.auth_outcome, 'outcome')
+        auth = OAuth2ScopedAuthentication(get='read')
+        for key in ('READ', 'UNKNOWN', 'EXPIRED', 'TOKEN'):
+            self.authenticate(auth, HTTP_AUTHORIZATION='OAuth ' + key)
+        self.authenticate(auth, HTTP_AUTHORIZATION='OAuth')
+        self.authenticate(auth)
+        self.assertEqual(self.events, [
+            ('success',), ('not_found',), ('expired',),
+            ('insufficient_scope',), ('malformed_header',),
+            ('no_credentials',),
+        ])
+
+    def test_stages(self):
+        self.listen(signals.auth_stage, 'stage', 'duration')
+        auth = OAuth2ScopedAuthentication(get='read')
+        self.assertTrue(self.authenticate(auth, HTTP_AUTHORIZATION='OAuth READ'))
+        self.assertEqual([stage for stage, duration in self.events], [
+            'extract_key', 'lookup_token', 'check_expiry', 'check_scope'])
+        for stage, duration in self.events:
+            self.assertGreaterEqual(duration, 0)
+
+    def test_cache_lookups(self):
+        self.listen(signals.token_cache_lookup, 'cache', 'hit')
+        auth = OAuth20Authentication(token_cache=LocalTokenCache(),
+                                     negative_cache=LocalTokenCache())
+        for key in ('TOKEN', 'TOKEN', 'UNKNOWN', 'UNKNOWN'):
+            self.authenticate(auth, HTTP_AUTHORIZATION='OAuth ' + key)
+        self.assertEqual(self.events, [
+            ('negative', False), ('token', False),
+            ('negative', False), ('token', True),
+            ('negative', False), ('token', False),
+            ('negative', True),
+        ])
+
+    def test_nothing_sent_without_receivers(self):
+        self.assertIsNone(signals.stage_started())
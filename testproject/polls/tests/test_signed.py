@@ -0,0 +1,95 @@
+import datetime
+
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from tastypie_oauth.authentication import (
+    OAuth20Authentication,
+    OAuth2ScopedAuthentication,
+    TOKEN_NOT_FOUND,
+    TOKEN_VALID,
+)
+from tastypie_oauth.signed import (
+    load_signed_token,
+    mint_signed_token,
+    revoke_signed_tokens,
+)
+
+from polls.tests.base import OAuthTestCase
+
+
+class SignedTokenTestCase(OAuthTestCase):
+    def setUp(self):
+        super(SignedTokenTestCase, self).setUp()
+        cache.clear()
+        self.read_token = self.create_token('READ', scope='read')
+        self.auth = OAuth2ScopedAuthentication(get='read', signed_tokens=True)
+
+    def authenticate(self, key, auth=None):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+        return (auth or self.auth).is_authenticated(request), request
+
+    def test_verified_without_queries(self):
+        key = mint_signed_token(self.read_token)
+        with self.assertNumQueries(0):
+            authenticated, request = self.authenticate(key)
+        self.assertTrue(authenticated)
+        # The user is loaded when it is used
+        with self.assertNumQueries(1):
+            self.assertEqual(request.user.username, 'username')
+
+    def test_scopes_and_expiry(self):
+        self.assertFalse(self.authenticate(mint_signed_token(self.access_token))[0])
+        expired = mint_signed_token(
+            self.read_token,
+            expires=datetime.datetime.now() - datetime.timedelta(seconds=5))
+        self.assertFalse(self.authenticate(expired)[0])
+        token = load_signed_token(mint_signed_token(self.read_token))
+        self.assertLessEqual(token.expires, self.read_token.expires)
+        self.assertTrue(token.allow_scopes(['read']))
+        self.assertFalse(token.allow_scopes(['write']))
+
+    def test_verify_access_tokens(self):
+        key = mint_signed_token(self.read_token)
+        request = self.factory.get('/')
+        with self.assertNumQueries(1):
+            results = self.auth.verify_access_tokens(
+                [key, 'READ', key[:-2] + 'xx'], request)
+        self.assertEqual(results[key].status, TOKEN_VALID)
+        self.assertEqual(results[key].token.user_id, self.user.pk)
+        self.assertEqual(results['READ'].status, TOKEN_VALID)
+        self.assertEqual(results[key[:-2] + 'xx'].status, TOKEN_NOT_FOUND)
+        results = OAuth20Authentication().verify_access_tokens([key], request)
+        self.assertEqual(results[key].status, TOKEN_NOT_FOUND)
+
+    def test_opaque_tokens_still_work(self):
+        self.assertTrue(self.authenticate('READ')[0])
+
+    def test_disabled(self):
+        key = mint_signed_token(self.read_token)
+        self.assertFalse(self.authenticate(key, OAuth20Authentication())[0])
+
+    def test_tampered(self):
+        key = mint_signed_token(self.read_token)
+        self.assertFalse(self.authenticate(key[:-2] + 'xx')[0])
+
+    def test_key_rotation(self):
+        with override_settings(TASTYPIE_OAUTH_SIGNING_KEYS=['old']):
+            key = mint_signed_token(self.read_token)
+        with override_settings(TASTYPIE_OAUTH_SIGNING_KEYS=['new', 'old']):
+            self.assertTrue(self.authenticate(key)[0])
+        with override_settings(TASTYPIE_OAUTH_SIGNING_KEYS=['new']):
+            self.assertFalse(self.authenticate(key)[0])
+
+    @override_settings(TASTYPIE_OAUTH_SIGNED_TOKEN_DENYLIST='default')
+    def test_denylist(self):
+        key = mint_signed_token(self.read_token)
+        self.assertTrue(self.authenticate(key)[0])
+        revoke_signed_tokens(self.read_token)
+        self.assertFalse(self.authenticate(key)[0])
+
+    @override_settings(TASTYPIE_OAUTH_SIGNED_TOKEN_DENYLIST='default')
+    def test_deleting_access_token_revokes(self):
+        key = mint_signed_token(self.read_token)
+        self.read_token.delete()
+        self.assertFalse(self.authenticate(key)[0])
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import Counter
+
+from django.test import SimpleTestCase
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.singleflight import SingleFlight
+from tastypie_oauth.stores import ModelTokenStore
+
+from polls.tests.base import OAuthTransactionTestCase
+
+
+class SlowTokenStore(ModelTokenStore):
+    """Counts lookups per key, and holds each one open for a while."""
+    delay = 0.2
+
+    def __init__(self):
+        super(SlowTokenStore, self).__init__()
+        self.lookups = Counter()
+        self.lock = threading.Lock()
+
+    def get_token(self, key):
+        with self.lock:
+            self.lookups[key] += 1
+        time.sleep(self.delay)
+        return super(SlowTokenStore, self).get_token(key)
+
+
+def run_threads(target, args_list):
+    start = threading.Event()
+
+    def run(*args):
+        start.wait()
+        target(*args)
+    threads = [threading.Thread(target=run, args=args) for args in args_list]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    start.set()
+    for thread in threads:
+        thread.join(10)
+    return [thread for thread in threads if thread.is_alive()]
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    def test_leader_failure(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def fail():
+            calls.append('leader')
+            release.wait()
+            raise ValueError()
+        results = []
+
+        def follow():
+            results.append(flight.do('key', lambda: 'fallback'))
+        leader = threading.Thread(target=lambda: self.assertRaises(
+            ValueError, flight.do, 'key', fail))
+        leader.start()
+        while not calls:
+            time.sleep(0.01)
+        follower = threading.Thread(target=follow)
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(results, ['fallback'])
+        self.assertEqual(flight._calls, {})
+
+    def test_timeout(self):
+        flight = SingleFlight(timeout=0.05)
+        release = threading.Event()
+        thread = threading.Thread(
+            target=flight.do, args=('key', release.wait))
+        thread.start()
+        time.sleep(0.02)
+        started = time.time()
+        self.assertEqual(flight.do('key', lambda: 'own'), 'own')
+        self.assertLess(time.time() - started, 1)
+        release.set()
+        thread.join()
+
+
+class SingleFlightAuthenticationTestCase(OAuthTransactionTestCase):
+    def test_one_lookup_per_key_under_contention(self):
+        keys = ['TOKEN', 'A', 'B', 'UNKNOWN']
+        for key in keys[1:3]:
+            self.create_token(key)
+        store = SlowTokenStore()
+        auth = OAuth20Authentication(token_store=store)
+        results = []
+        lock = threading.Lock()
+
+        def authenticate(key):
+            request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+            result = auth.is_authenticated(request)
+            with lock:
+                results.append((key, result, getattr(request, 'user', None)))
+
+        alive = run_threads(authenticate, [(key,) for key in keys * 8])
+        self.assertEqual(alive, [])
+        self.assertEqual(store.lookups, Counter(dict.fromkeys(keys, 1)))
+        self.assertEqual(len(results), 32)
+        for key, result, user in results:
+            self.assertEqual(result, key != 'UNKNOWN')
+            if result:
+                self.assertEqual(user, self.user)
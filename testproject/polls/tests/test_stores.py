@@ -0,0 +1,111 @@
+import datetime
+import pickle
+
+from django.test.utils import override_settings
+
+from tastypie_oauth.authentication import (
+    OAuth20Authentication,
+    OAuth2ScopedAuthentication,
+)
+from tastypie_oauth.stores import (
+    BaseTokenStore,
+    ModelTokenStore,
+    TokenView,
+    TokenViewStore,
+    get_token_store,
+)
+
+from polls.tests.base import OAuthTestCase
+
+
+class DictTokenStore(BaseTokenStore):
+    tokens = {}
+
+    def get_token(self, key):
+        return self.tokens.get(key)
+
+
+class TokenStoreTestCase(OAuthTestCase):
+    def test_single_query(self):
+        auth = OAuth20Authentication()
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        with self.assertNumQueries(1):
+            self.assertTrue(auth.is_authenticated(request))
+            self.assertEqual(request.user.username, 'username')
+            self.assertEqual(request.user, self.access_token.user)
+
+    def test_get_token_store(self):
+        self.assertIsInstance(get_token_store(), ModelTokenStore)
+        store = DictTokenStore()
+        self.assertIs(get_token_store(store), store)
+        self.assertIsInstance(get_token_store(DictTokenStore), DictTokenStore)
+        self.assertIsInstance(
+            get_token_store('tastypie_oauth.stores.ModelTokenStore'),
+            ModelTokenStore)
+        with override_settings(TASTYPIE_OAUTH_TOKEN_STORE=DictTokenStore):
+            auth = OAuth20Authentication()
+            self.assertIs(OAuth20Authentication().token_store, auth.token_store)
+        self.assertIsInstance(auth.token_store, DictTokenStore)
+        self.assertIsNot(OAuth20Authentication().token_store, auth.token_store)
+
+    def test_custom_store_shares_checks(self):
+        store = DictTokenStore()
+        store.tokens = {
+            'FRESH': self.create_token('FRESH', scope='read'),
+            'STALE': self.create_token('STALE', scope='read', expires=(
+                datetime.datetime.now() - datetime.timedelta(days=1))),
+            'WRITE': self.create_token('WRITE', scope='write'),
+        }
+        auth = OAuth2ScopedAuthentication(get='read', token_store=store)
+        with self.assertNumQueries(0):
+            for key, expected in [('FRESH', True), ('STALE', False),
+                                  ('WRITE', False), ('UNKNOWN', False)]:
+                request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+                self.assertEqual(auth.is_authenticated(request), expected)
+
+
+class TokenViewStoreTestCase(OAuthTestCase):
+    def test_get_token(self):
+        store = TokenViewStore()
+        with self.assertNumQueries(1):
+            token = store.get_token('TOKEN')
+        self.assertIsInstance(token, TokenView)
+        self.assertFalse(hasattr(token, '__dict__'))
+        self.assertEqual(token.pk, self.access_token.pk)
+        self.assertEqual(token.user_id, self.user.pk)
+        self.assertEqual(token.application_id, self.application.pk)
+        self.assertEqual(token.expires, self.access_token.expires)
+        self.assertFalse(token.is_expired())
+        self.assertTrue(token.is_valid())
+        with self.assertNumQueries(2):
+            self.assertEqual(token.user.username, 'username')
+            self.assertEqual(token.application.name, 'Test Application')
+        self.assertIsNone(store.get_token('UNKNOWN'))
+
+    def test_get_tokens(self):
+        self.create_token('OTHER', scope='read')
+        store = TokenViewStore(batch_size=2)
+        with self.assertNumQueries(2):
+            tokens = store.get_tokens(['TOKEN', 'OTHER', 'UNKNOWN'])
+        self.assertEqual(sorted(tokens), ['OTHER', 'TOKEN'])
+        self.assertEqual(tokens['OTHER'].scope, 'read')
+
+    def test_authentication(self):
+        self.create_token('READ', scope='read')
+        auth = OAuth2ScopedAuthentication(get='read', token_store=TokenViewStore())
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth READ')
+        # The user is only loaded when it is used
+        with self.assertNumQueries(1):
+            self.assertTrue(auth.is_authenticated(request))
+        with self.assertNumQueries(1):
+            self.assertEqual(request.user, self.user)
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        self.assertFalse(auth.is_authenticated(request))
+
+    def test_pickle_skips_lazy_objects(self):
+        token = TokenViewStore().get_token('TOKEN')
+        token.user
+        with self.assertNumQueries(0):
+            token = pickle.loads(pickle.dumps(token, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(token.token, 'TOKEN')
+        self.assertEqual(token.user, self.user)
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+import unittest
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.cache import token_fingerprint
+from tastypie_oauth.models import TokenUsage
+from tastypie_oauth.usage import UsageRecorder
+
+from polls.tests.base import OAuthTestCase, OAuthTransactionTestCase
+
+
+class UsageRecorderTestCase(OAuthTestCase):
+    def setUp(self):
+        super(UsageRecorderTestCase, self).setUp()
+        # Flushed by hand, never by the background thread
+        self.recorder = UsageRecorder(interval=3600, max_pending=10000)
+        self.auth = OAuth20Authentication(usage_recorder=self.recorder)
+
+    def tearDown(self):
+        self.recorder._stopped = True
+        self.recorder._pending.clear()
+        self.recorder._wakeup.set()
+        super(UsageRecorderTestCase, self).tearDown()
+
+    def authenticate(self, key):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+        return self.auth.is_authenticated(request)
+
+    def test_requests_do_not_write(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate('TOKEN'))
+        with self.assertNumQueries(1):
+            self.assertTrue(self.authenticate('TOKEN'))
+        self.assertFalse(self.authenticate('UNKNOWN'))
+        self.assertEqual(TokenUsage.objects.count(), 0)
+
+    def test_flush_batches_writes(self):
+        self.create_token('OTHER')
+        for _ in range(5):
+            self.assertTrue(self.authenticate('TOKEN'))
+        self.assertTrue(self.authenticate('OTHER'))
+        # One SELECT of the existing rows and one INSERT, in a savepoint
+        with self.assertNumQueries(4):
+            self.recorder.flush()
+        usage = TokenUsage.objects.get(fingerprint=token_fingerprint('TOKEN'))
+        self.assertEqual(usage.request_count, 5)
+        self.assertEqual(usage.token_id, self.access_token.pk)
+        first_used = usage.last_used
+
+        for _ in range(3):
+            self.assertTrue(self.authenticate('TOKEN'))
+        self.assertTrue(self.authenticate('OTHER'))
+        # One SELECT and one UPDATE for both rows
+        with self.assertNumQueries(2):
+            self.recorder.flush()
+        usage.refresh_from_db()
+        self.assertEqual(usage.request_count, 8)
+        self.assertGreater(usage.last_used, first_used)
+        self.assertEqual(TokenUsage.objects.get(
+            fingerprint=token_fingerprint('OTHER')).request_count, 2)
+
+        with self.assertNumQueries(0):
+            self.recorder.flush()
+
+    def test_counted_once_per_request(self):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        for auth in (self.auth, OAuth20Authentication(
+                usage_recorder=self.recorder)):
+            self.assertTrue(auth.is_authenticated(request))
+            self.assertTrue(auth.is_authenticated(request))
+        self.recorder.flush()
+        self.assertEqual(TokenUsage.objects.get(
+            fingerprint=token_fingerprint('TOKEN')).request_count, 1)
+
+    def test_forked_child_starts_empty(self):
+        self.assertTrue(self.authenticate('TOKEN'))
+        # As seen by a child forked without an after-fork hook
+        self.recorder._pid = -1
+        self.assertTrue(self.authenticate('TOKEN'))
+        self.assertEqual(
+            [entry[0] for entry in self.recorder._pending.values()], [1])
+
+    @unittest.skipUnless(hasattr(os, 'register_at_fork'),
+                         'needs os.register_at_fork')
+    def test_after_fork_hook(self):
+        self.assertTrue(self.authenticate('TOKEN'))
+        pid = os.fork()
+        if pid == 0:
+            os._exit(len(self.recorder._pending))
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+        self.assertEqual(len(self.recorder._pending), 1)
+
+    def test_concurrent_insert(self):
+        last_used = self.access_token.expires
+
+        class RacingRecorder(UsageRecorder):
+            def existing_fingerprints(self, queryset, batch):
+                # Another process inserts the row after it was looked for
+                TokenUsage.objects.create(
+                    fingerprint=token_fingerprint('TOKEN'), request_count=1,
+                    last_used=last_used)
+                return set()
+        recorder = RacingRecorder(interval=3600)
+        recorder.record('TOKEN', self.access_token)
+        recorder.record('TOKEN', self.access_token)
+        recorder.flush()
+        recorder._stopped = True
+        self.assertEqual(TokenUsage.objects.get().request_count, 3)
+
+
+class BackgroundFlushTestCase(OAuthTransactionTestCase):
+    def test_flush_on_threshold(self):
+        recorder = UsageRecorder(interval=3600, max_pending=2)
+        auth = OAuth20Authentication(usage_recorder=recorder)
+
+        def authenticate(key):
+            request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth ' + key)
+            self.assertTrue(auth.is_authenticated(request))
+        self.create_token('OTHER')
+        threads = [threading.Thread(target=authenticate, args=(key,))
+                   for key in ['TOKEN', 'TOKEN', 'OTHER', 'TOKEN']]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for _ in range(50):
+            if not recorder._pending:
+                break
+            time.sleep(0.05)
+        recorder.stop()
+        self.assertEqual(
+            sorted(TokenUsage.objects.values_list('request_count', flat=True)),
+            [1, 3])
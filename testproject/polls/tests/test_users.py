@@ -0,0 +1,79 @@
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from tastypie.authorization import DjangoAuthorization
+from tastypie.bundle import Bundle
+from tastypie.exceptions import Unauthorized
+
+from tastypie_oauth.authentication import OAuth20Authentication
+from tastypie_oauth.users import UserProjectionCache, get_default_user_cache
+
+from polls.models import Poll
+from polls.tests.base import OAuthTestCase
+
+
+class LazyUserTestCase(OAuthTestCase):
+    def setUp(self):
+        super(LazyUserTestCase, self).setUp()
+        self.user_cache = UserProjectionCache()
+        self.auth = OAuth20Authentication(user_cache=self.user_cache)
+
+    def authenticate(self):
+        request = self.factory.get('/', HTTP_AUTHORIZATION='OAuth TOKEN')
+        self.assertTrue(self.auth.is_authenticated(request))
+        return request
+
+    def user_queries(self, queries):
+        return [q for q in queries if 'auth_user' in q['sql']]
+
+    def test_user_not_loaded_unless_used(self):
+        with CaptureQueriesContext(connection) as queries:
+            request = self.authenticate()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.user_queries(queries), [])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(request.user.username, 'username')
+        with self.assertNumQueries(1):
+            request = self.authenticate()
+            self.assertEqual(request.user, self.user)
+        self.assertEqual(self.user_cache.stats()['hits'], 1)
+
+    def test_invalidated_on_save_and_delete(self):
+        self.assertTrue(self.authenticate().user.is_active)
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.authenticate().user.is_active)
+        self.user_cache.get(self.user.pk)
+        self.user.delete()
+        self.assertEqual(len(self.user_cache), 0)
+        self.assertIsInstance(self.user_cache.get(self.user.pk), AnonymousUser)
+
+    def test_projection(self):
+        self.auth.user_cache = UserProjectionCache(
+            fields=('username', 'is_active', 'is_superuser'))
+        request = self.authenticate()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(request.user.username, 'username')
+        self.assertNotIn('password', queries[0]['sql'])
+
+    def test_django_authorization(self):
+        authorization = DjangoAuthorization()
+        request = self.authenticate()
+        bundle = Bundle(obj=Poll(), request=request)
+        with self.assertRaises(Unauthorized):
+            authorization.create_detail(None, bundle)
+        self.user.user_permissions.add(
+            Permission.objects.get(codename='add_poll'))
+        # A fresh copy per request, without the previous permission cache
+        bundle = Bundle(obj=Poll(), request=self.authenticate())
+        self.assertTrue(authorization.create_detail(None, bundle))
+
+    def test_default_user_cache(self):
+        self.assertIsNone(OAuth20Authentication().user_cache)
+        with override_settings(TASTYPIE_OAUTH_USER_CACHE={'TTL': 30}):
+            auth = OAuth20Authentication()
+            self.assertIs(auth.user_cache, get_default_user_cache())
+            self.assertEqual(auth.user_cache.ttl, 30)
+            self.assertEqual(auth.token_store.select_related, ())